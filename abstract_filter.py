@@ -0,0 +1,91 @@
+import hashlib
+import random
+import re
+
+# Filter applied to abstracts before they reach the LLM. It drops placeholders such as
+# "Abstract not available" and abstracts too short to describe any expertise. It also
+# maps near-duplicate abstracts (preprint, conference and journal versions of a work)
+# to the first one seen, so their expertise is generated once. Near-duplicates are
+# found with MinHash signatures of word shingles and locality-sensitive hashing over bands.
+placeholder_abstracts = {"abstract not available", "no abstract available", "n/a", "not available"}
+min_abstract_words = 30  # Shorter abstracts are not sent to the LLM
+shingle_size = 3  # Words per shingle
+num_perm = 64  # MinHash signature length
+bands = 16  # LSH bands of num_perm // bands rows each; more bands also catch less similar pairs as candidates
+similarity_threshold = 0.8  # Estimated Jaccard similarity of the shingles above which two abstracts count as the same work
+
+# Counters for the current run, printed by report()
+stats = {"abstracts": 0, "placeholders": 0, "too_short": 0, "near_duplicates": 0}
+
+_prime = (1 << 61) - 1
+_random = random.Random(0)
+_permutations = [(_random.randrange(1, _prime), _random.randrange(0, _prime)) for _ in range(num_perm)]
+
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def is_placeholder(abstract):
+    return not abstract or abstract.strip().lower().rstrip(".") in placeholder_abstracts
+
+
+def usable(abstract):
+    """True if an abstract is worth an LLM call."""
+    return not is_placeholder(abstract) and len(words(abstract)) >= min_abstract_words
+
+
+def signature(text):
+    """MinHash signature of the word shingles of a text."""
+    tokens = words(text)
+    shingles = {" ".join(tokens[index:index + shingle_size])
+                for index in range(max(1, len(tokens) - shingle_size + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+              for shingle in shingles]
+    return tuple(min((a * value + b) % _prime for value in hashes) for a, b in _permutations)
+
+
+class NearDuplicateIndex:
+    """LSH index of the MinHash signatures of the abstracts that are sent to the LLM."""
+
+    def __init__(self):
+        self.buckets = {}  # (band, rows of the signature) -> keys
+        self.signatures = {}
+
+    def find_or_add(self, key, text):
+        """Returns the key of an earlier near-duplicate of text, or adds text under key and returns key."""
+        current = signature(text)
+        rows = num_perm // bands
+        band_keys = [(band, current[band * rows:(band + 1) * rows]) for band in range(bands)]
+        for band_key in band_keys:
+            for candidate in self.buckets.get(band_key, ()):
+                agreement = sum(x == y for x, y in zip(current, self.signatures[candidate])) / num_perm
+                if agreement >= similarity_threshold:
+                    return candidate
+        self.signatures[key] = current
+        for band_key in band_keys:
+            self.buckets.setdefault(band_key, []).append(key)
+        return key
+
+
+def source(index, key, abstract):
+    """The key whose expertise a paper uses: its own, that of an earlier near-duplicate, or None if it has no usable abstract."""
+    stats["abstracts"] += 1
+    if is_placeholder(abstract):
+        stats["placeholders"] += 1
+        return None
+    if not usable(abstract):
+        stats["too_short"] += 1
+        return None
+    found = index.find_or_add(key, abstract)
+    if found != key:
+        stats["near_duplicates"] += 1
+    return found
+
+
+def report():
+    """Prints the LLM calls the filter avoided in this run."""
+    avoided = stats["placeholders"] + stats["too_short"] + stats["near_duplicates"]
+    print(f"Abstract filter: {avoided} of {stats['abstracts']} unique papers not sent to the LLM "
+          f"({stats['placeholders']} placeholders, {stats['too_short']} too short, "
+          f"{stats['near_duplicates']} near-duplicates)")
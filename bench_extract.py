@@ -0,0 +1,83 @@
+import sqlite3
+import sys
+import time
+import zlib
+import http_cache
+import hint2publications
+import research_explorer_projects
+
+# Parity check and micro-benchmark of the BeautifulSoup and lxml extractors on the
+# pages saved in the HTTP cache. Usage: python bench_extract.py [cache_file]
+repeat = 3  # Number of timed passes over the pages per engine
+
+
+def page_kind(url):
+    """Classifies a cached URL by the extractor that handles it."""
+    if "/publications/" in url:
+        return "publication_list"
+    if "/projects/" in url:
+        return "project_list"
+    if "/project/" in url:
+        return "project"
+    if "hdl.handle.net/1854/" in url or "biblio.ugent.be/publication/" in url:
+        return "publication"
+    return None
+
+
+def load_pages(cache_file):
+    """Reads the saved pages from the HTTP cache, grouped by page kind."""
+    pages = {"publication": [], "publication_list": [], "project_list": [], "project": []}
+    connection = sqlite3.connect(cache_file)
+    for url, body, encoding in connection.execute("SELECT url, body, encoding FROM responses"):
+        kind = page_kind(url)
+        if kind:
+            pages[kind].append((url, zlib.decompress(body).decode(encoding or "utf-8", errors="replace")))
+    connection.close()
+    return pages
+
+
+def extract(kind, url, html):
+    """Runs the extractor for one page with the currently selected engine."""
+    if kind == "publication":
+        return hint2publications.parse_publication_details(html)
+    if kind == "publication_list":
+        return hint2publications.parse_publication_urls(html)
+    if kind == "project_list":
+        return research_explorer_projects.parse_project_list(html, url)
+    return research_explorer_projects.parse_project_details(html)
+
+
+def run(engine, kind, pages):
+    """Extracts all pages of one kind with the given engine and returns the results and seconds per page."""
+    hint2publications.extraction_engine = engine
+    research_explorer_projects.extraction_engine = engine
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(kind, url, html) for url, html in pages]
+    return results, (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main():
+    cache_file = sys.argv[1] if len(sys.argv) > 1 else http_cache.cache_file
+    pages = load_pages(cache_file)
+    mismatches = 0
+
+    print(f"{'page kind':<18}{'pages':>7}{'bs4 ms':>10}{'lxml ms':>10}{'speedup':>9}{'mismatches':>12}")
+    for kind, kind_pages in pages.items():
+        if not kind_pages:
+            continue
+        reference, bs4_seconds = run("bs4", kind, kind_pages)
+        fast, lxml_seconds = run("lxml", kind, kind_pages)
+        kind_mismatches = [url for (url, _), expected, actual in zip(kind_pages, reference, fast) if expected != actual]
+        mismatches += len(kind_mismatches)
+        print(f"{kind:<18}{len(kind_pages):>7}{bs4_seconds * 1000:>10.2f}{lxml_seconds * 1000:>10.2f}"
+              f"{bs4_seconds / lxml_seconds:>8.1f}x{len(kind_mismatches):>12}")
+        for url in kind_mismatches:
+            print(f"  mismatch: {url}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
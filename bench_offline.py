@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import mock_ugent
+
+# Offline benchmark of the scrapers and the LLM stage against mock_ugent.py and a
+# fake LLM, so performance regressions show up without the live site or Ollama.
+# Usage: python bench_offline.py [target ...] [--save-baseline]
+# Targets: hint2publications, research_explorer_projects, crig_researchers, generate_expertise,
+#          generate_expertise_packed (generate_expertise with several abstracts per prompt)
+# Without a corpus, one is synthesised from publications_file first.
+
+publications_file = "test.publications_data.json"  # Researchers and papers the synthesised corpus is built from
+baseline_file = "bench_baseline.json"
+regression_threshold = 0.2  # Relative slowdown against the baseline that fails the run
+targets = ["hint2publications", "research_explorer_projects", "crig_researchers", "generate_expertise",
+           "generate_expertise_packed"]
+throttle = False  # False lifts the rate limiter's per-host rates, so the stand-in's latency is what is measured
+
+# Fake LLM speed
+call_overhead = 0.05  # Seconds of fixed cost per request (scheduling, prompt setup)
+prompt_tokens_per_second = 1000.0  # Prompt evaluation
+tokens_per_second = 500.0  # Generation
+completion_tokens = 60
+
+
+class FakeLLM:
+    """Deterministic stand-in for the Ollama LLM that takes as long as a model of the configured speed."""
+
+    def __init__(self, estimate_tokens):
+        self.estimate_tokens = estimate_tokens
+
+    def __call__(self, prompt):
+        # Packed prompts number their abstracts and ask for one answer per abstract as a JSON array
+        abstracts = re.findall(r"^Abstract \d+: (.*)$", prompt, re.MULTILINE) if "JSON array" in prompt else []
+        answers = [self.answer(abstract) for abstract in abstracts] or [self.answer(prompt)]
+        time.sleep(call_overhead + self.estimate_tokens(prompt) / prompt_tokens_per_second
+                   + len(answers) * completion_tokens / tokens_per_second)
+        return json.dumps(answers) if abstracts else answers[0]
+
+    @staticmethod
+    def answer(text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return " ".join(digest[index:index + 5] for index in range(0, 5 * completion_tokens // 2, 5))
+
+
+def page_kind(url):
+    """Classifies a requested URL for the per-stage latency breakdown."""
+    if "crig.ugent.be" in url:
+        return "crig"
+    if "/publications/" in url:
+        return "publication_list"
+    if "/projects/" in url:
+        return "project_list"
+    if "/project/" in url:
+        return "project"
+    if "hdl.handle.net/1854/" in url or "biblio.ugent.be/publication/" in url:
+        return "publication"
+    return "person"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def instrument(timings, counts):
+    """Wraps the HTTP cache functions and the LLM to record the latency of every call, by stage."""
+    import http_cache
+    lock = threading.Lock()
+
+    def note(stage, seconds, fetched):
+        with lock:
+            timings.setdefault(stage, []).append(seconds)
+            counts["pages" if stage != "llm" else "llm_calls"] += fetched
+
+    def timed(function):
+        def wrapper(url, *args, **kwargs):
+            started = time.perf_counter()
+            response = function(url, *args, **kwargs)
+            # Pages answered from the HTTP cache are not counted as fetched
+            note(page_kind(url), time.perf_counter() - started, response.headers.get("X-Cache") != "HIT")
+            return response
+        return wrapper
+
+    def timed_async(function):
+        async def wrapper(session, url, *args, **kwargs):
+            started = time.perf_counter()
+            response = await function(session, url, *args, **kwargs)
+            note(page_kind(url), time.perf_counter() - started, response.headers.get("X-Cache") != "HIT")
+            return response
+        return wrapper
+
+    http_cache.get = timed(http_cache.get)
+    http_cache.head = timed(http_cache.head)
+    http_cache.get_async = timed_async(http_cache.get_async)
+    return note
+
+
+def run_target(target, overrides, publications_path):
+    """Runs one target in this process and returns its measurements; called in a child process per target."""
+    import http_cache
+    import rate_limiter
+    http_cache.origin_overrides = overrides
+    if not throttle:
+        rate_limiter.initial_rate = rate_limiter.max_rate = 1e6
+    timings, counts = {}, {"pages": 0, "llm_calls": 0}
+    note = instrument(timings, counts)
+
+    with open(publications_path, "r", encoding="utf-8") as file:
+        names = list(json.load(file))
+    if target == "hint2publications":
+        import hint2publications
+        with open("researchers.txt", "w", encoding="utf-8") as file:
+            file.write("\n".join(names) + "\n")
+        hint2publications.input_file = "researchers.txt"
+        started = time.perf_counter()
+        hint2publications.main()
+    elif target == "research_explorer_projects":
+        import research_explorer_projects
+        with open("people.json", "w", encoding="utf-8") as file:
+            json.dump([{"name": name} for name in names], file)
+        started = time.perf_counter()
+        research_explorer_projects.scrape_all_projects_in_json("people.json")
+    elif target == "crig_researchers":
+        import crig_researchers
+        started = time.perf_counter()
+        crig_researchers.main()
+    elif target in ("generate_expertise", "generate_expertise_packed"):
+        import generate_expertise
+        generate_expertise.expertise_mode = "packed" if target == "generate_expertise_packed" else "single"
+        fake = FakeLLM(generate_expertise.estimate_tokens)
+
+        def llm(prompt):
+            call_started = time.perf_counter()
+            result = fake(prompt)
+            note("llm", time.perf_counter() - call_started, 1)
+            return result
+
+        generate_expertise.llm = llm
+        generate_expertise.input_file = publications_path
+        started = time.perf_counter()
+        generate_expertise.main()
+    else:
+        raise ValueError(f"Unknown target: {target}")
+    wall = time.perf_counter() - started
+
+    return {
+        "wall_seconds": wall,
+        "pages_per_second": counts["pages"] / wall,
+        "llm_calls_per_second": counts["llm_calls"] / wall,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": {
+            stage: {"calls": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+                    "p95_ms": percentile(values, 0.95) * 1000}
+            for stage, values in sorted(timings.items())
+        },
+    }
+
+
+def run_isolated(target, overrides, publications_path):
+    """Runs a target in a fresh process and working directory, so caches and peak RSS are its own."""
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, "result.json")
+        environment = {**os.environ, "PYTHONPATH": os.pathsep.join(
+            [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH", "")])}
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", target, json.dumps(overrides),
+             os.path.abspath(publications_path), result_path],
+            cwd=directory, env=environment, capture_output=True, text=True,
+        )
+        if process.returncode != 0 or not os.path.exists(result_path):
+            print(f"{target} failed:\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+            return None
+        with open(result_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+
+def compare(target, result, baseline):
+    """Returns the regressions of a result against its baseline."""
+    regressions = []
+    for metric in ("pages_per_second", "llm_calls_per_second"):
+        if baseline.get(metric) and result[metric] < baseline[metric] * (1 - regression_threshold):
+            regressions.append(f"{target} {metric} {result[metric]:.1f} < baseline {baseline[metric]:.1f}")
+    for stage, values in result["stages"].items():
+        expected = baseline.get("stages", {}).get(stage)
+        if expected and values["p95_ms"] > expected["p95_ms"] * (1 + regression_threshold):
+            regressions.append(f"{target} {stage} p95 {values['p95_ms']:.0f} ms > baseline {expected['p95_ms']:.0f} ms")
+    return regressions
+
+
+def main():
+    if sys.argv[1:2] == ["--child"]:
+        target, overrides, publications_path, result_path = sys.argv[2:6]
+        result = run_target(target, json.loads(overrides), publications_path)
+        with open(result_path, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return
+
+    save_baseline = "--save-baseline" in sys.argv
+    selected = [argument for argument in sys.argv[1:] if not argument.startswith("--")] or targets
+    if not os.path.exists(mock_ugent.warc_file):
+        with open(publications_file, "r", encoding="utf-8") as file:
+            count = mock_ugent.synthesize(json.load(file), mock_ugent.warc_file)
+        print(f"Synthesised {count} pages to '{mock_ugent.warc_file}'")
+    server, overrides = mock_ugent.serve(mock_ugent.read_warc(mock_ugent.warc_file))
+
+    results = {}
+    for target in selected:
+        result = run_isolated(target, overrides, publications_file)
+        if result is None:
+            continue
+        results[target] = result
+        print(f"\n{target}: {result['wall_seconds']:.1f}s, {result['pages_per_second']:.1f} pages/s, "
+              f"{result['llm_calls_per_second']:.1f} LLM calls/s, peak RSS {result['peak_rss_mb']:.0f} MB")
+        print(f"  {'stage':<18}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, values in result["stages"].items():
+            print(f"  {stage:<18}{values['calls']:>7}{values['p50_ms']:>10.1f}{values['p95_ms']:>10.1f}")
+    server.shutdown()
+
+    if save_baseline:
+        with open(baseline_file, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+        print(f"\nBaseline written to '{baseline_file}'")
+        return
+    if os.path.exists(baseline_file):
+        with open(baseline_file, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = [regression for target, result in results.items() if target in baseline
+                       for regression in compare(target, result, baseline[target])]
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+    if len(results) < len(selected):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import re
+import sys
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+import http_cache
+
+# Machine-readable Biblio search export; point this at mock_biblio.py for offline runs.
+# "record" saves one raw export page, e.g. as a fixture for tests/test_biblio_export.py.
+# Usage: python biblio_export.py record "<name>" <output file> [min_year]
+export_url = "https://biblio.ugent.be/publication"
+page_size = 500  # Records per export request, so most researchers need a single request
+
+# Labels used on the publication pages, so exported records match the scraped ones
+subtype_labels = {
+    "original": "Original Article",
+    "review": "Review Article",
+    "letterNote": "Letter/Note",
+    "proceedingsPaper": "Proceedings Paper",
+}
+
+# Counters for the current run, printed by report()
+stats = {"requests": 0, "records": 0, "kept": 0}
+
+_lock = threading.Lock()
+
+
+class ExportError(Exception):
+    """Raised when an export page is not answered with a JSON list of records."""
+
+
+def handle_id(url):
+    """Returns the Biblio handle ID ("LU-...") of a publication URL, or the URL itself if it has none.
+
+    Co-authors link to the same paper through different URL forms, so this is the
+    key under which each paper is fetched and summarised once.
+    """
+    match = re.search(r"(?:/LU-|biblio\.ugent\.be/publication/)([0-9A-Za-z]+)", url)
+    return f"LU-{match.group(1)}" if match else url
+
+
+def export_page_url(name, min_year, start):
+    """Builds the export URL for one page of a researcher's publications."""
+    params = {
+        "q": f'author:"{name}"',
+        "year_from": min_year,
+        "classification": "A1",
+        "format": "json",
+        "start": start,
+        "limit": page_size,
+    }
+    return f"{export_url}?{urlencode(params)}"
+
+
+def _first(value):
+    """Returns the first element of list-valued export fields."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _year(record):
+    """Returns the publication year of an export record, or 1000 like the scraper when it is missing."""
+    try:
+        return int(_first(record.get("year")))
+    except (TypeError, ValueError):
+        return 1000
+
+
+def to_publication(record):
+    """Maps an export record onto the publication fields produced by hint2publications.py."""
+    abstract = _first(record.get("abstract"))
+    if isinstance(abstract, dict):
+        abstract = abstract.get("text")
+    doi = _first(record.get("doi"))
+    if doi and not doi.startswith("http"):
+        doi = f"http://doi.org/{doi}"
+    publication_type = "Journal Article" if record.get("type") == "journalArticle" else "Type not specified"
+    if publication_type != "Type not specified" and record.get("subtype") in subtype_labels:
+        publication_type += f" ({subtype_labels[record['subtype']]})"
+    return {
+        "year": _year(record),
+        "url": record.get("handle") or f"http://hdl.handle.net/1854/LU-{record['_id']}",
+        "abstract": abstract.strip() if abstract else "Abstract not available",
+        "type": publication_type,
+        "doi": doi or "DOI not available",
+        "classification": record.get("classification") or "Classification not specified",
+    }
+
+
+def fetch_researcher_publications(name, min_year):
+    """Returns a researcher's A1 publications since min_year from the bulk export, newest first.
+
+    The server is asked to filter on year and classification; the same filter is
+    applied to the raw records again in case it ignores those parameters. Raises
+    ExportError (or the requests exception) if any page could not be fetched, so a
+    partial list is never taken for the researcher's complete one.
+    """
+    publications = []
+    start = 0
+    while True:
+        response = http_cache.get(export_page_url(name, min_year, start), timeout=30)
+        with _lock:
+            stats["requests"] += 1
+        if response.status_code != 200:
+            raise ExportError(f"Export of {name} failed with status {response.status_code}")
+        try:
+            records = json.loads(response.text)
+        except ValueError as e:
+            raise ExportError(f"Export of {name} is not valid JSON: {e}") from e
+        if not isinstance(records, list):
+            raise ExportError(f"Export of {name} is not a list of records")
+        with _lock:
+            stats["records"] += len(records)
+        for record in records:
+            if record.get("classification") == "A1" and _year(record) >= min_year:
+                publications.append(to_publication(record))
+        if len(records) < page_size:
+            break
+        start += page_size
+    with _lock:
+        stats["kept"] += len(publications)
+    publications.sort(key=lambda publication: publication["year"], reverse=True)
+    return publications
+
+
+def report():
+    """Prints the export counters for this run."""
+    print(f"Biblio export: {stats['requests']} requests, {stats['records']} records received, {stats['kept']} A1 records kept")
+
+
+def record_response(name, path, min_year):
+    """Saves the first raw export page of a researcher with the query it answers."""
+    response = http_cache.get(export_page_url(name, min_year, 0), max_age=0, timeout=30)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"name": name, "min_year": min_year, "status": response.status_code, "body": response.text},
+                  file, indent=1, ensure_ascii=False)
+    print(f"Export page of {name} (status {response.status_code}) written to '{path}'.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "record":
+        record_response(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else datetime.now().year - 9)
+    else:
+        print('Usage: python biblio_export.py record "<name>" <output file> [min_year]')
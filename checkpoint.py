@@ -0,0 +1,41 @@
+import json
+import os
+
+
+def iter_journal(path):
+    """Yields the complete entries of a checkpoint journal one at a time, skipping lines torn by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def load_journal(path):
+    """Reads all complete entries from a checkpoint journal, skipping lines torn by a crash."""
+    return list(iter_journal(path))
+
+
+def open_journal(path):
+    """Opens a checkpoint journal for appending, dropping a half-written last line first."""
+    if os.path.exists(path):
+        with open(path, "rb+") as journal:
+            content = journal.read()
+            if content and not content.endswith(b"\n"):
+                journal.truncate(content.rfind(b"\n") + 1)
+    return open(path, "a", encoding="utf-8")
+
+
+def record(journal, event, **fields):
+    """Appends one event to the journal and flushes it so it survives a crash or Ctrl-C."""
+    journal.write(json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n")
+    journal.flush()
+
+
+def close_journal(journal, path):
+    """Closes and removes a journal once its contents have been compacted into the final output."""
+    journal.close()
+    os.remove(path)
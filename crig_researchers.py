@@ -1,11 +1,20 @@
 import requests
+import http_cache
+import metrics
+import checkpoint
+import profile_resolver
+import rate_limiter
 from bs4 import BeautifulSoup
 import json
-import time
 import re
 from datetime import datetime
 import unicodedata
 
+@metrics.timed("parse")
+def parse_html(html):
+    """Parse a page with BeautifulSoup."""
+    return BeautifulSoup(html, 'html.parser')
+
 def clean_html(text):
     """Remove HTML tags and clean up whitespace."""
     text = re.sub(r'<[^>]+>', '', text)
@@ -89,39 +98,58 @@ def get_publications_url(profile_url):
     """Convert profile URL to publications URL."""
     return profile_url.replace('/en', '/publications/en')
 
+def probe_profile_url(url, messages):
+    """Check whether a profile URL exists; a successful page ends up in the HTTP cache.
+
+    Probes run concurrently, so failures go into messages (url -> line) to be printed in candidate order.
+    Returns True, False, or None if the request failed (see profile_resolver.probe_first()).
+    """
+    try:
+        response = http_cache.get(url, timeout=15)  # Increased timeout
+        if response.status_code == 200:
+            return True
+        elif response.status_code == 404:
+            messages[url] = f"  ✗ Not found (404): {url}"
+        elif response.status_code == 500:
+            messages[url] = f"  ✗ Server error (500): {url}"
+        else:
+            messages[url] = f"  ✗ Failed ({response.status_code}): {url}"
+        return profile_resolver.probe_result(response.status_code)
+    except requests.RequestException as e:
+        messages[url] = f"  ✗ Error: {url} - {str(e)}"
+        return None
+
 def scrape_researcher_details(name):
-    """Scrape details from a researcher's profile page."""
+    """Scrape details from a researcher's profile page.
+
+    Returns {} if the researcher has no profile and None if one of its pages could not be fetched.
+    """
     print(f"\nAttempting to find profile for: {name}")
     urls = get_research_profile_urls(name)
     details = {}
-    profile_url = None
     
-    # Try each possible URL
+    # Try the possible URLs concurrently, unless the slug store already knows the answer
+    messages = {}
+    try:
+        profile_url = profile_resolver.resolve(name, urls, lambda url: probe_profile_url(url, messages))
+    except profile_resolver.ProfileLookupError as e:
+        profile_url = e
     for url in urls:
-        try:
-            response = requests.get(url, timeout=15)  # Increased timeout
-            if response.status_code == 200:
-                profile_url = url
-                print(f"  ✓ Success: {url}")
-                break
-            elif response.status_code == 404:
-                print(f"  ✗ Not found (404): {url}")
-            elif response.status_code == 500:
-                print(f"  ✗ Server error (500): {url}")
-            else:
-                print(f"  ✗ Failed ({response.status_code}): {url}")
-            time.sleep(1)  # Increased delay between attempts
-        except requests.RequestException as e:
-            print(f"  ✗ Error: {url} - {str(e)}")
-            time.sleep(1)
-            continue
+        if url in messages:
+            print(messages[url])
+    if isinstance(profile_url, profile_resolver.ProfileLookupError):
+        print(f"  ! Could not check the profile of {name}: {profile_url}")
+        return None
     
     if not profile_url:
         print(f"  ! No working profile URL found for {name}")
         return {}
+    print(f"  ✓ Success: {profile_url}")
     
     try:
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = http_cache.get(profile_url, timeout=15)
+        response.raise_for_status()
+        soup = parse_html(response.text)
         
         # Extract research disciplines
         disciplines_div = soup.find('div', {'id': 'id23'})
@@ -155,9 +183,12 @@ def scrape_researcher_details(name):
         # Scrape publications
         publications_url = get_publications_url(profile_url)
         try:
-            publications_response = requests.get(publications_url, timeout=15)
+            publications_response = http_cache.get(publications_url, timeout=15)
+            if publications_response.status_code not in (200, 404):
+                print(f"  Error fetching publications: status {publications_response.status_code}")
+                return None
             if publications_response.status_code == 200:
-                publications_soup = BeautifulSoup(publications_response.text, 'html.parser')
+                publications_soup = parse_html(publications_response.text)
                 
                 publications = []
                 current_year = datetime.now().year
@@ -202,9 +233,11 @@ def scrape_researcher_details(name):
                     
         except requests.RequestException as e:
             print(f"  Error fetching publications: {str(e)}")
+            return None
 
     except Exception as e:
         print(f"  Error processing profile: {str(e)}")
+        return None
 
     return details
 
@@ -214,9 +247,9 @@ def main():
     print(f"Fetching CRIG members from {url}")
 
     try:
-        response = requests.get(url, timeout=15)
+        response = http_cache.get(url, timeout=15)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = parse_html(response.text)
 
         # Find all researcher profile links
         researchers = []
@@ -244,18 +277,34 @@ def main():
                     researchers.append({'name': name, 'profile_url': profile_url})
 
         print(f"\nFound {len(researchers)} researchers")
+
+        # Resume from the journal of an interrupted run, if any
+        journal_file = 'researchers_crig.journal.jsonl'
+        finished = {}
+        for entry in checkpoint.load_journal(journal_file):
+            if entry['event'] == 'researcher':
+                finished[entry['researcher']['profile_url']] = entry['researcher']
+        if finished:
+            print(f"Resuming: {len(finished)} researchers already done")
+        journal = checkpoint.open_journal(journal_file)
+        incomplete = 0
         
         # Extract detailed information from each researcher's profile
         for researcher in researchers:
+            if researcher['profile_url'] in finished:
+                researcher.update(finished[researcher['profile_url']])
+                continue
+
             print(f"\nProcessing {researcher['name']}...")
             
             # Get CRIG profile info
             profile_url = researcher['profile_url']
+            complete = True
             try:
-                profile_response = requests.get(profile_url, timeout=15)
+                profile_response = http_cache.get(profile_url, timeout=15)
                 profile_response.raise_for_status()
                 
-                profile_soup = BeautifulSoup(profile_response.text, 'html.parser')
+                profile_soup = parse_html(profile_response.text)
 
                 # Extract description from meta tag
                 description_tag = profile_soup.find('meta', {'name': 'description'})
@@ -276,24 +325,40 @@ def main():
                             researcher['research_focus'] = research_focus_list
                             print(f"  Found {len(research_focus_list)} research focus items")
 
-            except requests.RequestException as e:
+            except (requests.RequestException, rate_limiter.CircuitOpenError) as e:
                 print(f"  Error fetching CRIG profile: {str(e)}")
+                complete = False
 
             # Get research.ugent.be profile info
             try:
                 details = scrape_researcher_details(researcher['name'])
-                researcher.update(details)
+                if details is None:
+                    complete = False
+                else:
+                    researcher.update(details)
             except Exception as e:
                 print(f"  Error fetching research profile: {str(e)}")
+                complete = False
 
-            # Rate limiting
-            time.sleep(2)  # Increased delay between researchers
+            # Only complete researchers are journaled, so a resumed run fetches the others again
+            if complete:
+                checkpoint.record(journal, 'researcher', researcher=researcher)
+            else:
+                incomplete += 1
 
         # Save the JSON data
         with open('researchers_crig.json', 'w', encoding='utf-8') as f:
             json.dump(researchers, f, indent=2, ensure_ascii=False)
+        if incomplete:
+            journal.close()
+            print(f"\n{incomplete} researchers are incomplete because pages could not be fetched; "
+                  f"run the scraper again to retry them (journal kept in {journal_file})")
+        else:
+            checkpoint.close_journal(journal, journal_file)
 
         print("\nScraping completed. Data saved to researchers_crig.json")
+        http_cache.report()
+        metrics.report()
 
     except requests.RequestException as e:
         print(f"Error fetching CRIG members: {str(e)}")
@@ -301,4 +366,4 @@ def main():
         print(f"An unexpected error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
@@ -0,0 +1,60 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+# Persistent store of text embeddings, keyed by a hash of the embedding model and the text
+cache_file = "embedding_cache.sqlite"
+
+# Counters for the current run, printed by report()
+stats = {"hits": 0, "misses": 0}
+
+_lock = threading.Lock()
+_connection = None
+
+
+def _db():
+    """Opens the cache database on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(cache_file, check_same_thread=False)
+        _connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        _connection.commit()
+    return _connection
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def lookup_many(model, texts):
+    """Returns the stored embeddings of the texts that have one, as {text: list of floats}."""
+    keys = {cache_key(model, text): text for text in texts}
+    found = {}
+    with _lock:
+        db = _db()
+        items = list(keys.items())
+        # Stay below SQLite's limit on query parameters
+        for start in range(0, len(items), 500):
+            batch = dict(items[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            for key, vector in db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                                          list(batch)):
+                found[batch[key]] = np.frombuffer(vector, dtype=np.float32).tolist()
+        stats["hits"] += len(found)
+        stats["misses"] += len(keys) - len(found)
+    return found
+
+
+def store_many(model, vectors):
+    """Stores embeddings given as {text: vector}."""
+    with _lock:
+        db = _db()
+        db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                       [(cache_key(model, text), np.asarray(vector, dtype=np.float32).tobytes())
+                        for text, vector in vectors.items()])
+        db.commit()
+
+
+def report():
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
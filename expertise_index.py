@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+from langchain.embeddings import OllamaEmbeddings
+
+# Semantic "who has expertise in X" search over per-paper expertise and researcher summaries.
+# Usage: python expertise_index.py build
+#        python expertise_index.py query "mass spectrometry rescoring"
+
+# Define the input and output file paths
+expertise_file = 'test.publications_data_expertise.json'  # JSON or JSONL output of generate_expertise.py
+summary_file = 'test.publications_data_expertise_summary.json'
+vectors_file = 'expertise_index.f32'  # Row-major float32 matrix of normalised embeddings, memory-mapped for queries
+metadata_file = 'expertise_index.meta.jsonl'  # One line per matrix row
+retired_file = 'expertise_index.retired.json'  # Keys of rows whose text no longer appears in the inputs
+
+# Embedding settings
+embedding_model = "nomic-embed-text"
+embedding_batch_size = 64
+top_k = 10  # Researchers returned per query
+papers_per_researcher = 3  # Supporting papers shown per researcher
+candidate_rows = 500  # Best-matching rows considered when ranking researchers
+
+embeddings = OllamaEmbeddings(model=embedding_model)
+
+# Rows, matrix and live-row mask of the files on disk, reused by queries until the files change
+_index = {"stamp": None, "rows": [], "matrix": None, "live": None}
+
+
+def row_key(kind, researcher, text):
+    """Identifies an indexed text so re-running build only embeds new or changed texts."""
+    return hashlib.sha256(json.dumps([kind, researcher, text], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_metadata():
+    """Reads the row metadata, dropping rows whose vectors were never written and a torn last line."""
+    if not os.path.exists(metadata_file):
+        return []
+    rows = []
+    with open(metadata_file, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                break
+    if rows:
+        dimension = rows[0]["dimension"]
+        vector_rows = os.path.getsize(vectors_file) // (4 * dimension) if os.path.exists(vectors_file) else 0
+        rows = rows[:vector_rows]
+    return rows
+
+
+def repair(rows):
+    """Cuts both files back to the rows of load_metadata(), before build appends to them.
+
+    Vectors are written before their metadata, so a crash in between leaves vectors
+    without metadata at the end of the matrix; appending behind them would shift
+    every later row onto the wrong text.
+    """
+    if rows:
+        size = len(rows) * rows[0]["dimension"] * 4
+        if os.path.getsize(vectors_file) != size:
+            os.truncate(vectors_file, size)
+    elif os.path.exists(vectors_file):
+        os.truncate(vectors_file, 0)
+    if os.path.exists(metadata_file):
+        with open(metadata_file, "r", encoding="utf-8") as file:
+            intact = sum(1 for line in file if line.strip()) == len(rows)
+        if not intact:
+            with open(metadata_file, "w", encoding="utf-8") as file:
+                for row in rows:
+                    file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def load_index():
+    """Returns the metadata rows, the memory-mapped matrix and a boolean mask of the rows that are not retired.
+
+    The result is cached and only read again when one of the index files changed.
+    """
+    stamp = tuple((os.path.getmtime(path), os.path.getsize(path)) if os.path.exists(path) else None
+                  for path in (metadata_file, vectors_file, retired_file))
+    if stamp != _index["stamp"]:
+        rows = load_metadata()
+        retired = set()
+        if os.path.exists(retired_file):
+            with open(retired_file, "r", encoding="utf-8") as file:
+                retired = set(json.load(file))
+        _index.update(stamp=stamp, rows=rows, matrix=load_matrix(rows),
+                      live=np.array([row["key"] not in retired for row in rows], dtype=bool))
+    return _index["rows"], _index["matrix"], _index["live"]
+
+
+def load_matrix(rows):
+    """Memory-maps the embedding matrix for the given metadata rows."""
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.memmap(vectors_file, dtype=np.float32, mode="r", shape=(len(rows), rows[0]["dimension"]))
+
+
+def iter_texts():
+    """Yields (kind, researcher, url, text) for every expertise string and summary to index."""
+    if expertise_file.endswith(".jsonl"):
+        with open(expertise_file, "r", encoding="utf-8") as file:
+            for line in file:
+                pub = json.loads(line)
+                if pub.get("expertise"):
+                    yield "paper", pub["researcher"], pub["url"], pub["expertise"]
+    else:
+        with open(expertise_file, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        for researcher, publications in data.items():
+            for pub in publications:
+                if pub.get("expertise"):
+                    yield "paper", researcher, pub["url"], pub["expertise"]
+    if os.path.exists(summary_file):
+        with open(summary_file, "r", encoding="utf-8") as file:
+            for researcher, summary in json.load(file).items():
+                yield "summary", researcher, None, summary
+
+
+def normalize(vectors):
+    """Scales rows to unit length so a dot product is the cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def build():
+    """Embeds the texts that are not in the index yet and appends them, without rebuilding existing rows."""
+    rows = load_metadata()
+    repair(rows)
+    indexed = {row["key"] for row in rows}
+    known = set(indexed)
+    current = set()
+    pending = []
+    for kind, researcher, url, text in iter_texts():
+        key = row_key(kind, researcher, text)
+        current.add(key)
+        if key not in known:
+            known.add(key)
+            pending.append({"key": key, "kind": kind, "researcher": researcher, "url": url, "text": text})
+
+    for start in range(0, len(pending), embedding_batch_size):
+        batch = pending[start:start + embedding_batch_size]
+        vectors = normalize(embeddings.embed_documents([row["text"] for row in batch]))
+        # Vectors go first, so a crash never leaves metadata without its vectors
+        with open(vectors_file, "ab") as file:
+            vectors.tofile(file)
+        with open(metadata_file, "a", encoding="utf-8") as file:
+            for row in batch:
+                file.write(json.dumps({**row, "dimension": vectors.shape[1]}, ensure_ascii=False) + "\n")
+        print(f"Indexed {min(start + embedding_batch_size, len(pending))}/{len(pending)} new texts")
+
+    # Rows of replaced texts stay in the matrix but are masked out of queries
+    retired = sorted(indexed - current)
+    with open(retired_file, "w", encoding="utf-8") as file:
+        json.dump(retired, file)
+    print(f"Index holds {len(current)} current texts ({len(retired)} retired rows).")
+
+
+def search(query):
+    """Returns researchers ranked by their best-matching expertise, each with their best supporting papers."""
+    rows, matrix, live = load_index()
+    live_rows = np.flatnonzero(live)
+    if not len(live_rows):
+        return []
+    query_vector = normalize([embeddings.embed_query(query)])[0]
+    # Retired rows are left out before selection, so they never take a candidate slot
+    scores = (matrix @ query_vector)[live_rows]
+
+    # Only sort the best rows instead of the whole index
+    count = min(candidate_rows, len(scores))
+    best = np.argpartition(-scores, count - 1)[:count]
+    best = best[np.argsort(-scores[best])]
+
+    ranking = {}
+    for index in best:
+        row = rows[live_rows[index]]
+        researcher = ranking.setdefault(row["researcher"], {"researcher": row["researcher"],
+                                                            "score": float(scores[index]), "papers": []})
+        if row["kind"] == "paper" and len(researcher["papers"]) < papers_per_researcher:
+            researcher["papers"].append({"url": row["url"], "expertise": row["text"], "score": float(scores[index])})
+    return list(ranking.values())[:top_k]
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        build()
+    elif len(sys.argv) >= 3 and sys.argv[1] == "query":
+        for rank, result in enumerate(search(" ".join(sys.argv[2:])), start=1):
+            print(f"{rank}. {result['researcher']} ({result['score']:.3f})")
+            for paper in result["papers"]:
+                print(f"     {paper['score']:.3f} {paper['url']}")
+    else:
+        print('Usage: python expertise_index.py build | query "<expertise>"')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import json
+import sqlite3
+import sys
+import threading
+import biblio_export
+import job_queue
+
+# SQLite store of researchers, publications, expertise, summaries and projects,
+# with an FTS5 index over abstracts and expertise. The stages write to it in bulk,
+# one transaction per batch; the JSON files stay available through export_json().
+# With JOB_QUEUE_URL set, the reads and writes of the workers go to the store of the
+# job_queue.py coordinator, so workers on other hosts share one store.
+# Usage: python expertise_store.py import <publications or expertise JSON> [summary JSON] [projects JSON]
+#        python expertise_store.py export <expertise JSON> <summary JSON>
+#        python expertise_store.py search '"mass spectrometry"' [min_year] [classification]
+store_file = "expertise_store.sqlite"
+
+_lock = threading.Lock()
+_connection = None
+
+_schema = """
+CREATE TABLE IF NOT EXISTS researchers (
+    name TEXT PRIMARY KEY, summary TEXT);
+CREATE TABLE IF NOT EXISTS publications (
+    id INTEGER PRIMARY KEY, handle TEXT NOT NULL UNIQUE, url TEXT, year INTEGER, abstract TEXT, type TEXT, doi TEXT,
+    classification TEXT, expertise TEXT);
+CREATE INDEX IF NOT EXISTS publications_year ON publications (year);
+CREATE INDEX IF NOT EXISTS publications_classification ON publications (classification, year);
+CREATE INDEX IF NOT EXISTS publications_doi ON publications (doi);
+CREATE TABLE IF NOT EXISTS authorship (
+    researcher TEXT, handle TEXT, position INTEGER, url TEXT, year INTEGER,
+    PRIMARY KEY (researcher, handle));
+CREATE INDEX IF NOT EXISTS authorship_handle ON authorship (handle);
+CREATE TABLE IF NOT EXISTS projects (
+    researcher TEXT, position INTEGER, url TEXT, title TEXT, role TEXT, description TEXT, keywords TEXT,
+    PRIMARY KEY (researcher, url));
+CREATE VIRTUAL TABLE IF NOT EXISTS publications_fts USING fts5(
+    abstract, expertise, content='publications', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS publications_fts_insert AFTER INSERT ON publications BEGIN
+    INSERT INTO publications_fts (rowid, abstract, expertise) VALUES (new.id, new.abstract, new.expertise);
+END;
+CREATE TRIGGER IF NOT EXISTS publications_fts_delete AFTER DELETE ON publications BEGIN
+    INSERT INTO publications_fts (publications_fts, rowid, abstract, expertise)
+    VALUES ('delete', old.id, old.abstract, old.expertise);
+END;
+CREATE TRIGGER IF NOT EXISTS publications_fts_update AFTER UPDATE ON publications BEGIN
+    INSERT INTO publications_fts (publications_fts, rowid, abstract, expertise)
+    VALUES ('delete', old.id, old.abstract, old.expertise);
+    INSERT INTO publications_fts (rowid, abstract, expertise) VALUES (new.id, new.abstract, new.expertise);
+END;
+"""
+
+# Fields of a publication in the JSON layout, in output order
+publication_fields = ["year", "url", "abstract", "type", "doi", "classification", "expertise"]
+
+
+def _db():
+    """Opens the store on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(store_file, timeout=60, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(_schema)
+        _connection.commit()
+    return _connection
+
+
+def _upsert_publications(db, rows):
+    """Upserts (researcher, publication) pairs; a researcher's new publications are appended to their list.
+
+    Fields missing from a publication (e.g. the abstract of a co-author's short
+    jsonl record, or the expertise before it is generated) keep their stored value,
+    except that a new abstract without expertise clears the expertise of the old one.
+    """
+    publications, authorship, researchers = [], [], set()
+    for researcher, publication in rows:
+        handle = biblio_export.handle_id(publication["url"])
+        publications.append((handle, publication["url"], publication.get("year"), publication.get("abstract"),
+                             publication.get("type"), publication.get("doi"), publication.get("classification"),
+                             publication.get("expertise")))
+        if researcher is not None:
+            researchers.add(researcher)
+            authorship.append((researcher, handle, researcher, publication["url"], publication.get("year")))
+    db.executemany("INSERT OR IGNORE INTO researchers (name) VALUES (?)", [(name,) for name in researchers])
+    db.executemany(
+        "INSERT INTO publications (handle, url, year, abstract, type, doi, classification, expertise) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (handle) DO UPDATE SET "
+        "url = COALESCE(publications.url, excluded.url), year = COALESCE(excluded.year, publications.year), "
+        "abstract = COALESCE(excluded.abstract, publications.abstract), "
+        "type = COALESCE(excluded.type, publications.type), doi = COALESCE(excluded.doi, publications.doi), "
+        "classification = COALESCE(excluded.classification, publications.classification), "
+        "expertise = CASE WHEN excluded.expertise IS NOT NULL THEN excluded.expertise "
+        "WHEN excluded.abstract IS NOT NULL AND excluded.abstract IS NOT publications.abstract THEN NULL "
+        "ELSE publications.expertise END",
+        publications,
+    )
+    db.executemany(
+        "INSERT INTO authorship SELECT ?, ?, "
+        "COALESCE((SELECT MAX(position) + 1 FROM authorship WHERE researcher = ?), 0), ?, ? WHERE true "
+        "ON CONFLICT (researcher, handle) DO UPDATE SET url = excluded.url, year = excluded.year",
+        authorship,
+    )
+
+
+def _write_publications(rows):
+    with _lock:
+        with _db() as db:
+            _upsert_publications(db, rows)
+
+
+def _replace_researcher_publications(researcher, publications):
+    with _lock:
+        with _db() as db:
+            db.execute("DELETE FROM authorship WHERE researcher = ?", (researcher,))
+            _upsert_publications(db, ((researcher, publication) for publication in publications))
+
+
+def _write_summaries(summaries):
+    with _lock:
+        with _db() as db:
+            db.executemany("INSERT INTO researchers VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET summary = excluded.summary",
+                           list(summaries.items()))
+
+
+def write_publications(rows):
+    """Upserts (researcher, publication) pairs in one transaction."""
+    if job_queue.coordinator_url is not None:
+        return job_queue.call_coordinator("store_write_publications", rows=[list(row) for row in rows])
+    _write_publications(rows)
+
+
+def replace_researcher_publications(researcher, publications):
+    """Replaces the publication list of one researcher, in the given order, in one transaction."""
+    if job_queue.coordinator_url is not None:
+        return job_queue.call_coordinator("store_replace_researcher_publications", researcher=researcher,
+                                          publications=list(publications))
+    _replace_researcher_publications(researcher, publications)
+
+
+def write_summaries(summaries):
+    """Upserts researcher summaries ({name: summary}) in one transaction."""
+    if job_queue.coordinator_url is not None:
+        return job_queue.call_coordinator("store_write_summaries", summaries=summaries)
+    _write_summaries(summaries)
+
+
+def write_projects(people):
+    """Replaces the projects of the given people (dicts with name and projects) in one transaction."""
+    with _lock:
+        with _db() as db:
+            for person in people:
+                db.execute("INSERT OR IGNORE INTO researchers (name) VALUES (?)", (person["name"],))
+                db.execute("DELETE FROM projects WHERE researcher = ?", (person["name"],))
+                db.executemany("INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                    (person["name"], position, project["project_URL"], project.get("project_Title"),
+                     project.get("project_As"), project.get("project_Description"), project.get("project_Keywords"))
+                    for position, project in enumerate(person.get("projects", []))
+                ])
+
+
+def import_json(publications_file, summary_file=None, projects_file=None):
+    """Loads the JSON files of the pipeline into the store."""
+    with open(publications_file, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    for researcher, publications in data.items():
+        replace_researcher_publications(researcher, publications)
+    if summary_file:
+        with open(summary_file, "r", encoding="utf-8") as file:
+            write_summaries(json.load(file))
+    if projects_file:
+        with open(projects_file, "r", encoding="utf-8") as file:
+            write_projects([person for person in json.load(file) if person.get("name")])
+
+
+_select_publications = (
+    "SELECT a.researcher, a.year, a.url, p.abstract, p.type, p.doi, p.classification, p.expertise "
+    "FROM authorship a JOIN publications p ON p.handle = a.handle "
+)
+
+
+def _publication_record(values):
+    return {field: value for field, value in zip(publication_fields, values) if value is not None}
+
+
+def export_json():
+    """Returns (publications by researcher, summaries) in the layout of the pipeline's JSON files."""
+    with _lock:
+        db = _db()
+        rows = db.execute(
+            _select_publications + "JOIN researchers r ON r.name = a.researcher ORDER BY r.rowid, a.position"
+        ).fetchall()
+        names = db.execute("SELECT name, summary FROM researchers ORDER BY rowid").fetchall()
+    data = {name: [] for name, _ in names}
+    for researcher, *values in rows:
+        data.setdefault(researcher, []).append(_publication_record(values))
+    summaries = {name: summary for name, summary in names if summary is not None}
+    return data, summaries
+
+
+def _researcher_publications(researcher):
+    with _lock:
+        rows = _db().execute(_select_publications + "WHERE a.researcher = ? ORDER BY a.position",
+                             (researcher,)).fetchall()
+    return [_publication_record(values) for _, *values in rows]
+
+
+def _publication(handle):
+    with _lock:
+        row = _db().execute("SELECT year, url, abstract, type, doi, classification, expertise FROM publications "
+                            "WHERE handle = ?", (handle,)).fetchone()
+    return _publication_record(row) if row is not None else None
+
+
+def researcher_publications(researcher):
+    """Returns the publications of one researcher in the JSON layout."""
+    if job_queue.coordinator_url is not None:
+        return job_queue.call_coordinator("store_researcher_publications", researcher=researcher)
+    return _researcher_publications(researcher)
+
+
+def publication(handle):
+    """Returns one publication in the JSON layout, or None if it is not in the store."""
+    if job_queue.coordinator_url is not None:
+        return job_queue.call_coordinator("store_publication", handle=handle)
+    return _publication(handle)
+
+
+# Operations the job_queue.py coordinator serves to workers on other hosts
+coordinator_functions = {
+    "store_write_publications": _write_publications,
+    "store_replace_researcher_publications": _replace_researcher_publications,
+    "store_write_summaries": _write_summaries,
+    "store_researcher_publications": _researcher_publications,
+    "store_publication": _publication,
+}
+
+
+def search(query, min_year=None, classification=None, limit=50):
+    """Full-text search over abstracts and expertise (FTS5 query syntax), best matches first."""
+    sql = (
+        "SELECT p.handle, p.url, p.year, p.classification, "
+        "(SELECT group_concat(researcher, '; ') FROM authorship WHERE handle = p.handle), "
+        "snippet(publications_fts, -1, '[', ']', '...', 12) "
+        "FROM publications_fts JOIN publications p ON p.id = publications_fts.rowid "
+        "WHERE publications_fts MATCH ?"
+    )
+    parameters = [query]
+    if min_year is not None:
+        sql += " AND p.year >= ?"
+        parameters.append(min_year)
+    if classification is not None:
+        sql += " AND p.classification = ?"
+        parameters.append(classification)
+    sql += " ORDER BY bm25(publications_fts) LIMIT ?"
+    parameters.append(limit)
+    with _lock:
+        rows = _db().execute(sql, parameters).fetchall()
+    return [dict(zip(["handle", "url", "year", "classification", "researchers", "snippet"], row)) for row in rows]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "import" and len(sys.argv) >= 3:
+        import_json(*sys.argv[2:5])
+        print(f"Imported into '{store_file}'.")
+    elif command == "export" and len(sys.argv) >= 4:
+        data, summaries = export_json()
+        with open(sys.argv[2], "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+        with open(sys.argv[3], "w", encoding="utf-8") as file:
+            json.dump(summaries, file, indent=4, ensure_ascii=False)
+        print(f"Exported {len(data)} researchers to '{sys.argv[2]}' and '{sys.argv[3]}'.")
+    elif command == "search" and len(sys.argv) >= 3:
+        min_year = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        classification = sys.argv[4] if len(sys.argv) > 4 else None
+        for result in search(sys.argv[2], min_year, classification):
+            print(f"{result['year']} {result['classification']} {result['url']} ({result['researchers']})")
+            print(f"    {result['snippet']}")
+    else:
+        print("Usage: python expertise_store.py import <publications JSON> [summary JSON] [projects JSON]\n"
+              "       python expertise_store.py export <expertise JSON> <summary JSON>\n"
+              "       python expertise_store.py search '<FTS5 query>' [min_year] [classification]")
+
+
+if __name__ == "__main__":
+    main()
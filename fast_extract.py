@@ -0,0 +1,144 @@
+import re
+from datetime import datetime
+from urllib.parse import urljoin
+import lxml.html
+
+# XPath counterparts of the BeautifulSoup extractors in hint2publications.py and
+# research_explorer_projects.py. Both engines read a page without the control
+# characters lxml's parser drops, so they are meant to return the same values;
+# tests/test_fast_extract.py checks parity on fixture pages, and bench_extract.py
+# checks parity and speed on the pages in the HTTP cache.
+
+# Control characters other than tab and line breaks, which lxml's parser drops
+_control_characters = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_control_bytes = re.compile(rb"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def strip_control_characters(html):
+    """Removes the control characters lxml drops from a page given as str or bytes."""
+    if isinstance(html, bytes):
+        return _control_bytes.sub(b"", html)
+    return _control_characters.sub("", html)
+
+
+def _has_class(name):
+    """XPath predicate matching an element whose class attribute contains the given class."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _parse(html):
+    """Parses a page given as str or bytes into an lxml tree."""
+    if not html or not html.strip():
+        return lxml.html.fromstring("<html></html>")
+    html = strip_control_characters(html)
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+
+def _string(element):
+    """Mirrors BeautifulSoup's Tag.string: the text of an element with exactly one text node, else None."""
+    children = list(element)
+    if element.text and not children:
+        return element.text
+    if element.text or len(children) != 1 or children[0].tail:
+        return None
+    return _string(children[0])
+
+
+def _text(element):
+    """Mirrors BeautifulSoup's Tag.text."""
+    return element.text_content()
+
+
+def parse_publication_details(html):
+    """Extracts abstract, type, DOI and UGent classification from a publication page."""
+    tree = _parse(html)
+
+    # Extract abstract
+    abstract = tree.xpath('//dd[@itemprop="description"]')
+    abstract_text = _text(abstract[0]).strip() if abstract else "Abstract not available"
+
+    # Extract publication type
+    publication_type = next(
+        (dd for dd in tree.iter("dd") if re.search(r"Journal Article", _string(dd) or "")), None
+    )
+    publication_type_text = _text(publication_type).strip() if publication_type is not None else "Type not specified"
+    publication_type_text = re.sub(r"\s+", " ", publication_type_text)
+
+    # Extract DOI
+    doi_element = tree.xpath('//meta[@name="dc.identifier"][contains(@content, "doi.org")]')
+    doi = doi_element[0].get("content") if doi_element else "DOI not available"
+
+    # Extract UGent classification
+    classification = next((dt for dt in tree.iter("dt") if _string(dt) == "UGent classification"), None)
+    # The first dd after the label in document order, as BeautifulSoup's find_next('dd') picks it
+    classification_dd = classification.xpath("(descendant::dd | following::dd)[1]") if classification is not None else []
+    classification_text = _text(classification_dd[0]).strip() if classification_dd else "Classification not specified"
+
+    return {
+        "abstract": abstract_text,
+        "type": publication_type_text,
+        "doi": doi,
+        "classification": classification_text,
+    }
+
+
+def parse_publication_urls(html):
+    """Extracts publication URLs and years from a researcher's publication page."""
+    tree = _parse(html)
+    publications = []
+    current_year = datetime.now().year
+    for publication in tree.xpath(f"//div[{_has_class('bg-blue-hover')}]"):
+        link = publication.xpath(".//a[@href]")
+        year_span = publication.xpath('.//div[@data-type="year"]')
+        if link and year_span:
+            publication_url = link[0].get("href")
+            try:
+                publication_year = int(_text(year_span[0]).strip())
+            except ValueError:
+                publication_year = 1000
+            # Filter by year (past 9 years)
+            if current_year - publication_year <= 9:
+                publications.append((publication_url, publication_year))
+    return publications
+
+
+def parse_project_list(html, url):
+    """Extracts the title, URL and role of every project on a person's project page, or None if there are none."""
+    tree = _parse(html)
+    projects = tree.xpath(f"//div[{_has_class('fiche')}]")
+    if not projects:
+        return None
+
+    entries = []
+    for project in projects:
+        link = project.xpath(".//a[@href]")
+        if link:
+            title = project.xpath(f".//div[{_has_class('margin-bottom-ti')}]")[0].get("title")
+            # Closest header before the project, which may also be one of its ancestors
+            as_header = project.xpath(
+                f"(ancestor::div[{_has_class('header-5')}] | preceding::div[{_has_class('header-5')}])[last()]"
+            )
+            entries.append({
+                "project_Title": title,
+                "project_URL": urljoin(url, link[0].get("href")),
+                "project_As": _text(as_header[0]).strip() if as_header else "N/A",
+            })
+    return entries
+
+
+def parse_project_details(html):
+    """Extracts the description and comma-separated keywords from a project page."""
+    tree = _parse(html)
+    description_div = tree.xpath('//div[@id="description_showmore"]')
+    description = _text(description_div[0]).strip() if description_div else "No description available"
+
+    keywords_div = tree.xpath(f"//div[{_has_class('keywords')}]")
+    if keywords_div:
+        keywords = ", ".join(_text(span).strip() for span in keywords_div[0].iter("span"))
+    else:
+        keywords = "No keywords available"
+    return description, keywords
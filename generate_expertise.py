@@ -1,60 +1,386 @@
 from langchain.llms import Ollama
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import abstract_filter
+import biblio_export
+import expertise_store
+import job_queue
+import llm_cache
+import metrics
 import json
+import sys
+import threading
+import time
+
+# Define the input and output file paths
+input_file = 'test.publications_data.json'  # Output of hint2publications.py, either JSON or streamed JSONL
+summary_file = 'test.publications_data_expertise_summary.json'
+expertise_file = 'test.publications_data_expertise.json'
+expertise_jsonl_file = 'test.publications_data_expertise.jsonl'  # Used when the input is JSONL
+
+# LLM settings
+model_name = "llama3"
+temperature = 0
+max_llm_workers = 4  # Number of prompts sent to Ollama at the same time (match OLLAMA_NUM_PARALLEL)
+summary_mode = "single"  # "single" sends all expertise in one prompt, "hierarchical" summarises groups first (opt-in)
+summary_token_budget = 3000  # Maximum estimated tokens of expertise text in one summary prompt (llama3 context is 8192)
+expertise_mode = "single"  # "single" sends one abstract per prompt, "packed" several abstracts per prompt answered as a JSON array
+pack_token_budget = 2000  # Maximum estimated tokens of abstracts in one packed prompt
+pack_max_abstracts = 8  # Maximum number of abstracts in one packed prompt
+
+# Store settings
+write_store = True  # Also write expertise and summaries to the SQLite store of expertise_store.py
+store_batch_size = 500  # Publications written per transaction when streaming JSONL
+
+expertise_prompt_template = (
+    "Based on the following abstract, describe the expertise of the authors and any technology or software they used. "
+    "Make it concise, professional, and no longer than 80 words:\n\n"
+    "Abstract: {abstract}\n\n"
+    "Expertise:"
+)
+packed_expertise_prompt_template = (
+    "Below are {count} numbered abstracts. For each abstract, describe the expertise of the authors and any technology "
+    "or software they used. Make each description concise, professional, and no longer than 80 words.\n"
+    "Answer with only a JSON array of {count} strings, one per abstract, in the same order.\n\n"
+    "{abstracts}\n\n"
+    "JSON array:"
+)
+summary_prompt_template = (
+    "The following is a collection of expertise descriptions from publications associated with a researcher. "
+    "Create a cohesive, detailed, and professional summary of the researcher's expertise in no more than 150 words:\n\n"
+    "{combined_expertise}\n\n"
+    "Researcher's Expertise:"
+)
+group_summary_prompt_template = (
+    "The following is a collection of expertise descriptions from a subset of the publications of a researcher. "
+    "Summarize the expertise, technologies and software they show in no more than 100 words:\n\n"
+    "{combined_expertise}\n\n"
+    "Summary:"
+)
 
 # Initialize Ollama LLM
-llm = Ollama(model="llama3", temperature=0)
+llm = Ollama(model=model_name, temperature=temperature)
+
+# Send a prompt to the model, recording its latency and token counts
+def call_llm(stage, prompt):
+    started = time.perf_counter()
+    response = llm(prompt).strip()
+    metrics.llm_call(stage, prompt, response, time.perf_counter() - started, estimate_tokens)
+    if stage in ("expertise", "packed_expertise"):
+        count_expertise(**{stage: 1})
+    return response
 
 # Define a function to generate expertise descriptions
 def generate_expertise_description(abstract):
-    prompt = (
-        f"Based on the following abstract, describe the expertise of the authors and any technology or software they used. "
-        f"Make it concise, professional, and no longer than 80 words:\n\n"
-        f"Abstract: {abstract}\n\n"
-        f"Expertise:"
-    )
-    response = llm(prompt)
-    return response.strip()
+    prompt = expertise_prompt_template.format(abstract=abstract)
+    # Responses are cached on disk, so unchanged abstracts never reach the model again
+    return llm_cache.cached(model_name, temperature, expertise_prompt_template, abstract,
+                            lambda: call_llm("expertise", prompt))
+
+# Counters of the per-paper stage, printed by report_expertise_calls()
+expertise_stats = {"papers": 0, "expertise": 0, "packed_expertise": 0, "fallbacks": 0}  # Model calls by stage
+expertise_stats_lock = threading.Lock()
+
+def count_expertise(**amounts):
+    with expertise_stats_lock:
+        for name, amount in amounts.items():
+            expertise_stats[name] += amount
+
+# Parse a packed answer into one description per abstract, or None if it is not a JSON array of count items
+def parse_packed_response(response, count):
+    start, end = response.find("["), response.rfind("]")
+    if start < 0 or end < start:
+        return None
+    try:
+        descriptions = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(descriptions, list) or len(descriptions) != count:
+        return None
+    # Empty or non-string items are left to the single-abstract fallback
+    return [description.strip() if isinstance(description, str) and description.strip() else None
+            for description in descriptions]
+
+# Expertise for several abstracts: cached ones are reused and the rest are sent in one packed prompt.
+# Abstracts without a valid answer in the packed response fall back to one prompt each
+def generate_expertise_descriptions(abstracts):
+    results, missing = {}, []
+    for abstract in dict.fromkeys(abstracts):
+        response = (llm_cache.lookup(model_name, temperature, expertise_prompt_template, abstract)
+                    or llm_cache.lookup(model_name, temperature, packed_expertise_prompt_template, abstract))
+        if response is not None:
+            results[abstract] = response
+        else:
+            missing.append(abstract)
+    count_expertise(papers=len(abstracts))
+    if len(missing) > 1:
+        listing = "\n\n".join(f"Abstract {number}: {abstract}" for number, abstract in enumerate(missing, start=1))
+        prompt = packed_expertise_prompt_template.format(count=len(missing), abstracts=listing)
+        descriptions = parse_packed_response(call_llm("packed_expertise", prompt), len(missing)) or []
+        answered = {abstract: description for abstract, description in zip(missing, descriptions) if description}
+        if answered:
+            llm_cache.store_many(model_name, temperature, packed_expertise_prompt_template, answered)
+        results.update(answered)
+        count_expertise(fallbacks=len(missing) - len(answered))
+    for abstract in missing:
+        if abstract not in results:
+            results[abstract] = generate_expertise_description(abstract)
+    return [results[abstract] for abstract in abstracts]
+
+# Rough token count; llama3 averages about four characters per token on English text
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+# Split expertise descriptions into consecutive groups that each fit the token budget
+def chunk_by_tokens(texts, budget):
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+# Summarize one group of expertise descriptions into a shorter intermediate summary
+def summarize_group(expertise_group):
+    combined_expertise = "\n".join(expertise_group)
+    prompt = group_summary_prompt_template.format(combined_expertise=combined_expertise)
+    return llm_cache.cached(model_name, temperature, group_summary_prompt_template, combined_expertise,
+                            lambda: call_llm("group_summary", prompt))
+
+# Reduce expertise descriptions level by level until they fit in a single summary prompt.
+# Groups are summarised one after the other: callers already summarise several researchers
+# at once on max_llm_workers threads, and a pool per call would multiply the prompts in flight
+def reduce_expertise(expertise_list):
+    while len(expertise_list) > 1 and estimate_tokens("\n".join(expertise_list)) > summary_token_budget:
+        groups = chunk_by_tokens(expertise_list, summary_token_budget)
+        expertise_list = [summarize_group(group) for group in groups]
+    return expertise_list
 
 # Define a function to summarize expertise by researcher
 def summarize_researcher_expertise(researcher, expertise_list):
+    if summary_mode == "hierarchical":
+        # Keeps every prompt within the context window, so latency per prompt stays predictable
+        expertise_list = reduce_expertise(expertise_list)
     combined_expertise = "\n".join(expertise_list)
-    prompt = (
-        f"The following is a collection of expertise descriptions from publications associated with a researcher. "
-        f"Create a cohesive, detailed, and professional summary of the researcher's expertise in no more than 150 words:\n\n"
-        f"{combined_expertise}\n\n"
-        f"Researcher's Expertise:"
-    )
-    response = llm(prompt)
-    return response.strip()
-
-# Load the JSON data
-with open('test.publications_data.json', 'r') as file:
-    data = json.load(file)
-
-# Process each publication and group expertise by researcher
-expertise_by_researcher = {}
-for author, publications in data.items():
-    expertise_by_researcher[author] = []
+    prompt = summary_prompt_template.format(combined_expertise=combined_expertise)
+    return llm_cache.cached(model_name, temperature, summary_prompt_template, combined_expertise,
+                            lambda: call_llm("summary", prompt))
+
+# Map a function over items with a bounded number of calls in flight, yielding results in input order
+def map_bounded(executor, function, items, max_in_flight):
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(function, item)))
+        if len(pending) >= max_in_flight:
+            done_item, future = pending.popleft()
+            yield done_item, future.result()
+    while pending:
+        done_item, future = pending.popleft()
+        yield done_item, future.result()
+
+# The abstract of a publication, or "" if it is a placeholder or too short to send to the model
+def usable_abstract(pub):
+    abstract = pub.get("abstract", "")
+    return abstract if abstract_filter.usable(abstract) else ""
+
+# Expertise for one publication, or None if it has no usable abstract
+def publication_expertise(pub):
+    abstract = usable_abstract(pub)
+    if not abstract:
+        return None
+    count_expertise(papers=1)
+    return generate_expertise_description(abstract)
+
+# Split items into consecutive packs whose abstracts fit in one packed prompt
+def pack_by_tokens(items, abstract_of):
+    pack, pack_tokens = [], 0
+    for item in items:
+        tokens = estimate_tokens(abstract_of(item))
+        if pack and (pack_tokens + tokens > pack_token_budget or len(pack) >= pack_max_abstracts):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append(item)
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+# Expertise for a pack of publications, None for those without a usable abstract
+def packed_publication_expertise(pubs):
+    abstracts = [usable_abstract(pub) for pub in pubs]
+    descriptions = iter(generate_expertise_descriptions([abstract for abstract in abstracts if abstract]))
+    return [next(descriptions) if abstract else None for abstract in abstracts]
+
+# Expertise for a pack of (publication, first) items; only the first record of a paper is sent
+def packed_first_expertise(items):
+    return packed_publication_expertise([pub if first else {} for pub, first in items])
+
+# Expertise for a stream of (publication, first) items in input order, packed or one prompt per paper
+def expertise_stream(executor, items):
+    if expertise_mode != "packed":
+        return map_bounded(executor, first_publication_expertise, items, 2 * max_llm_workers)
+    packs = pack_by_tokens(items, lambda item: item[0].get("abstract", "") if item[1] else "")
+    return ((item, expertise)
+            for pack, expertise_list in map_bounded(executor, packed_first_expertise, packs, 2 * max_llm_workers)
+            for item, expertise in zip(pack, expertise_list))
+
+# Print how many model calls the per-paper stage needed and how long it took
+def report_expertise_calls(seconds):
+    calls = expertise_stats["packed_expertise"] + expertise_stats["expertise"]
+    papers = expertise_stats["papers"]
+    print(f"Per-paper expertise ({expertise_mode}): {papers} papers, {calls} model calls "
+          f"({calls / papers if papers else 0:.2f} per paper; {expertise_stats['packed_expertise']} packed, "
+          f"{expertise_stats['fallbacks']} single-abstract fallbacks), {seconds:.1f}s")
+
+# Pair each publication with whether its expertise has to be generated. sources maps each paper to the
+# handle whose expertise it uses: later co-author records and near-duplicate abstracts reuse an earlier
+# paper's, and papers without a usable abstract map to None
+def first_by_handle(publications, sources):
+    index = abstract_filter.NearDuplicateIndex()
     for pub in publications:
-        abstract = pub.get("abstract", "")
-        if abstract:
-            expertise = generate_expertise_description(abstract)
-            pub["expertise"] = expertise
-            # Add the expertise for this paper to the author's group
-            expertise_by_researcher[author].append(expertise)
-
-# Generate a detailed expertise description for each researcher
-final_expertise_by_researcher = {}
-for researcher, expertise_list in expertise_by_researcher.items():
+        handle = biblio_export.handle_id(pub["url"])
+        first = handle not in sources
+        if first:
+            sources[handle] = abstract_filter.source(index, handle, pub.get("abstract", ""))
+        yield pub, first and sources[handle] == handle
+
+# Expertise for a paper whose expertise has to be generated; other records reuse it
+def first_publication_expertise(item):
+    pub, first = item
+    return publication_expertise(pub) if first else None
+
+# Expertise for one paper of the expertise queue, written to the store. A paper missing from the
+# store fails the job, so it is retried rather than counted as done
+def expertise_job(handle, payload=None):
+    pub = expertise_store.publication(handle)
+    if pub is None:
+        raise LookupError(f"Publication {handle} is not in the store '{expertise_store.store_file}'")
+    if pub.get("expertise") or not abstract_filter.usable(pub.get("abstract")):
+        return pub
+    pub["expertise"] = generate_expertise_description(pub["abstract"])
+    expertise_store.write_publications([(None, pub)])
+    return pub
+
+# Summary for one researcher of the summary queue; expertise still missing is generated first
+def summary_job(researcher, payload=None):
+    expertise_list = []
+    for pub in expertise_store.researcher_publications(researcher):
+        if abstract_filter.usable(pub.get("abstract")) and not pub.get("expertise"):
+            pub = expertise_job(biblio_export.handle_id(pub["url"]))
+        if pub.get("expertise"):
+            expertise_list.append(pub["expertise"])
     if expertise_list:
-        final_expertise_by_researcher[researcher] = summarize_researcher_expertise(researcher, expertise_list)
+        expertise_store.write_summaries({researcher: summarize_researcher_expertise(researcher, expertise_list)})
+
+# Work the expertise and then the summary queue with max_llm_workers threads, alongside any other workers
+def worker_main():
+    with ThreadPoolExecutor(max_workers=max_llm_workers) as executor:
+        for queue, job in ((job_queue.expertise_queue, expertise_job), (job_queue.summary_queue, summary_job)):
+            list(executor.map(lambda _: job_queue.work(queue, job), range(max_llm_workers)))
+    print(f"Expertise and summaries are in '{expertise_store.store_file}'.")
+
+# Generate expertise for every publication and a summary for every researcher
+def main():
+    if "--worker" in sys.argv:
+        worker_main()
+        llm_cache.report()
+        metrics.report()
+        return
+
+    # Process each publication and group expertise by researcher
+    expertise_by_researcher = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_llm_workers) as executor:
+        if input_file.endswith('.jsonl'):
+            # Stream the publications so memory does not grow with the corpus
+            with open(input_file, 'r', encoding='utf-8') as infile, \
+                    open(expertise_jsonl_file, 'w', encoding='utf-8') as outfile:
+                sources = {}
+                publications = first_by_handle((json.loads(line) for line in infile), sources)
+                expertise_by_handle = {}
+                store_rows = []
+                for (pub, first), expertise in expertise_stream(executor, publications):
+                    handle = biblio_export.handle_id(pub["url"])
+                    if first:
+                        expertise_by_handle[handle] = expertise
+                    else:
+                        # A co-author's record or a near-duplicate of a paper summarised earlier in the stream
+                        expertise = expertise_by_handle.get(sources[handle])
+                    expertise_by_researcher.setdefault(pub["researcher"], [])
+                    if expertise is not None:
+                        pub["expertise"] = expertise
+                        expertise_by_researcher[pub["researcher"]].append(expertise)
+                    outfile.write(json.dumps(pub, ensure_ascii=False) + "\n")
+                    if write_store:
+                        store_rows.append((pub["researcher"], pub))
+                        if len(store_rows) >= store_batch_size:
+                            expertise_store.write_publications(store_rows)
+                            store_rows = []
+                if write_store:
+                    expertise_store.write_publications(store_rows)
+            data = None
+        else:
+            # Load the JSON data
+            with open(input_file, 'r') as file:
+                data = json.load(file)
+
+            # Summarise each paper once, however many of its authors are in the data
+            unique = {}
+            for author, publications in data.items():
+                expertise_by_researcher[author] = []
+                for pub in publications:
+                    unique.setdefault(biblio_export.handle_id(pub["url"]), pub)
+            # Papers without a usable abstract and near-duplicates of an earlier abstract are not sent
+            index = abstract_filter.NearDuplicateIndex()
+            sources = {handle: abstract_filter.source(index, handle, pub.get("abstract", "")) for handle, pub in unique.items()}
+            generate = {handle: pub for handle, pub in unique.items() if sources[handle] == handle}
+            print(f"Generating expertise for {len(generate)} of {len(unique)} unique papers of "
+                  f"{sum(map(len, data.values()))} researcher-paper links.")
+            if expertise_mode == "packed":
+                packs = pack_by_tokens(generate.values(), lambda pub: pub.get("abstract", ""))
+                expertise_list = [expertise for pack in executor.map(packed_publication_expertise, packs)
+                                  for expertise in pack]
+            else:
+                expertise_list = executor.map(publication_expertise, generate.values())
+            generated = dict(zip(generate, expertise_list))
+            expertise_by_handle = {handle: generated.get(source) for handle, source in sources.items()}
+            for author, publications in data.items():
+                for pub in publications:
+                    expertise = expertise_by_handle[biblio_export.handle_id(pub["url"])]
+                    if expertise is not None:
+                        pub["expertise"] = expertise
+                        # Add the expertise for this paper to the author's group
+                        expertise_by_researcher[author].append(expertise)
+
+        report_expertise_calls(time.perf_counter() - started)
+        abstract_filter.report()
+
+        # Generate a detailed expertise description for each researcher
+        researchers = [researcher for researcher, expertise_list in expertise_by_researcher.items() if expertise_list]
+        summaries = executor.map(lambda researcher: summarize_researcher_expertise(researcher, expertise_by_researcher[researcher]),
+                                 researchers)
+        final_expertise_by_researcher = dict(zip(researchers, summaries))
+
+    # Save the final expertise descriptions to a new JSON file
+    with open(summary_file, 'w') as file:
+        json.dump(final_expertise_by_researcher, file, indent=4)
 
-# Save the final expertise descriptions to a new JSON file
-with open('test.publications_data_expertise_summary.json', 'w') as file:
-    json.dump(final_expertise_by_researcher, file, indent=4)
+    # Save the updated publications data with individual expertise descriptions
+    if data is not None:
+        with open(expertise_file, 'w') as file:
+            json.dump(data, file, indent=4)
+        if write_store:
+            expertise_store.write_publications((author, pub) for author, publications in data.items() for pub in publications)
+    if write_store:
+        expertise_store.write_summaries(final_expertise_by_researcher)
 
-# Save the updated publications data with individual expertise descriptions
-with open('test.publications_data_expertise.json', 'w') as file:
-    json.dump(data, file, indent=4)
+    print("Final expertise descriptions generated and saved successfully.")
+    llm_cache.report()
+    metrics.report()
 
-print("Final expertise descriptions generated and saved successfully.")
+if __name__ == "__main__":
+    metrics.run(main)
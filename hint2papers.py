@@ -1,4 +1,7 @@
 import requests
+import http_cache
+import metrics
+import profile_resolver
 import urllib.parse
 
 # Define the input and output file paths
@@ -52,12 +55,14 @@ def construct_urls(name):
 
 
 def check_url_exists(url):
-    """Checks if a URL exists by sending a HEAD request."""
+    """Checks if a URL exists with a GET request, which caches the person page for the other scrapers.
+
+    Returns True, False, or None if the request failed.
+    """
     try:
-        response = requests.head(url, allow_redirects=True, timeout=5)
-        return response.status_code == 200
+        return profile_resolver.probe_result(http_cache.get(url, timeout=5).status_code)
     except requests.RequestException:
-        return False
+        return None
 
 
 def main():
@@ -74,14 +79,12 @@ def main():
     # Process each name
     for name in names:
         possible_urls = construct_urls(name)
-        valid = False
-        for url in possible_urls:
-            if check_url_exists(url):
-                valid = True
-                break
-
-        if not valid:
-            invalid_urls.append((name, possible_urls))
+        # Known names are answered from the slug store, new ones are probed concurrently
+        try:
+            if profile_resolver.resolve(name, possible_urls, check_url_exists) is None:
+                invalid_urls.append((name, possible_urls))
+        except profile_resolver.ProfileLookupError as e:
+            print(f"Could not check the profile of {name} ({e}); it is probed again on the next run.")
 
     # Write invalid URLs and tested URLs to the log file
     if invalid_urls:
@@ -97,7 +100,9 @@ def main():
         print(f"Invalid URLs have been logged to '{log_file}'.")
     else:
         print("All URLs were constructed and verified successfully.")
+    http_cache.report()
+    metrics.report()
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
@@ -1,13 +1,40 @@
+import asyncio
+import aiohttp
 import requests
+import http_cache
+import metrics
+import checkpoint
+import job_queue
+import expertise_store
+import profile_resolver
+import rate_limiter
+import fast_extract
+import biblio_export
 import unicodedata
 import re
+import os
 import json
+import hashlib
+import sys
 from bs4 import BeautifulSoup
 from datetime import datetime
 
 # Define the input and output file paths
 input_file = "test.researchers.txt"  # Text file containing researcher names (one per line)
 output_json_file = "test.publications_data.json"
+output_jsonl_file = "test.publications_data.jsonl"
+checkpoint_file = "test.publications_data.journal.jsonl"  # Progress journal used to resume an interrupted run
+
+# Output settings
+output_format = "json"  # "json" writes output_json_file at the end, "jsonl" streams every publication to output_jsonl_file
+
+# Crawl settings
+source = "scrape"  # "scrape" reads every publication page, "biblio_export" pulls each researcher's A1 records in bulk
+crawl_mode = "async"  # "async" fetches pages concurrently, "sync" fetches them one by one
+max_concurrency = 32  # Maximum number of simultaneous requests in async mode
+max_per_host = 8  # Maximum number of simultaneous requests to a single host in async mode
+extraction_engine = "bs4"  # "bs4" uses the BeautifulSoup extractors below; "lxml" the faster XPath ones in fast_extract.py, opt-in until bench_extract.py shows no mismatches on recorded pages
+write_store = True  # Also write every finished researcher to the SQLite store of expertise_store.py
 
 def normalize_name(name):
     """Normalizes a name by replacing special characters with their base equivalents."""
@@ -36,74 +63,410 @@ def construct_possible_urls(name):
     ]
 
 def check_url_exists(url):
-    """Checks if a URL exists by sending a HEAD request."""
+    """Checks if a URL exists with a GET request, which also caches the page for the extraction that follows.
+
+    Returns True, False, or None if the request failed (see profile_resolver.probe_first()).
+    """
     try:
-        response = requests.head(url, allow_redirects=True, timeout=5)
-        return response.status_code == 200
+        return profile_resolver.probe_result(http_cache.get(url, timeout=10).status_code)
     except requests.RequestException:
-        return False
+        return None
+
+@metrics.timed("parse")
+def parse_publication_details(html):
+    """Extracts details from the HTML of a publication page."""
+    if extraction_engine == "lxml":
+        return fast_extract.parse_publication_details(html)
+    soup = BeautifulSoup(fast_extract.strip_control_characters(html), 'html.parser')
+
+    # Extract abstract
+    abstract = soup.find('dd', itemprop='description')
+    abstract_text = abstract.text.strip() if abstract else "Abstract not available"
+
+    # Extract publication type
+    publication_type = soup.find('dd', text=re.compile(r'Journal Article'))
+    publication_type_text = publication_type.text.strip() if publication_type else "Type not specified"
+    publication_type_text = re.sub(r"\s+", " ", publication_type_text)
+
+    # Extract DOI
+    doi_element = soup.find('meta', attrs={'name': 'dc.identifier', 'content': re.compile(r'doi\.org')})
+    doi = doi_element['content'] if doi_element else "DOI not available"
+
+    # Extract UGent classification
+    classification = soup.find('dt', text="UGent classification")
+    classification_text = classification.find_next('dd').text.strip() if classification else "Classification not specified"
 
-def extract_publication_details(publication_url):
-    """Extracts details from a specific publication page."""
+    return {
+        "abstract": abstract_text,
+        "type": publication_type_text,
+        "doi": doi,
+        "classification": classification_text,
+    }
+
+def extract_publication_details(publication_url, max_age=None):
+    """Extracts details from a specific publication page.
+
+    Returns {} if the page does not exist and None if it could not be fetched, so
+    a crawl can tell a removed paper from one to retry.
+    """
     try:
-        response = requests.get(publication_url, timeout=10)
+        response = http_cache.get(publication_url, max_age=max_age, timeout=10)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract abstract
-            abstract = soup.find('dd', itemprop='description')
-            abstract_text = abstract.text.strip() if abstract else "Abstract not available"
-            
-            # Extract publication type
-            publication_type = soup.find('dd', text=re.compile(r'Journal Article'))
-            publication_type_text = publication_type.text.strip() if publication_type else "Type not specified"
-            publication_type_text = re.sub(r"\s+", " ", publication_type_text)
-            
-            # Extract DOI
-            doi_element = soup.find('meta', attrs={'name': 'dc.identifier', 'content': re.compile(r'doi\.org')})
-            doi = doi_element['content'] if doi_element else "DOI not available"
-            
-            # Extract UGent classification
-            classification = soup.find('dt', text="UGent classification")
-            classification_text = classification.find_next('dd').text.strip() if classification else "Classification not specified"
-
-            return {
-                "abstract": abstract_text,
-                "type": publication_type_text,
-                "doi": doi,
-                "classification": classification_text,
-            }
+            return parse_publication_details(response.text)
+        if response.status_code in (404, 410):
+            return {}
     except requests.RequestException:
-        return None
+        pass
+    return None
+
+@metrics.timed("parse")
+def parse_publication_urls(html):
+    """Extracts publication URLs and years from the HTML of a researcher's publication page."""
+    if extraction_engine == "lxml":
+        return fast_extract.parse_publication_urls(html)
+    soup = BeautifulSoup(fast_extract.strip_control_characters(html), 'html.parser')
+    publications = []
+    current_year = datetime.now().year
+    for publication in soup.find_all('div', class_='bg-blue-hover'):
+        link = publication.find('a', href=True)
+        year_span = publication.find('div', {'data-type': 'year'})
+        if link and year_span:
+            publication_url = link['href']
+            try:
+                publication_year = int(year_span.text.strip())
+            except:
+                publication_year = 1000
+            # Filter by year (past 9 years)
+            if current_year - publication_year <= 9:
+                publications.append((publication_url, publication_year))
+    return publications
 
-def extract_publication_urls(publications_url):
-    """Extracts publication URLs and years from a researcher's publication page."""
+def extract_publication_urls(publications_url, max_age=None):
+    """Extracts publication URLs and years from a researcher's publication page, or None if it could not be fetched."""
     try:
-        response = requests.get(publications_url, timeout=10)
+        response = http_cache.get(publications_url, max_age=max_age, timeout=10)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            publications = []
-            current_year = datetime.now().year
-            for publication in soup.find_all('div', class_='bg-blue-hover'):
-                link = publication.find('a', href=True)
-                year_span = publication.find('div', {'data-type': 'year'})
-                if link and year_span:
-                    publication_url = link['href']
-                    try:
-                        publication_year = int(year_span.text.strip())
-                    except:
-                        publication_year = 1000                    
-                    # Filter by year (past 9 years)
-                    if current_year - publication_year <= 9:
-                        publications.append((publication_url, publication_year))
-            return publications
-        return []
+            return parse_publication_urls(response.text)
+        if response.status_code in (404, 410):
+            return []
+        return None
     except requests.RequestException:
-        return []
+        return None
 
-def main():
-    data = {}
+async def fetch_html(session, url):
+    """Fetches a page asynchronously and returns its HTML, "" if it does not exist, or None if it could not be fetched."""
+    try:
+        response = await http_cache.get_async(session, url, errors=(aiohttp.ClientError, asyncio.TimeoutError))
+        if response.status_code == 200:
+            return response.text
+        if response.status_code in (404, 410):
+            return ""
+    except (aiohttp.ClientError, asyncio.TimeoutError, requests.RequestException):
+        pass
+    return None
+
+async def extract_publication_details_async(session, publication_url):
+    """Asynchronous counterpart of extract_publication_details()."""
+    html = await fetch_html(session, publication_url)
+    if not html:
+        return None if html is None else {}
+    # Parsing is CPU bound, so keep it off the event loop
+    return await asyncio.to_thread(parse_publication_details, html)
+
+def load_progress(journal_path):
+    """Rebuilds the finished researchers and fetched publications from the checkpoint journal.
+
+    progress["publications"] is the global store of publication details keyed by
+    Biblio handle ID, and progress["researchers"] maps each finished researcher to
+    the handles (with URL and year) of their A1 publications.
+    """
+    progress = {"researchers": {}, "publications": {}, "written": set(), "emitted": set(), "inflight": {}}
+    for entry in checkpoint.iter_journal(journal_path):
+        if entry["event"] == "publication":
+            progress["publications"][entry.get("handle") or biblio_export.handle_id(entry["url"])] = entry["details"]
+        elif entry["event"] == "researcher":
+            publications = entry["publications"]
+            if publications and "handle" not in publications[0]:
+                # Journal of an older run that stored the full records per researcher
+                for publication in publications:
+                    handle = biblio_export.handle_id(publication["url"])
+                    progress["publications"].setdefault(handle, {key: value for key, value in publication.items()
+                                                                 if key not in ("year", "url")})
+                    publication["handle"] = handle
+            progress["researchers"][entry["name"]] = publications
+    progress["journal"] = checkpoint.open_journal(journal_path)
+    if output_format == "jsonl":
+        # The streamed output doubles as the journal of the A1 records written so far; it is
+        # read one record at a time and only the (researcher, handle) keys are kept
+        for record in checkpoint.iter_journal(output_jsonl_file):
+            handle = biblio_export.handle_id(record["url"])
+            progress["written"].add((record["researcher"], handle))
+            if "abstract" in record:
+                progress["emitted"].add(handle)
+        progress["output"] = checkpoint.open_journal(output_jsonl_file)
+    return progress
+
+def journaled_details(progress, handle):
+    """Returns the stored details of a publication, or None if its page still has to be fetched."""
+    details = progress["publications"].get(handle)
+    if details is None:
+        return None
+    # In jsonl mode only the classification is stored, so an A1 paper whose
+    # full record never made it into the output is fetched again
+    if "abstract" not in details and details.get("classification") == "A1" and handle not in progress["emitted"]:
+        return None
+    return details
+
+def record_publication(progress, handle, pub_url, details):
+    """Stores and journals the details of a fetched publication page."""
+    if output_format == "jsonl":
+        # A1 records are already in the streamed output, so keep the journal and memory small
+        details = {"classification": details.get("classification")}
+    progress["publications"][handle] = details
+    checkpoint.record(progress["journal"], "publication", handle=handle, url=pub_url, details=details)
+
+def emit_publication(progress, name, publication):
+    """Writes an A1 publication to the streamed output as soon as it is extracted.
+
+    Only the first researcher's record of a paper carries its details; co-authors
+    get a short record that refers to it through the same handle.
+    """
+    handle = biblio_export.handle_id(publication["url"])
+    if output_format != "jsonl" or (name, handle) in progress["written"]:
+        return
+    if handle in progress["emitted"]:
+        publication = {"year": publication["year"], "url": publication["url"],
+                       "classification": publication.get("classification")}
+    progress["output"].write(json.dumps({"researcher": name, **publication}, ensure_ascii=False) + "\n")
+    progress["output"].flush()
+    progress["written"].add((name, handle))
+    progress["emitted"].add(handle)
+
+def defer_researcher(name, failed):
+    """Leaves a researcher out of the journal, so the next run (or another worker) collects them again."""
+    print(f"  {failed} pages of {name} could not be fetched; {name} is retried on the next run.")
+
+def defer_on_error(name, error):
+    """Defers a researcher after an error that says nothing about their pages, such as an open circuit or a failed export."""
+    print(f"  {error}; {name} is retried on the next run.")
+
+def record_researcher(progress, name, publications):
+    """Journals a researcher whose publications have all been collected, as references into the store."""
+    if write_store:
+        expertise_store.replace_researcher_publications(name, publications)
+    if output_format == "jsonl":
+        publications = None
+    else:
+        publications = [{"handle": biblio_export.handle_id(publication["url"]), "url": publication["url"],
+                         "year": publication["year"]} for publication in publications]
+    progress["researchers"][name] = publications
+    checkpoint.record(progress["journal"], "researcher", name=name, publications=publications)
+
+def record_exported(progress, name, publications):
+    """Stores, emits and journals the publications of a researcher obtained from the Biblio export."""
+    for publication in publications:
+        handle = biblio_export.handle_id(publication["url"])
+        if handle not in progress["publications"]:
+            details = {key: value for key, value in publication.items() if key not in ("year", "url")}
+            record_publication(progress, handle, publication["url"], details)
+        emit_publication(progress, name, publication)
+    record_researcher(progress, name, publications)
+
+def researcher_publications(progress, name):
+    """Joins a researcher's handles with the publication store into the output records."""
+    return [{"year": entry["year"], "url": entry["url"], **progress["publications"][entry["handle"]]}
+            for entry in progress["researchers"][name]]
 
+def export_min_year():
+    """Oldest publication year kept, matching the 9-year window of parse_publication_urls()."""
+    return datetime.now().year - 9
+
+async def fetch_and_record_async(session, handle, pub_url, progress):
+    """Fetches a publication page once and stores its details."""
+    try:
+        details = await extract_publication_details_async(session, pub_url)
+        if details:
+            record_publication(progress, handle, pub_url, details)
+        return details
+    finally:
+        del progress["inflight"][handle]
+
+async def fetch_publication_async(session, pub_url, progress):
+    """Returns the details of a publication, fetching the page only if no co-author has done so already."""
+    handle = biblio_export.handle_id(pub_url)
+    details = journaled_details(progress, handle)
+    if details is not None:
+        return details
+    # Co-authors crawled at the same time wait for the fetch already in flight
+    if handle not in progress["inflight"]:
+        progress["inflight"][handle] = asyncio.ensure_future(fetch_and_record_async(session, handle, pub_url, progress))
+    return await progress["inflight"][handle]
+
+async def collect_researcher_async(session, name, progress):
+    """Collects the A1 publications of one researcher, fetching publication pages concurrently."""
+    if name in progress["researchers"]:
+        return
+    print(name)
+    if source == "biblio_export":
+        # One export request replaces the publication list and every publication page
+        try:
+            publications = await asyncio.to_thread(biblio_export.fetch_researcher_publications, name, export_min_year())
+        except (biblio_export.ExportError, requests.RequestException) as e:
+            defer_on_error(name, e)
+            return
+        record_exported(progress, name, publications)
+        return
+    publications = []
+    try:
+        url = await asyncio.to_thread(profile_resolver.resolve, name, construct_possible_urls(name), check_url_exists)
+    except profile_resolver.ProfileLookupError:
+        defer_researcher(name, 1)
+        return
+    # The existence check cached the page, so this is a local hit
+    html = await fetch_html(session, url) if url else ""
+    if html is None:
+        defer_researcher(name, 1)
+        return
+    if html:
+        publication_links = await asyncio.to_thread(parse_publication_urls, html)
+        details_list = await asyncio.gather(*(
+            fetch_publication_async(session, pub_url, progress) for pub_url, _ in publication_links
+        ))
+        failed = sum(details is None for details in details_list)
+        if failed:
+            defer_researcher(name, failed)
+            return
+        # gather() preserves the input order, so the output order matches the sync mode
+        publications = [
+            {"year": pub_year, "url": pub_url, **details}
+            for (pub_url, pub_year), details in zip(publication_links, details_list)
+            if details and details.get("classification") == "A1"
+        ]
+        for publication in publications:
+            emit_publication(progress, name, publication)
+    record_researcher(progress, name, publications)
+
+async def collect_or_defer_async(session, name, progress):
+    """Collects one researcher, deferring them if a host's circuit breaker opens meanwhile."""
+    try:
+        await collect_researcher_async(session, name, progress)
+    except rate_limiter.CircuitOpenError as e:
+        defer_on_error(name, e)
+
+async def crawl_async(names, progress):
+    """Crawls all researchers concurrently within the global and per-host concurrency limits."""
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=max_per_host)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(collect_or_defer_async(session, name, progress) for name in names))
+
+def collect_researcher(progress, name):
+    """Collects the A1 publications of one researcher, one page at a time."""
+    print(name)
+    if source == "biblio_export":
+        try:
+            publications = biblio_export.fetch_researcher_publications(name, export_min_year())
+        except (biblio_export.ExportError, requests.RequestException) as e:
+            defer_on_error(name, e)
+            return
+        record_exported(progress, name, publications)
+        return
+    publications = []
+    failed = 0
+    try:
+        url = profile_resolver.resolve(name, construct_possible_urls(name), check_url_exists)
+    except profile_resolver.ProfileLookupError:
+        defer_researcher(name, 1)
+        return
+    if url:
+        publication_links = extract_publication_urls(url)
+        if publication_links is None:
+            failed, publication_links = 1, []
+        for pub_url, pub_year in publication_links:
+            handle = biblio_export.handle_id(pub_url)
+            details = journaled_details(progress, handle)
+            if details is None:
+                details = extract_publication_details(pub_url)
+                if details:
+                    record_publication(progress, handle, pub_url, details)
+                elif details is None:
+                    failed += 1
+            if details and details.get("classification") == "A1":
+                publication = {
+                    "year": pub_year,
+                    "url": pub_url,
+                    **details
+                }
+                publications.append(publication)
+                emit_publication(progress, name, publication)
+    if failed:
+        defer_researcher(name, failed)
+        return
+    record_researcher(progress, name, publications)
+
+def crawl(names, progress):
+    """Crawls all researchers one page at a time."""
+    for name in names:
+        if name in progress["researchers"]:
+            continue
+        try:
+            collect_researcher(progress, name)
+        except rate_limiter.CircuitOpenError as e:
+            defer_on_error(name, e)
+
+def worker_progress():
+    """Progress of a worker process; the store and the job queue take the place of the journal."""
+    return {"researchers": {}, "publications": {}, "written": set(), "emitted": set(), "inflight": {},
+            "journal": open(os.devnull, "w")}
+
+def researcher_job(progress, name):
+    """Collects one researcher from the queue and queues the LLM work for their publications."""
+    if crawl_mode == "async":
+        asyncio.run(crawl_async([name], progress))
+    else:
+        crawl([name], progress)
+    if name not in progress["researchers"]:
+        # Fails the lease, so the researcher is retried
+        raise RuntimeError(f"Not every page of {name} could be fetched")
+    # Payloads are content hashes, so a later run queues the LLM work again only for what changed
+    abstract_hashes = [(entry["handle"], content_hash(progress["publications"][entry["handle"]].get("abstract")))
+                       for entry in progress["researchers"][name]]
+    job_queue.enqueue(job_queue.expertise_queue, abstract_hashes)
+    job_queue.enqueue(job_queue.summary_queue, [(name, content_hash(sorted(abstract_hashes)))])
+
+def content_hash(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def worker_main(names):
+    """Works the researcher queue together with any other workers sharing it, writing to the store.
+
+    Every worker queues the names of input_file; names already in the queue are skipped.
+    The worker started with --new-run first returns every name of an earlier run to the
+    queue, so their publication lists are crawled again.
+    """
+    global output_format, write_store
+    # Workers write to the shared store rather than to an output file of their own
+    output_format, write_store = "json", True
+    if "--new-run" in sys.argv:
+        print(f"Worker {job_queue.worker_id}: {job_queue.reset(job_queue.researcher_queue)} names of an earlier run "
+              f"queued again.")
+    added = job_queue.enqueue(job_queue.researcher_queue, names)
+    print(f"Worker {job_queue.worker_id}: queued {added} new names of {len(names)}.")
+    if not added and not job_queue.remaining(job_queue.researcher_queue):
+        print("Every name is done in an earlier run; start one worker with --worker --new-run to crawl them again.")
+    progress = worker_progress()
+    job_queue.work(job_queue.researcher_queue, lambda name, _: researcher_job(progress, name))
+    print(f"Publications are in '{expertise_store.store_file}'; "
+          f"'python expertise_store.py export' writes the JSON files once every worker is done.")
+
+def finish_journal(progress, unfinished):
+    """Removes the journal once every researcher is done; otherwise keeps it, so a rerun only retries the unfinished ones."""
+    if unfinished:
+        progress["journal"].close()
+    else:
+        checkpoint.close_journal(progress["journal"], checkpoint_file)
+
+def main():
     # Read the names from the input file
     try:
         with open(input_file, "r", encoding="utf-8") as file:
@@ -112,28 +475,46 @@ def main():
         print(f"Error: The file '{input_file}' does not exist.")
         return
 
+    if "--worker" in sys.argv:
+        worker_main(names)
+        http_cache.report()
+        metrics.report()
+        return
+
+    # Resume from the journal of an interrupted run, if any
+    progress = load_progress(checkpoint_file)
+    if progress["researchers"] or progress["publications"]:
+        print(f"Resuming: {len(progress['researchers'])} researchers and "
+              f"{len(progress['publications'])} publications already done.")
+
     # Process each name
-    for name in names:
-        print(name)
-        data[name] = []
-        possible_urls = construct_possible_urls(name)
-        for url in possible_urls:
-            if check_url_exists(url):
-                publication_links = extract_publication_urls(url)
-                for pub_url, pub_year in publication_links:
-                    details = extract_publication_details(pub_url)
-                    if details and details.get("classification") == "A1":
-                        data[name].append({
-                            "year": pub_year,
-                            "url": pub_url,
-                            **details
-                        })
-                break
-
-    # Write data to JSON
-    with open(output_json_file, "w", encoding="utf-8") as json_file:
-        json.dump(data, json_file, indent=4, ensure_ascii=False)
-    print(f"Data has been written to '{output_json_file}'.")
+    if crawl_mode == "async":
+        asyncio.run(crawl_async(names, progress))
+    else:
+        crawl(names, progress)
+
+    unfinished = [name for name in names if name not in progress["researchers"]]
+    if output_format == "jsonl":
+        progress["output"].close()
+        finish_journal(progress, unfinished)
+        print(f"Data has been streamed to '{output_jsonl_file}' "
+              f"({len(progress['written'])} researcher records of {len(progress['emitted'])} unique papers).")
+    else:
+        # Compact the journal into the final JSON file
+        data = {name: researcher_publications(progress, name) for name in names if name in progress["researchers"]}
+        with open(output_json_file, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file, indent=4, ensure_ascii=False)
+        finish_journal(progress, unfinished)
+        unique = {biblio_export.handle_id(publication["url"]) for publications in data.values() for publication in publications}
+        print(f"Data has been written to '{output_json_file}' "
+              f"({sum(map(len, data.values()))} researcher records of {len(unique)} unique papers).")
+    if unfinished:
+        print(f"{len(unfinished)} researchers are incomplete because pages could not be fetched; "
+              f"run the scraper again to retry them (journal kept in '{checkpoint_file}').")
+    if source == "biblio_export":
+        biblio_export.report()
+    http_cache.report()
+    metrics.report()
 
 if __name__ == "__main__":
-    main()
+    metrics.run(main)
@@ -0,0 +1,256 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+import requests
+import http_client
+import metrics
+import rate_limiter
+from datetime import timedelta
+from urllib.parse import urlparse
+from requests.structures import CaseInsensitiveDict
+
+# Cache settings shared by all scrapers
+cache_file = "http_cache.sqlite"
+cache_ttl = 7 * 24 * 3600  # Seconds a stored page is served without asking the server
+max_cache_bytes = 512 * 1024 * 1024  # Compressed size above which the least recently used pages are evicted
+origin_overrides = {}  # Origin -> replacement, e.g. to send requests to mock_ugent.py; pages stay cached under the original URL
+
+# Counters for the current run, printed by report()
+stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0}
+
+_lock = threading.Lock()
+_connection = None
+_total_size = None  # Running total of the stored sizes, so an insert does not sum the whole table
+
+
+def _db():
+    """Opens the cache database on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(cache_file, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, body BLOB, size INTEGER, encoding TEXT, "
+            "etag TEXT, last_modified TEXT, stored_at REAL, last_access REAL)"
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        _connection.commit()
+    return _connection
+
+
+def _lookup(url):
+    """Returns the cached entry for a URL as a dict, or None."""
+    with _lock:
+        row = _db().execute(
+            "SELECT body, encoding, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+    if row is None:
+        return None
+    body, encoding, etag, last_modified, stored_at = row
+    return {
+        "body": zlib.decompress(body),
+        "encoding": encoding,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored_at": stored_at,
+    }
+
+
+def age(url):
+    """Seconds since a page was stored or last revalidated, or None if it is not cached."""
+    with _lock:
+        row = _db().execute("SELECT stored_at FROM responses WHERE url = ?", (url,)).fetchone()
+    return None if row is None else time.time() - row[0]
+
+
+def _touch(url, refreshed=False):
+    """Marks an entry as recently used, and as freshly validated if refreshed is set."""
+    now = time.time()
+    with _lock:
+        db = _db()
+        if refreshed:
+            db.execute("UPDATE responses SET last_access = ?, stored_at = ? WHERE url = ?", (now, now, url))
+        else:
+            db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+        db.commit()
+
+
+def _store(url, body, encoding, etag, last_modified):
+    """Stores a compressed page and evicts the least recently used pages if the cache is too large."""
+    global _total_size
+    compressed = zlib.compress(body)
+    now = time.time()
+    with _lock:
+        db = _db()
+        if _total_size is None:
+            _total_size = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        replaced = db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, compressed, len(compressed), encoding, etag, last_modified, now, now),
+        )
+        _total_size += len(compressed) - (replaced[0] if replaced else 0)
+        while _total_size > max_cache_bytes:
+            oldest = db.execute("SELECT url, size FROM responses ORDER BY last_access LIMIT 1").fetchone()
+            if oldest is None or oldest[0] == url:
+                break
+            db.execute("DELETE FROM responses WHERE url = ?", (oldest[0],))
+            _total_size -= oldest[1]
+        db.commit()
+
+
+def _route(url):
+    """Returns the URL the request is actually sent to, after applying origin_overrides."""
+    for origin, target in origin_overrides.items():
+        if url.startswith(origin):
+            return target + url[len(origin):]
+    return url
+
+
+def _count(hits=0, revalidated=0, misses=0, bytes_saved=0):
+    """Updates the run counters; scrapers may call the cache from several threads."""
+    with _lock:
+        stats["hits"] += hits
+        stats["revalidated"] += revalidated
+        stats["misses"] += misses
+        stats["bytes_saved"] += bytes_saved
+
+
+def _validators(entry):
+    """Builds the conditional request headers for a stale entry."""
+    headers = {}
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def _measured(url, started, cache, response):
+    """Reports a request to metrics.py and passes the response through."""
+    metrics.http_request(url, response, time.perf_counter() - started, cache)
+    return response
+
+
+def _send(url, send):
+    """Sends a request through the rate limiter, reporting requests that fail to metrics.py."""
+    started = time.perf_counter()
+    metrics.resolve_host(urlparse(_route(url)).netloc)
+    try:
+        return rate_limiter.call(url, send)
+    except requests.RequestException:
+        metrics.http_request(url, None, time.perf_counter() - started, "miss")
+        raise
+
+
+def _cached_response(url, entry):
+    """Builds a requests.Response from a cached entry."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry["body"]
+    response.encoding = entry["encoding"]
+    response.headers = CaseInsensitiveDict({"X-Cache": "HIT"})
+    return response
+
+
+def get(url, max_age=None, **kwargs):
+    """Drop-in replacement for requests.get() that serves pages from the on-disk cache.
+
+    Fresh pages are returned without a request, stale pages are revalidated with
+    ETag/Last-Modified, and only 200 responses are stored. Requests go through the
+    pooled client in http_client.py. max_age overrides cache_ttl for this request;
+    0 always revalidates.
+    """
+    started = time.perf_counter()
+    entry = _lookup(url)
+    if entry and time.time() - entry["stored_at"] < (cache_ttl if max_age is None else max_age):
+        _count(hits=1, bytes_saved=len(entry["body"]))
+        _touch(url)
+        return _measured(url, started, "hit", _cached_response(url, entry))
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry:
+        headers.update(_validators(entry))
+    response = _send(url, lambda: http_client.get(_route(url), headers=headers, **kwargs))
+
+    if response.status_code == 304 and entry:
+        _count(revalidated=1, bytes_saved=len(entry["body"]))
+        _touch(url, refreshed=True)
+        _measured(url, started, "revalidated", response)
+        return _cached_response(url, entry)
+
+    _count(misses=1)
+    if response.status_code == 200:
+        encoding = response.encoding or response.apparent_encoding
+        _store(url, response.content, encoding, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return _measured(url, started, "miss", response)
+
+
+def head(url, **kwargs):
+    """Drop-in replacement for requests.head() that answers from the cache when the page is stored."""
+    started = time.perf_counter()
+    entry = _lookup(url)
+    if entry and time.time() - entry["stored_at"] < cache_ttl:
+        _count(hits=1)
+        response = _cached_response(url, entry)
+        response._content = b""
+        return _measured(url, started, "hit", response)
+    return _measured(url, started, "miss", _send(url, lambda: http_client.head(_route(url), **kwargs)))
+
+
+async def get_async(session, url, errors=()):
+    """Asynchronous counterpart of get() using an aiohttp session; errors are the exceptions worth retrying.
+
+    SQLite access and (de)compression run in worker threads, so they never block the event loop.
+    """
+    started = time.perf_counter()
+    entry = await asyncio.to_thread(_lookup, url)
+    if entry and time.time() - entry["stored_at"] < cache_ttl:
+        _count(hits=1, bytes_saved=len(entry["body"]))
+        await asyncio.to_thread(_touch, url)
+        return _measured(url, started, "hit", _cached_response(url, entry))
+
+    headers = _validators(entry) if entry else {}
+
+    async def send():
+        sent = time.perf_counter()
+        async with session.get(_route(url), headers=headers, allow_redirects=True) as aio_response:
+            response = requests.Response()
+            response.elapsed = timedelta(seconds=time.perf_counter() - sent)
+            body = await aio_response.read()
+            response.status_code = aio_response.status
+            response.url = str(aio_response.url)
+            response._content = body
+            response.encoding = aio_response.get_encoding() if body else "utf-8"
+            response.headers = CaseInsensitiveDict(aio_response.headers)
+            return response
+
+    metrics.resolve_host(urlparse(_route(url)).netloc)
+    try:
+        response = await rate_limiter.call_async(url, send, errors)
+    except errors:
+        metrics.http_request(url, None, time.perf_counter() - started, "miss")
+        raise
+    if response.status_code == 304 and entry:
+        _count(revalidated=1, bytes_saved=len(entry["body"]))
+        await asyncio.to_thread(_touch, url, True)
+        _measured(url, started, "revalidated", response)
+        return _cached_response(url, entry)
+
+    _count(misses=1)
+    if response.status_code == 200:
+        await asyncio.to_thread(_store, url, response.content, response.encoding, response.headers.get("ETag"),
+                                response.headers.get("Last-Modified"))
+    return _measured(url, started, "miss", response)
+
+
+def report():
+    """Prints the cache counters for this run."""
+    print(
+        f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated (304), "
+        f"{stats['misses']} misses, {stats['bytes_saved'] / 1024:.1f} KB not downloaded"
+    )
+    rate_limiter.report()
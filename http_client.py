@@ -0,0 +1,98 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Shared keep-alive HTTP client used by http_cache.py, so repeated requests to a
+# host reuse pooled connections instead of paying a new TCP+TLS handshake each.
+backend = "auto"  # "auto" uses httpx with HTTP/2 when the h2 package is installed, else a pooled requests.Session
+connect_timeout = 5  # Seconds, used when the caller passes no timeout
+read_timeout = 30
+pool_connections = 16  # Hosts with a pool of their own (requests)
+pool_maxsize = 32  # Connections kept open per host
+
+_lock = threading.Lock()
+_client = None
+
+
+def _http2_available():
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _create():
+    """Builds the shared client for the configured backend."""
+    http2 = _http2_available()
+    if backend == "httpx" and not http2:
+        print("HTTP client: the h2 package is not installed (pip install 'httpx[http2]'); httpx falls back to HTTP/1.1.")
+    elif backend == "auto" and not http2:
+        print("HTTP client: httpx or h2 is not installed (pip install 'httpx[http2]'); using requests over HTTP/1.1.")
+    if backend == "httpx" or (backend == "auto" and http2):
+        import httpx
+        return httpx.Client(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_connections * pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def client():
+    """Returns the shared client, creating it on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = _create()
+        return _client
+
+
+def _to_requests_response(response):
+    """Wraps an httpx response in a requests.Response, which is what the scrapers expect."""
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted._content = response.content
+    converted.headers = CaseInsensitiveDict(response.headers)
+    converted.url = str(response.url)
+    converted.encoding = response.charset_encoding
+    converted.elapsed = response.elapsed
+    converted.reason = response.reason_phrase
+    return converted
+
+
+def request(method, url, **kwargs):
+    """Sends a request with the shared client; accepts requests-style arguments and returns a requests.Response.
+
+    httpx errors are re-raised as requests exceptions, so callers handle both backends alike.
+    """
+    session = client()
+    if isinstance(session, requests.Session):
+        kwargs.setdefault("timeout", (connect_timeout, read_timeout))
+        return session.request(method, url, **kwargs)
+
+    import httpx
+    follow_redirects = kwargs.pop("allow_redirects", method == "GET")
+    timeout = kwargs.pop("timeout", None)
+    if timeout is not None:
+        kwargs["timeout"] = httpx.Timeout(timeout[1], connect=timeout[0]) if isinstance(timeout, tuple) else timeout
+    try:
+        return _to_requests_response(session.request(method, url, follow_redirects=follow_redirects, **kwargs))
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
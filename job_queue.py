@@ -0,0 +1,329 @@
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import http_client
+
+# Lease-based job queue that lets any number of worker processes share the work of
+# a stage. A claimed job is leased to its worker for lease_seconds and the worker
+# renews the lease while the job runs. If a worker dies, its lease expires and the
+# job is handed to the next worker that asks. Workers on one host share queue_file.
+# Workers on other hosts talk to a coordinator started with "serve" on the host that
+# holds the file; it also serves the reads and writes of expertise_store.py, so all
+# workers share one store. Every request must carry the shared JOB_QUEUE_TOKEN.
+# Usage: python job_queue.py enqueue <queue> <text file with one key per line>
+#        python job_queue.py status
+#        python job_queue.py retry <queue>
+#        python job_queue.py reset <queue>
+#        JOB_QUEUE_TOKEN=<secret> python job_queue.py serve [port] [bind address]
+queue_file = "job_queue.sqlite"
+coordinator_url = os.environ.get("JOB_QUEUE_URL")  # e.g. "http://host:8097"; None opens queue_file directly
+coordinator_token = os.environ.get("JOB_QUEUE_TOKEN")  # Shared secret of the coordinator and its workers
+coordinator_host = "127.0.0.1"  # Address the coordinator binds; use the host's LAN address to serve other hosts
+lease_seconds = 120  # A job whose worker has not renewed its lease for this long is handed out again
+heartbeat_interval = 30  # Seconds between lease renewals of a running job
+max_attempts = 3  # Claims of a job before it is marked failed
+poll_interval = 5  # Seconds a worker waits when all remaining jobs are leased to other workers
+
+# Queues of the stages that run as workers
+researcher_queue = "researchers"  # Names, worked by hint2publications.py --worker
+expertise_queue = "expertise"  # Biblio handles, worked by generate_expertise.py --worker
+summary_queue = "summaries"  # Names, worked by generate_expertise.py --worker once the expertise queue is empty
+
+worker_id = f"{socket.gethostname()}-{os.getpid()}"  # Prefix of the ids of this process's worker threads
+
+_lock = threading.Lock()
+_connection = None
+
+_schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    queue TEXT, key TEXT, payload TEXT, state TEXT DEFAULT 'pending', worker TEXT, lease_expires REAL,
+    attempts INTEGER DEFAULT 0, error TEXT, PRIMARY KEY (queue, key));
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (queue, state, lease_expires);
+"""
+
+
+def _db():
+    """Opens the queue on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(queue_file, timeout=60, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(_schema)
+        _connection.commit()
+    return _connection
+
+
+def _enqueue(queue, items):
+    with _lock:
+        with _db() as db:
+            before = db.total_changes
+            # A job whose payload changed, e.g. a paper with a new abstract, is queued again
+            db.executemany("INSERT INTO jobs (queue, key, payload) VALUES (?, ?, ?) ON CONFLICT (queue, key) DO UPDATE "
+                           "SET payload = excluded.payload, state = 'pending', worker = NULL, lease_expires = NULL, "
+                           "attempts = 0, error = NULL WHERE jobs.payload IS NOT excluded.payload",
+                           [(queue, key, json.dumps(payload)) for key, payload in items])
+            return db.total_changes - before
+
+
+def _claim(queue, worker, count):
+    now = time.time()
+    with _lock:
+        with _db() as db:
+            # Jobs whose last lease ran out on their final attempt will not be handed out again
+            db.execute("UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease expired') "
+                       "WHERE queue = ? AND state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                       (queue, now, max_attempts))
+            # One statement, so two workers can never claim the same job
+            rows = db.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE rowid IN (SELECT rowid FROM jobs WHERE queue = ? "
+                "AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) ORDER BY rowid LIMIT ?) "
+                "RETURNING rowid, key, payload",
+                (worker, now + lease_seconds, queue, now, count),
+            ).fetchall()
+    return [[key, json.loads(payload)] for _, key, payload in sorted(rows)]
+
+
+def _heartbeat(queue, keys, worker):
+    with _lock:
+        with _db() as db:
+            db.executemany("UPDATE jobs SET lease_expires = ? WHERE queue = ? AND key = ? AND worker = ? "
+                           "AND state = 'leased'", [(time.time() + lease_seconds, queue, key, worker) for key in keys])
+
+
+def _complete(queue, key, worker):
+    with _lock:
+        with _db() as db:
+            # A worker whose lease expired no longer owns the job, so its late result is not counted
+            return db.execute("UPDATE jobs SET state = 'done', error = NULL WHERE queue = ? AND key = ? "
+                              "AND worker = ? AND state = 'leased'", (queue, key, worker)).rowcount == 1
+
+
+def _fail(queue, key, worker, error):
+    with _lock:
+        with _db() as db:
+            db.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ? "
+                       "WHERE queue = ? AND key = ? AND worker = ? AND state = 'leased'",
+                       (max_attempts, error, queue, key, worker))
+
+
+def _remaining(queue):
+    with _lock:
+        return _db().execute("SELECT COUNT(*) FROM jobs WHERE queue = ? AND state IN ('pending', 'leased')",
+                             (queue,)).fetchone()[0]
+
+
+def _status():
+    with _lock:
+        rows = _db().execute("SELECT queue, state, COUNT(*) FROM jobs GROUP BY queue, state ORDER BY queue").fetchall()
+    return [list(row) for row in rows]
+
+
+def _retry(queue):
+    with _lock:
+        with _db() as db:
+            return db.execute("UPDATE jobs SET state = 'pending', attempts = 0 WHERE queue = ? AND state = 'failed'",
+                              (queue,)).rowcount
+
+
+def _reset(queue):
+    with _lock:
+        with _db() as db:
+            return db.execute("UPDATE jobs SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = 0, "
+                              "error = NULL WHERE queue = ?", (queue,)).rowcount
+
+
+_functions = {"enqueue": _enqueue, "claim": _claim, "heartbeat": _heartbeat, "complete": _complete,
+              "fail": _fail, "remaining": _remaining, "status": _status, "retry": _retry, "reset": _reset}
+
+
+def call_coordinator(function, **arguments):
+    """Runs an operation on the coordinator at coordinator_url and returns its result."""
+    response = http_client.request("POST", f"{coordinator_url}/{function}", json=arguments,
+                                   headers={"Authorization": f"Bearer {coordinator_token or ''}"})
+    response.raise_for_status()
+    return response.json()
+
+
+def _call(function, **arguments):
+    """Runs a queue operation on queue_file, or on the coordinator if one is configured."""
+    if coordinator_url is None:
+        return _functions[function](**arguments)
+    return call_coordinator(function, **arguments)
+
+
+def thread_worker_id():
+    """The worker id of the calling thread, so the leases of threads of one process are told apart."""
+    return f"{worker_id}-{threading.get_native_id()}"
+
+
+def enqueue(queue, items):
+    """Adds jobs to a queue; items are keys or (key, payload) pairs.
+
+    Keys already in the queue are skipped, unless their payload changed: those jobs are queued again.
+    Returns the number of jobs added or queued again.
+    """
+    items = [list(item) if isinstance(item, (list, tuple)) else [item, None] for item in items]
+    return _call("enqueue", queue=queue, items=items)
+
+
+def claim(queue, count=1, worker=None):
+    """Leases up to count jobs of a queue to a worker (by default the calling thread) and returns them as (key, payload) pairs."""
+    return _call("claim", queue=queue, worker=worker or thread_worker_id(), count=count)
+
+
+def heartbeat(queue, keys, worker=None):
+    """Renews a worker's leases on the given jobs."""
+    _call("heartbeat", queue=queue, keys=list(keys), worker=worker or thread_worker_id())
+
+
+def complete(queue, key, worker=None):
+    """Marks a job done; returns False if the lease had expired and the job went to another worker."""
+    return _call("complete", queue=queue, key=key, worker=worker or thread_worker_id())
+
+
+def fail(queue, key, error, worker=None):
+    """Returns a job to the queue, or marks it failed after max_attempts claims."""
+    _call("fail", queue=queue, key=key, worker=worker or thread_worker_id(), error=error)
+
+
+def remaining(queue):
+    """Number of jobs of a queue that are not done or failed."""
+    return _call("remaining", queue=queue)
+
+
+def status():
+    """Job counts as (queue, state, count) rows."""
+    return _call("status")
+
+
+def retry(queue):
+    """Returns the failed jobs of a queue to pending."""
+    return _call("retry", queue=queue)
+
+
+def reset(queue):
+    """Returns every job of a queue to pending, so a new run works all of them again."""
+    return _call("reset", queue=queue)
+
+
+def work(queue, handler, batch=1):
+    """Runs handler(key, payload) on the jobs of a queue until none are left.
+
+    The leases of the jobs in hand are renewed in the background. Jobs should be
+    idempotent, because a job whose lease expired may run again elsewhere.
+    """
+    held = set()
+    stop = threading.Event()
+    # The heartbeat thread renews the leases under the id of the thread that claimed them
+    worker = thread_worker_id()
+
+    def renew():
+        while not stop.wait(heartbeat_interval):
+            if held:
+                heartbeat(queue, list(held), worker)
+
+    threading.Thread(target=renew, daemon=True).start()
+    done = failed = 0
+    try:
+        while True:
+            jobs = claim(queue, batch, worker)
+            if not jobs:
+                # Jobs leased to other workers come back here if those workers die
+                if remaining(queue) == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+            held.update(key for key, _ in jobs)
+            for key, payload in jobs:
+                try:
+                    handler(key, payload)
+                except Exception as e:
+                    print(f"Job {queue}/{key} failed: {e!r}")
+                    fail(queue, key, repr(e), worker)
+                    failed += 1
+                else:
+                    complete(queue, key, worker)
+                    done += 1
+                held.discard(key)
+    finally:
+        stop.set()
+    print(f"Worker {worker}: {done} '{queue}' jobs done, {failed} failed.")
+    return done
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """Serves the queue and store operations as POST /<operation> with JSON arguments, for workers on other hosts."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    functions = _functions
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        expected = f"Bearer {coordinator_token}".encode("utf-8")
+        if not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+            self.send_error(403)
+            return
+        function = self.functions.get(self.path.strip("/"))
+        if function is None:
+            self.send_error(404)
+            return
+        arguments = json.loads(body or b"{}")
+        body = json.dumps(function(**arguments)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8097, host=None):
+    """Serves queue_file and the expertise store to workers on other hosts until interrupted."""
+    import expertise_store
+    if not coordinator_token:
+        print("Error: set JOB_QUEUE_TOKEN to a shared secret before starting the coordinator.")
+        return
+    host = host or coordinator_host
+    CoordinatorHandler.functions = {**_functions, **expertise_store.coordinator_functions}
+    server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.daemon_threads = True
+    print(f"Serving '{queue_file}' and '{expertise_store.store_file}' on {host}:{port}; start workers with "
+          f"JOB_QUEUE_URL=http://{socket.gethostname() if host == '0.0.0.0' else host}:{port} and the same JOB_QUEUE_TOKEN")
+    server.serve_forever()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "enqueue" and len(sys.argv) >= 4:
+        with open(sys.argv[3], "r", encoding="utf-8") as file:
+            keys = [line.strip() for line in file if line.strip()]
+        print(f"Queued {enqueue(sys.argv[2], keys)} new jobs of {len(keys)} in '{sys.argv[2]}'.")
+    elif command == "status":
+        for queue, state, count in status():
+            print(f"{queue:<16}{state:<10}{count:>8}")
+    elif command == "retry" and len(sys.argv) >= 3:
+        print(f"Returned {retry(sys.argv[2])} failed jobs to '{sys.argv[2]}'.")
+    elif command == "reset" and len(sys.argv) >= 3:
+        print(f"Returned {reset(sys.argv[2])} jobs of '{sys.argv[2]}' to pending.")
+    elif command == "serve":
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8097, sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print("Usage: python job_queue.py enqueue <queue> <text file with one key per line>\n"
+              "       python job_queue.py status\n"
+              "       python job_queue.py retry <queue>\n"
+              "       python job_queue.py reset <queue>\n"
+              "       JOB_QUEUE_TOKEN=<secret> python job_queue.py serve [port] [bind address]")
+
+
+if __name__ == "__main__":
+    main()
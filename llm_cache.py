@@ -0,0 +1,64 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+# Persistent store of LLM responses shared by all LLM stages
+cache_file = "llm_cache.sqlite"
+
+# Counters for the current run, printed by report()
+stats = {"hits": 0, "misses": 0}
+
+_lock = threading.Lock()
+_connection = None
+
+
+def _db():
+    """Opens the cache database on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(cache_file, check_same_thread=False)
+        _connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT)")
+        _connection.commit()
+    return _connection
+
+
+def cache_key(model, temperature, template, text):
+    """Content hash of everything that determines the LLM output."""
+    payload = json.dumps([model, temperature, template, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup(model, temperature, template, text):
+    """Returns the stored response for these inputs, or None."""
+    key = cache_key(model, temperature, template, text)
+    with _lock:
+        row = _db().execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            stats["hits"] += 1
+            return row[0]
+    return None
+
+
+def store_many(model, temperature, template, responses):
+    """Stores the responses ({text: response}) of one model call that answered several texts at once."""
+    with _lock:
+        stats["misses"] += 1
+        db = _db()
+        db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?)",
+                       [(cache_key(model, temperature, template, text), response) for text, response in responses.items()])
+        db.commit()
+
+
+def cached(model, temperature, template, text, call):
+    """Returns the stored response for these inputs, or runs call() and stores its result right away."""
+    response = lookup(model, temperature, template, text)
+    if response is None:
+        response = call()
+        store_many(model, temperature, template, {text: response})
+    return response
+
+
+def report():
+    """Prints the cache counters for this run."""
+    print(f"LLM cache: {stats['hits']} hits, {stats['misses']} model calls")
@@ -0,0 +1,230 @@
+import glob
+import json
+import os
+import re
+import sys
+import unicodedata
+import abstract_filter
+import biblio_export
+import pubmed_harvest
+
+# Merges the Biblio publications of hint2publications.py with the PubMed records of
+# pubmed_harvest.py (or a paperscraper dump such as test_scrape.jsonl) into one
+# deduplicated publication set. It is a hash join: the PubMed side is indexed by
+# normalised DOI, then title fingerprint, then abstract fingerprint. The scraped Biblio
+# records carry no title, so for them the abstract is the fallback key. The index holds file offsets rather
+# than records. The Biblio side is streamed through twice: first to collect the
+# researchers of every paper, which co-authors list separately, then to write every
+# paper as soon as it is seen, with a missing abstract filled in from the other source
+# and the researchers of both sources. PubMed papers that match no Biblio record are
+# written at the end.
+# Usage: python merge_publications.py [Biblio JSON or JSONL] [PubMed directory or JSONL] [output JSONL]
+
+biblio_file = "test.publications_data.json"  # Output of hint2publications.py, either JSON or streamed JSONL
+pubmed_path = pubmed_harvest.output_dir  # Directory of per-researcher JSONL files, or a single JSONL file
+output_file = "merged_publications.jsonl"
+min_title_words = 4  # Shorter titles ("Editorial", "Reply") are too generic to join on
+abstract_fingerprint_words = 40  # Leading words of an abstract that identify a paper
+
+# Counters for the current run, printed by report()
+stats = {"biblio_records": 0, "papers": 0, "doi_matches": 0, "title_matches": 0, "abstract_matches": 0,
+         "abstracts_from_pubmed": 0, "abstracts_from_biblio": 0, "pubmed_only": 0}
+
+
+def normalize_doi(doi):
+    """Bare lower-case DOI ("10.1021/acs.jproteome.8b00175"), or None.
+
+    paperscraper dumps list the DOIs of an article's references after its own, one per line.
+    """
+    if not doi:
+        return None
+    doi = doi.strip().split("\n")[0].strip().lower()
+    doi = re.sub(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", "", doi)
+    return doi if doi.startswith("10.") else None
+
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower())
+
+
+def title_fingerprint(title):
+    """Accent-, case- and punctuation-insensitive form of a title, or None if it is too short to join on."""
+    if not title:
+        return None
+    words = _words(title)
+    return " ".join(words) if len(words) >= min_title_words else None
+
+
+def abstract_fingerprint(abstract):
+    """The leading words of an abstract in the form of title_fingerprint(), or None without a usable abstract."""
+    if not abstract_filter.usable(abstract):
+        return None
+    return " ".join(_words(abstract)[:abstract_fingerprint_words])
+
+
+def pubmed_files(path):
+    return sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path]
+
+
+def year_of(date):
+    """The year of a PubMed date such as "2020-03-01", "2023 Nov-Dec" or "Spring 2020", or None."""
+    match = re.search(r"\b(1[89]|20)\d\d\b", str(date or ""))
+    return int(match.group()) if match else None
+
+
+def collect_researchers(biblio_path):
+    """The researchers of every Biblio paper by handle, in the order they are listed."""
+    researchers = {}
+    for publication in biblio_records(biblio_path):
+        names = researchers.setdefault(biblio_export.handle_id(publication["url"]), [])
+        if publication.get("researcher") and publication["researcher"] not in names:
+            names.append(publication["researcher"])
+    return researchers
+
+
+def build_index(path, known_researchers=()):
+    """Indexes the PubMed records by DOI and title fingerprint, as (file, offset) of one copy per article.
+
+    For a pubmed_harvest.py directory, the researchers whose files list an article are
+    kept as well; a file is named after its researcher (known_researchers gives the
+    original spelling, else the file name is used).
+    """
+    by_doi, by_title, by_abstract, locations, researchers = {}, {}, {}, {}, {}
+    names_by_file = {os.path.basename(pubmed_harvest.output_path(name)): name for name in known_researchers}
+    directory = os.path.isdir(path)
+    for file_path in pubmed_files(path):
+        file_name = os.path.basename(file_path)
+        researcher = names_by_file.get(file_name, file_name[:-len(".jsonl")].replace("_", " ")) if directory else None
+        with open(file_path, "rb") as file:
+            offset = 0
+            for line in file:
+                record = json.loads(line)
+                key = record.get("pmid") or normalize_doi(record.get("doi")) or title_fingerprint(record.get("title"))
+                if key is not None and researcher and researcher not in researchers.setdefault(key, []):
+                    researchers[key].append(researcher)
+                if key is not None and key not in locations:
+                    locations[key] = (file_path, offset)
+                    for keys, value in ((by_doi, normalize_doi(record.get("doi"))),
+                                        (by_title, title_fingerprint(record.get("title"))),
+                                        (by_abstract, abstract_fingerprint(record.get("abstract")))):
+                        if value:
+                            keys.setdefault(value, key)
+                offset += len(line)
+    return {"doi": by_doi, "title": by_title, "abstract": by_abstract, "locations": locations,
+            "researchers": researchers}
+
+
+def read_record(location, files):
+    """Reads one PubMed record at its indexed offset, keeping the files open across lookups."""
+    file_path, offset = location
+    if file_path not in files:
+        files[file_path] = open(file_path, "rb")
+    files[file_path].seek(offset)
+    return json.loads(files[file_path].readline())
+
+
+def biblio_records(path):
+    """Streams the Biblio publications, from the JSON or the JSONL output of hint2publications.py."""
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                yield json.loads(line)
+        else:
+            for researcher, publications in json.load(file).items():
+                for publication in publications:
+                    yield {"researcher": researcher, **publication}
+
+
+def merged_record(publication, pubmed, researchers):
+    """Combines a Biblio publication and its PubMed record (either may be None) into one paper."""
+    publication, pubmed = publication or {}, pubmed or {}
+    abstract = publication.get("abstract")
+    if abstract_filter.is_placeholder(abstract) and not abstract_filter.is_placeholder(pubmed.get("abstract")):
+        abstract = pubmed["abstract"]
+        if publication:
+            stats["abstracts_from_pubmed"] += 1
+    elif publication and pubmed and abstract_filter.is_placeholder(pubmed.get("abstract")) \
+            and not abstract_filter.is_placeholder(abstract):
+        stats["abstracts_from_biblio"] += 1
+    year = publication.get("year") or year_of(pubmed.get("date"))
+    return {
+        "handle": biblio_export.handle_id(publication["url"]) if publication else None,
+        "url": publication.get("url"),
+        "pmid": pubmed.get("pmid"),
+        "doi": normalize_doi(publication.get("doi")) or normalize_doi(pubmed.get("doi")),
+        "title": publication.get("title") or pubmed.get("title"),
+        "year": year,
+        "abstract": None if abstract_filter.is_placeholder(abstract) else abstract,
+        "journal": pubmed.get("journal"),
+        "type": publication.get("type"),
+        "classification": publication.get("classification"),
+        "researchers": researchers,
+        "sources": [source for source, record in (("biblio", publication), ("pubmed", pubmed)) if record],
+    }
+
+
+def merge(biblio_path, pubmed_source, output_path):
+    """Joins both sources in one pass over the Biblio records and writes the deduplicated papers."""
+    researchers_by_handle = collect_researchers(biblio_path)
+    index = build_index(pubmed_source, {name for names in researchers_by_handle.values() for name in names})
+    matched, seen_handles, files = set(), set(), {}
+    with open(output_path, "w", encoding="utf-8") as output:
+        for publication in biblio_records(biblio_path):
+            stats["biblio_records"] += 1
+            handle = biblio_export.handle_id(publication["url"])
+            # Co-authors list the same paper; it is written once, with all of them
+            if handle in seen_handles:
+                continue
+            seen_handles.add(handle)
+            key = None
+            for name, fingerprint in (("doi", normalize_doi(publication.get("doi"))),
+                                      ("title", title_fingerprint(publication.get("title"))),
+                                      ("abstract", abstract_fingerprint(publication.get("abstract")))):
+                key = index[name].get(fingerprint) if fingerprint else None
+                if key is not None:
+                    stats[f"{name}_matches"] += 1
+                    break
+            pubmed = None
+            researchers = list(researchers_by_handle[handle])
+            if key is not None and key not in matched:
+                matched.add(key)
+                pubmed = read_record(index["locations"][key], files)
+                researchers += [name for name in index["researchers"].get(key, []) if name not in researchers]
+            output.write(json.dumps(merged_record(publication, pubmed, researchers), ensure_ascii=False) + "\n")
+            stats["papers"] += 1
+
+        # Papers only PubMed knows about
+        for key, location in index["locations"].items():
+            if key not in matched:
+                record = merged_record(None, read_record(location, files), index["researchers"].get(key, []))
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                stats["papers"] += 1
+                stats["pubmed_only"] += 1
+    for file in files.values():
+        file.close()
+
+
+def report():
+    print(f"Merged {stats['biblio_records']} Biblio records and the PubMed index into {stats['papers']} papers: "
+          f"{stats['doi_matches']} joined on DOI, {stats['title_matches']} on title, "
+          f"{stats['abstract_matches']} on abstract, "
+          f"{stats['abstracts_from_pubmed']} abstracts filled in from PubMed, "
+          f"{stats['abstracts_from_biblio']} PubMed records completed from Biblio, {stats['pubmed_only']} PubMed-only papers")
+
+
+def main():
+    arguments = sys.argv[1:]
+    biblio_path = arguments[0] if len(arguments) > 0 else biblio_file
+    pubmed_source = arguments[1] if len(arguments) > 1 else pubmed_path
+    output_path = arguments[2] if len(arguments) > 2 else output_file
+    for path in (biblio_path, pubmed_source):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' does not exist.")
+            return
+    merge(biblio_path, pubmed_source, output_path)
+    report()
+    print(f"Merged publications written to '{output_path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+# Timings, sizes and token counts of HTTP requests, HTML parsing and LLM calls,
+# shared by all scrapers and LLM stages. Every event is appended to trace_file as
+# one JSON line; report() prints a summary and writes a Prometheus text snapshot.
+trace_file = "metrics.trace.jsonl"  # None disables the trace
+prometheus_file = "metrics.prom"  # None disables the snapshot
+profile_top = 25  # Functions listed in the --profile breakdown
+
+run_id = f"{int(time.time())}-{os.getpid()}"
+
+_lock = threading.Lock()
+_trace = None
+_counters = {}  # (metric, labels) -> value
+_timings = {}  # (metric, labels) -> list of seconds
+_resolved_hosts = set()
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def _emit(event):
+    """Appends one event to the trace file."""
+    global _trace
+    if trace_file is None:
+        return
+    line = json.dumps({"run": run_id, "time": round(time.time(), 3), **event}, ensure_ascii=False)
+    with _lock:
+        if _trace is None:
+            _trace = open(trace_file, "a", encoding="utf-8", buffering=1)
+        _trace.write(line + "\n")
+
+
+def increment(metric, amount=1, **labels):
+    key = (metric, _labels(**labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(metric, seconds, **labels):
+    key = (metric, _labels(**labels))
+    with _lock:
+        _timings.setdefault(key, []).append(seconds)
+
+
+def resolve_host(host):
+    """Times the DNS lookup of a host once per run, so slow name resolution shows up separately."""
+    with _lock:
+        if host in _resolved_hosts:
+            return
+        _resolved_hosts.add(host)
+    started = time.perf_counter()
+    try:
+        socket.getaddrinfo(host.split(":")[0], None)
+        ok = True
+    except OSError:
+        ok = False
+    seconds = time.perf_counter() - started
+    observe("dns_lookup_seconds", seconds, host=host)
+    _emit({"event": "dns", "host": host, "seconds": round(seconds, 6), "ok": ok})
+
+
+def http_request(url, response, seconds, cache):
+    """Records an HTTP request made through http_cache; response is None when it raised.
+
+    cache is "hit", "revalidated" or "miss". Server time is the time to the response
+    headers; wait is the time the rate limiter held the request back.
+    """
+    host = urlparse(url).netloc
+    status = str(response.status_code) if response is not None else "error"
+    size = len(response.content) if response is not None and cache != "hit" else 0
+    attempts = getattr(response, "attempts", 1)
+    wait = getattr(response, "wait_seconds", 0.0)
+    elapsed = getattr(response, "elapsed", None)
+    server = elapsed.total_seconds() if elapsed is not None and cache != "hit" else None
+    increment("http_requests_total", host=host, status=status, cache=cache)
+    increment("http_response_bytes_total", size, host=host)
+    increment("http_retries_total", attempts - 1, host=host)
+    observe("http_request_seconds", seconds, host=host, cache=cache)
+    if server is not None:
+        observe("http_server_seconds", server, host=host)
+    _emit({"event": "http", "url": url, "status": status, "cache": cache, "seconds": round(seconds, 6),
+           "server_seconds": round(server, 6) if server is not None else None,
+           "wait_seconds": round(wait, 6), "bytes": size, "retries": attempts - 1})
+
+
+def timed(stage):
+    """Decorator recording the duration of every call of a function, e.g. @metrics.timed("parse")."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - started
+                observe(f"{stage}_seconds", seconds, function=function.__name__)
+                _emit({"event": stage, "function": function.__name__, "seconds": round(seconds, 6)})
+        return wrapper
+    return decorator
+
+
+def llm_call(stage, prompt, completion, seconds, estimate_tokens):
+    """Records one LLM call; token counts come from estimate_tokens since Ollama's text API does not return them."""
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(completion)
+    increment("llm_calls_total", stage=stage)
+    increment("llm_prompt_tokens_total", prompt_tokens, stage=stage)
+    increment("llm_completion_tokens_total", completion_tokens, stage=stage)
+    observe("llm_call_seconds", seconds, stage=stage)
+    _emit({"event": "llm", "stage": stage, "seconds": round(seconds, 6), "prompt_tokens": prompt_tokens,
+           "completion_tokens": completion_tokens,
+           "tokens_per_second": round(completion_tokens / seconds, 2) if seconds else None})
+
+
+def _quantile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+
+def prometheus_text():
+    """Renders all counters and timings in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {key: list(values) for key, values in _timings.items()}
+    lines = []
+    for metric in sorted({metric for metric, _ in counters}):
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for metric in sorted({metric for metric, _ in timings}):
+        lines.append(f"# TYPE {metric} summary")
+        for (name, labels), values in sorted(timings.items()):
+            if name != metric:
+                continue
+            for fraction in (0.5, 0.95):
+                lines.append(f"{metric}{_format_labels(labels + (('quantile', str(fraction)),))} "
+                             f"{_quantile(values, fraction):.6f}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {sum(values):.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {len(values)}")
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    """Prints where the time went and writes the Prometheus snapshot."""
+    with _lock:
+        timings = {key: list(values) for key, values in _timings.items()}
+        counters = dict(_counters)
+    for (metric, labels), values in sorted(timings.items()):
+        label_text = ", ".join(f"{key}={value}" for key, value in labels)
+        print(f"{metric} [{label_text}]: {len(values)} calls, {sum(values):.1f}s total, "
+              f"p50 {_quantile(values, 0.5) * 1000:.0f} ms, p95 {_quantile(values, 0.95) * 1000:.0f} ms")
+    completion = sum(value for (metric, _), value in counters.items() if metric == "llm_completion_tokens_total")
+    llm_seconds = sum(sum(values) for (metric, _), values in timings.items() if metric == "llm_call_seconds")
+    if llm_seconds:
+        print(f"LLM: {completion} completion tokens, {completion / llm_seconds:.1f} tokens/s per call")
+    if prometheus_file is not None:
+        with open(prometheus_file, "w", encoding="utf-8") as file:
+            file.write(prometheus_text())
+        print(f"Metrics snapshot written to '{prometheus_file}'" + (f", trace to '{trace_file}'" if trace_file else ""))
+
+
+def run(main):
+    """Runs a script's main(); with --profile on the command line, also prints a per-function hot-path breakdown.
+
+    The profiler sees the main thread, which includes the asyncio crawl but not worker threads.
+    """
+    if "--profile" not in sys.argv:
+        return main()
+    sys.argv.remove("--profile")
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(main)
+    finally:
+        stats = pstats.Stats(profiler)
+        print(f"\nHot path (top {profile_top} functions by cumulative time):")
+        stats.sort_stats("cumulative").print_stats(profile_top)
+        print(f"Top {profile_top} functions by own time:")
+        stats.sort_stats("tottime").print_stats(profile_top)
@@ -0,0 +1,109 @@
+import json
+import random
+import re
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the Biblio search export used by biblio_export.py.
+# Usage: python mock_biblio.py <publications JSON from hint2publications.py> [port]
+# then set biblio_export.export_url = "http://127.0.0.1:<port>/publication".
+# The stand-in implements the export API as biblio_export.py assumes it, so it checks
+# paging and the mapping of records, not the real server; error_rate and
+# malformed_rate exercise the client's error handling.
+
+# Stand-in server behaviour
+error_rate = 0.0  # Fraction of export requests answered with a 500
+malformed_rate = 0.0  # Fraction of export requests answered with a truncated JSON body
+
+subtypes = {
+    "Original Article": "original",
+    "Review Article": "review",
+    "Letter/Note": "letterNote",
+    "Proceedings Paper": "proceedingsPaper",
+}
+
+
+def records_from_scraped(data):
+    """Turns scraped publications (researcher -> list) into Biblio-style export records, one per handle."""
+    records = {}
+    for researcher, publications in data.items():
+        for publication in publications:
+            record_id = publication["url"].rsplit("LU-", 1)[-1]
+            if record_id not in records:
+                subtype = re.search(r"\((.*)\)", publication.get("type", ""))
+                abstract = publication.get("abstract")
+                doi = publication.get("doi", "")
+                records[record_id] = {
+                    "_id": record_id,
+                    "handle": publication["url"],
+                    "type": "journalArticle" if publication.get("type", "").startswith("Journal Article") else "misc",
+                    "subtype": subtypes.get(subtype.group(1)) if subtype else None,
+                    "classification": publication.get("classification"),
+                    "year": str(publication["year"]),
+                    "abstract": [abstract] if abstract and abstract != "Abstract not available" else [],
+                    "doi": [doi.split("doi.org/", 1)[-1]] if "doi.org/" in doi else [],
+                    "author": [],
+                }
+            records[record_id]["author"].append({"name": researcher})
+    return list(records.values())
+
+
+class BiblioHandler(BaseHTTPRequestHandler):
+    """Answers /publication export queries from an in-memory record list."""
+
+    records = []
+    request_count = 0
+    _random = random.Random(0)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        author = re.match(r'author:"(.*)"', params.get("q", [""])[0])
+        if parsed.path != "/publication" or not author:
+            self.send_error(404)
+            return
+        BiblioHandler.request_count += 1
+        if BiblioHandler._random.random() < error_rate:
+            self.send_error(500)
+            return
+
+        year_from = int(params.get("year_from", ["0"])[0])
+        classification = params.get("classification", [None])[0]
+        start = int(params.get("start", ["0"])[0])
+        limit = int(params.get("limit", ["100"])[0])
+        matches = [
+            record for record in self.records
+            if any(person["name"] == author.group(1) for person in record["author"])
+            and int(record["year"]) >= year_from
+            and (classification is None or record["classification"] == classification)
+        ]
+
+        body = json.dumps(matches[start:start + limit], ensure_ascii=False).encode("utf-8")
+        if BiblioHandler._random.random() < malformed_rate:
+            body = body[:len(body) // 2]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(records, port=0):
+    """Starts the stand-in server in a background thread and returns it; port 0 picks a free port."""
+    BiblioHandler.records = records
+    server = ThreadingHTTPServer(("127.0.0.1", port), BiblioHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        records = records_from_scraped(json.load(file))
+    server = serve(records, int(sys.argv[2]) if len(sys.argv) > 2 else 8099)
+    print(f"Serving {len(records)} records at http://127.0.0.1:{server.server_address[1]}/publication")
+    threading.Event().wait()
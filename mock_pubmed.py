@@ -0,0 +1,153 @@
+import hashlib
+import json
+import re
+import sys
+import threading
+import unicodedata
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+# Local stand-in for the NCBI E-utilities (esearch and efetch) used by pubmed_harvest.py.
+# Usage: python mock_pubmed.py <publications JSON from hint2publications.py> [port]
+# then set pubmed_harvest.eutils_url = "http://127.0.0.1:<port>".
+# Author names are split the way PubMed lists them, by rules of this module rather
+# than pubmed_harvest.py's, so the harvest's own name handling is what gets tested.
+
+# Surname particles: "Jan Van de Velde" is listed as Van de Velde, Jan
+surname_particles = {"van", "de", "der", "den", "von", "le", "la", "du", "di", "da", "del", "ten", "ter"}
+author_names = {}  # Researcher -> (surname, fore name), for names the particle rule gets wrong
+
+
+def pmid_of(handle):
+    return str(30000000 + int(hashlib.sha256(handle.encode("utf-8")).hexdigest()[:8], 16) % 9000000)
+
+
+def author_name(researcher):
+    """The (surname, fore name) PubMed lists a researcher under."""
+    if researcher in author_names:
+        return author_names[researcher]
+    tokens = researcher.split("(")[0].split()
+    start = next((index for index in range(1, len(tokens)) if tokens[index].lower() in surname_particles),
+                 len(tokens) - 1)
+    return " ".join(tokens[start:]), " ".join(tokens[:start])
+
+
+def author_initials(fore_name):
+    return "".join(part[0].upper() for part in fore_name.replace("-", " ").split())
+
+
+def records_from_scraped(data):
+    """Turns scraped publications (researcher -> list) into PubMed-style articles, one per paper with an abstract."""
+    records = {}
+    for researcher, publications in data.items():
+        for publication in publications:
+            abstract = publication.get("abstract")
+            if not abstract or abstract == "Abstract not available":
+                continue
+            pmid = pmid_of(publication["url"])
+            if pmid not in records:
+                doi = publication.get("doi", "")
+                records[pmid] = {
+                    "pmid": pmid,
+                    "title": abstract.split(". ")[0][:150].rstrip(".") + ".",
+                    "abstract": abstract,
+                    "year": publication["year"],
+                    "doi": doi.split("doi.org/", 1)[-1] if "doi.org/" in doi else None,
+                    "authors": [],
+                }
+            surname, fore_name = author_name(researcher)
+            records[pmid]["authors"].append((surname, fore_name, author_initials(fore_name)))
+    return list(records.values())
+
+
+def _xml(text):
+    # Scraped abstracts can hold control characters that are not allowed in XML
+    return escape(re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", text))
+
+
+def _plain(text):
+    return "".join(char for char in unicodedata.normalize("NFD", text) if unicodedata.category(char) != "Mn").lower()
+
+
+def matches(record, aliases):
+    """Mirrors PubMed's [au] search: "Surname Given" matches exactly, "Surname IN" matches initials starting with IN."""
+    for surname, given, initials in record["authors"]:
+        full, short = _plain(f"{surname} {given}"), _plain(f"{surname} {initials}")
+        if any(alias == full or short.startswith(alias) for alias in aliases):
+            return True
+    return False
+
+
+def article_xml(record):
+    authors = "".join(
+        f"<Author><LastName>{_xml(surname)}</LastName><ForeName>{_xml(given)}</ForeName>"
+        f"<Initials>{_xml(initials)}</Initials></Author>"
+        for surname, given, initials in record["authors"]
+    )
+    doi = f'<ArticleId IdType="doi">{_xml(record["doi"])}</ArticleId>' if record["doi"] else ""
+    return (
+        f"<PubmedArticle><MedlineCitation><PMID>{record['pmid']}</PMID><Article>"
+        f"<Journal><JournalIssue><PubDate><Year>{record['year']}</Year></PubDate></JournalIssue>"
+        f"<Title>Journal of Synthetic Results</Title></Journal>"
+        f"<ArticleTitle>{_xml(record['title'])}</ArticleTitle>"
+        f"<Abstract><AbstractText>{_xml(record['abstract'])}</AbstractText></Abstract>"
+        f"<AuthorList>{authors}</AuthorList></Article></MedlineCitation>"
+        f'<PubmedData><ArticleIdList><ArticleId IdType="pubmed">{record["pmid"]}</ArticleId>{doi}'
+        f"</ArticleIdList></PubmedData></PubmedArticle>"
+    )
+
+
+class EutilsHandler(BaseHTTPRequestHandler):
+    """Answers /esearch.fcgi author queries and /efetch.fcgi PMID lists from an in-memory article list."""
+
+    records = {}
+    request_count = 0
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        EutilsHandler.request_count += 1
+        if parsed.path.endswith("/esearch.fcgi"):
+            aliases = [_plain(alias.strip()) for alias in re.findall(r"([^()]+?)\[au\]", params.get("term", "").replace(" OR ", ")("))]
+            years = range(int(params.get("mindate", 0)), int(params.get("maxdate", 9999)) + 1)
+            found = sorted((pmid for pmid, record in self.records.items()
+                            if record["year"] in years and matches(record, aliases)), key=int)
+            start, count = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+            body = json.dumps({"esearchresult": {"count": str(len(found)), "retmax": str(len(found[start:start + count])),
+                                                 "retstart": str(start), "idlist": found[start:start + count]}})
+            content_type = "application/json"
+        elif parsed.path.endswith("/efetch.fcgi"):
+            articles = "".join(article_xml(self.records[pmid]) for pmid in params.get("id", "").split(",")
+                               if pmid in self.records)
+            body = f'<?xml version="1.0" ?><PubmedArticleSet>{articles}</PubmedArticleSet>'
+            content_type = "text/xml"
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(records, port=0):
+    """Starts the stand-in server in a background thread and returns it; port 0 picks a free port."""
+    EutilsHandler.records = {record["pmid"]: record for record in records}
+    server = ThreadingHTTPServer(("127.0.0.1", port), EutilsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        records = records_from_scraped(json.load(file))
+    server = serve(records, int(sys.argv[2]) if len(sys.argv) > 2 else 8096)
+    print(f"Serving {len(records)} articles at http://127.0.0.1:{server.server_address[1]}")
+    threading.Event().wait()
@@ -0,0 +1,269 @@
+import gzip
+import hashlib
+import html
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+import hint2publications
+
+# Record/replay of research.ugent.be, Biblio handle and CRIG pages for offline runs.
+# Pages are kept in a WARC file (one gzip member per response record), written
+# either from the pages in the HTTP cache or synthesised from a publications JSON.
+# Usage: python mock_ugent.py record [cache_file] [warc_file]
+#        python mock_ugent.py synthesize [publications JSON] [warc_file]
+#        python mock_ugent.py serve [warc_file] [port]
+# Serving prints the http_cache.origin_overrides that send the scrapers to the stand-in.
+
+warc_file = "bench_corpus.warc.gz"
+
+# Stand-in server behaviour
+latency = 0.05  # Seconds added to every response
+latency_jitter = 0.02  # Uniform extra latency of up to this many seconds
+error_rate = 0.01  # Fraction of requests answered with a 503
+projects_per_researcher = 3  # Projects invented per researcher by synthesize()
+
+crig_members_url = "https://www.crig.ugent.be/en/all-crig-group-leaders-and-members"
+
+
+def write_warc(path, records):
+    """Writes (url, status, content_type, body) records as WARC/1.0 response records."""
+    with open(path, "wb") as file:
+        for url, status, content_type, body in records:
+            http_block = (
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode("utf-8") + body
+            header = (
+                "WARC/1.0\r\n"
+                "WARC-Type: response\r\n"
+                f"WARC-Record-ID: <urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, url)}>\r\n"
+                f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}\r\n"
+                f"WARC-Target-URI: {url}\r\n"
+                "Content-Type: application/http; msgtype=response\r\n"
+                f"Content-Length: {len(http_block)}\r\n\r\n"
+            ).encode("utf-8")
+            # One gzip member per record, as in .warc.gz files written by crawlers
+            file.write(gzip.compress(header + http_block + b"\r\n\r\n"))
+
+
+def read_warc(path):
+    """Reads the response records of a WARC file into {url: (status, content_type, body)}.
+
+    A truncated last record, e.g. of a recording that was interrupted, is skipped.
+    """
+    records = {}
+    try:
+        _read_records(path, records)
+    except EOFError:
+        # The gzip stream itself ends early
+        pass
+    return records
+
+
+def _read_records(path, records):
+    with gzip.open(path, "rb") as file:
+        while True:
+            line = file.readline()
+            if not line:
+                break
+            if not line.startswith(b"WARC/"):
+                continue
+            headers = {}
+            while True:
+                line = file.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, _, value = line.decode("utf-8").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if not line or "content-length" not in headers:
+                break
+            block = file.read(int(headers["content-length"]))
+            if len(block) < int(headers["content-length"]):
+                break
+            if headers.get("warc-type") != "response":
+                continue
+            head, _, body = block.partition(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+            http_headers = dict(line.split(": ", 1) for line in header_lines if ": " in line)
+            records[headers["warc-target-uri"]] = (
+                int(status_line.split()[1]), http_headers.get("Content-Type", "text/html"), body
+            )
+
+
+def record_from_cache(cache_file, path):
+    """Writes every page in the HTTP cache to a WARC file."""
+    connection = sqlite3.connect(cache_file)
+    records = [
+        (url, 200, f"text/html; charset={encoding or 'utf-8'}", zlib.decompress(body))
+        for url, body, encoding in connection.execute("SELECT url, body, encoding FROM responses ORDER BY url")
+    ]
+    connection.close()
+    write_warc(path, records)
+    return len(records)
+
+
+def person_slug(name):
+    """The profile slug the scrapers try first for a researcher."""
+    return "-".join(hint2publications.normalize_name(name).split()).lower() + "-0"
+
+
+def _page(body):
+    return f"<html><head><meta charset=\"utf-8\"></head><body>{body}</body></html>".encode("utf-8")
+
+
+def _publication_page(publication):
+    doi = publication.get("doi", "")
+    return _page(
+        (f'<meta name="dc.identifier" content="{html.escape(doi)}">' if "doi.org" in doi else "")
+        + f'<dl><dt>Type</dt><dd>{html.escape(publication.get("type", ""))}</dd>'
+        f'<dt>UGent classification</dt><dd>{html.escape(publication.get("classification", ""))}</dd>'
+        + (f'<dt>Abstract</dt><dd itemprop="description">{html.escape(publication["abstract"])}</dd>'
+           if publication.get("abstract") not in (None, "Abstract not available") else "")
+        + "</dl>"
+    )
+
+
+def _publication_list_page(publications):
+    sections = []
+    for year in sorted({publication["year"] for publication in publications}, reverse=True):
+        items = "".join(
+            f'<div class="bg-blue-hover"><a href="{html.escape(publication["url"])}">'
+            f'<span data-type="title">{html.escape(publication.get("abstract", "")[:80])}</span></a>'
+            f'<div data-type="year">{year}</div></div>'
+            for publication in publications if publication["year"] == year
+        )
+        sections.append(f'<div class="margin-bottom-gl"><div class="header-5"><span>{year}</span></div>'
+                        f'<div style="margin-left: 4em;">{items}</div></div>')
+    return _page("".join(sections))
+
+
+def _words(seed, count, vocabulary):
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return [vocabulary[digest[index % len(digest)] % len(vocabulary)] for index in range(count)]
+
+
+def synthesize(data, path):
+    """Writes a WARC corpus with the pages the scrapers request for the researchers in a publications JSON."""
+    vocabulary = sorted({word.strip(".,;:()").lower() for publications in data.values()
+                         for publication in publications for word in publication.get("abstract", "").split()
+                         if len(word) > 6}) or ["proteomics"]
+    records = []
+    members = []
+    for name, publications in data.items():
+        slug = person_slug(name)
+        base = f"https://research.ugent.be/web/person/{slug}"
+        keywords = _words(name, 6, vocabulary)
+        records.append((f"{base}/en", 200, "text/html; charset=utf-8", _page(
+            '<div id="id23"><ul>' + "".join(f'<li><span class="normal">{word}</span></li>' for word in keywords[:3])
+            + '</ul></div><div id="id24"><div class="keywords">'
+            + "".join(f'<span class="keyword-label">{word}</span>' for word in keywords[3:]) + "</div></div>"
+        )))
+        records.append((f"{base}/publications/en", 200, "text/html; charset=utf-8",
+                        _publication_list_page(publications)))
+        for publication in publications:
+            records.append((publication["url"], 200, "text/html; charset=utf-8", _publication_page(publication)))
+
+        fiches = []
+        for number in range(projects_per_researcher):
+            project_id = hashlib.sha256(f"{name}/{number}".encode("utf-8")).hexdigest()[:12]
+            words = _words(f"{name}/{number}", 40, vocabulary)
+            fiches.append(f'<div class="fiche"><a href="/web/project/{project_id}/en">'
+                          f'<div class="margin-bottom-ti" title="{" ".join(words[:6]).title()}"></div></a></div>')
+            records.append((f"https://research.ugent.be/web/project/{project_id}/en", 200, "text/html; charset=utf-8",
+                            _page(f'<div id="description_showmore">{" ".join(words)}</div>'
+                                  f'<div class="keywords">' + "".join(f"<span>{word}</span>" for word in words[:4])
+                                  + "</div>")))
+        records.append((f"{base}/projects/en", 200, "text/html; charset=utf-8",
+                        _page('<div class="header-5">Promoter</div>' + "".join(fiches))))
+
+        crig_url = f"https://www.crig.ugent.be/en/{slug}"
+        members.append(f'<div class="node-partner"><a class="field-group-link" href="/en/{slug}">'
+                       f'<img alt="{html.escape(name)}"></a></div>')
+        records.append((crig_url, 200, "text/html; charset=utf-8", _page(
+            f'<meta name="description" content="{html.escape(" ".join(keywords))}">'
+            '<h2>Research focus</h2><div class="group-right"><ul>'
+            + "".join(f"<li>{word}</li>" for word in keywords) + "</ul></div>"
+        )))
+    records.append((crig_members_url, 200, "text/html; charset=utf-8", _page("".join(members))))
+    write_warc(path, records)
+    return len(records)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers /<host>/<path> requests from the recorded pages, with added latency and errors."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real sites
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would delay every response
+    records = {}
+    request_count = 0
+    _lock = threading.Lock()
+    _random = random.Random(0)
+
+    def do_GET(self):
+        with ReplayHandler._lock:
+            ReplayHandler.request_count += 1
+            delay = latency + ReplayHandler._random.uniform(0, latency_jitter)
+            failed = ReplayHandler._random.random() < error_rate
+        time.sleep(delay)
+        if failed:
+            self.send_error(503)
+            return
+        record = self.records.get(self.path.lstrip("/"))
+        if record is None or record[0] != 200:
+            self.send_error(404 if record is None else record[0])
+            return
+        status, content_type, body = record
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(records, port=0):
+    """Starts the stand-in in a background thread and returns it with the origin overrides for http_cache."""
+    by_path = {}
+    origins = set()
+    for url, record in records.items():
+        parts = urlsplit(url)
+        by_path[parts.netloc + parts.path + (f"?{parts.query}" if parts.query else "")] = record
+        origins.add((parts.scheme, parts.netloc))
+    ReplayHandler.records = by_path
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    overrides = {f"{scheme}://{netloc}": f"http://127.0.0.1:{server.server_address[1]}/{netloc}"
+                 for scheme, netloc in origins}
+    return server, overrides
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "record":
+        cache_file = sys.argv[2] if len(sys.argv) > 2 else "http_cache.sqlite"
+        path = sys.argv[3] if len(sys.argv) > 3 else warc_file
+        print(f"Recorded {record_from_cache(cache_file, path)} pages to '{path}'")
+    elif command == "synthesize":
+        with open(sys.argv[2] if len(sys.argv) > 2 else "test.publications_data.json", "r", encoding="utf-8") as file:
+            data = json.load(file)
+        path = sys.argv[3] if len(sys.argv) > 3 else warc_file
+        print(f"Synthesised {synthesize(data, path)} pages to '{path}'")
+    else:
+        records = read_warc(sys.argv[2] if len(sys.argv) > 2 else warc_file)
+        server, overrides = serve(records, int(sys.argv[3]) if len(sys.argv) > 3 else 8098)
+        print(f"Serving {len(records)} pages; set http_cache.origin_overrides = {json.dumps(overrides)}")
+        threading.Event().wait()
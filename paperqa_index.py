@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import numpy as np
+from paperqa import Docs, Doc, Settings, Text
+from paperqa.llms import Chunk, EmbeddingModel, LLMModel
+from paperqa.utils import get_loop
+import abstract_filter
+import biblio_export
+import embedding_cache
+import merge_publications
+import pubmed_harvest
+
+# Prebuilt paper-qa document index over the scraped abstracts.
+# "build" turns Biblio JSON or JSONL, PubMed JSONL (a file or the pubmed_harvest.py
+# directory) or merge_publications.py output into a pickled paper-qa Docs. Every
+# abstract is embedded once: vectors are kept in embedding_cache.py under a hash of
+# the model and the text. A rebuild only replaces the papers whose abstract or
+# citation changed, and drops those that are no longer in the input. "ask" loads
+# the index, so a question costs one query embedding and one LLM call.
+# Usage: python paperqa_index.py build [input] [--stub]
+#        python paperqa_index.py ask "question" [--stub]
+# --stub answers offline, with paper-qa's keyword embedding and a canned answer instead of Ollama.
+
+input_file = "test.publications_data.json"  # Biblio JSON/JSONL, PubMed JSONL or directory, or merged JSONL
+index_file = "paperqa_index.pkl"  # Pickled paperqa.Docs
+manifest_file = "paperqa_index.manifest.json"  # Embedding model and content hash of every indexed paper
+
+# Model settings
+embedding_model = "ollama/nomic-embed-text"
+llm = "ollama/llama3"
+stub_embedding_model = "sparse"  # paper-qa's tokenizer-based embedding, needs no server
+embedding_batch_size = 64
+chunk_chars = 3000  # Longer abstracts are split at sentence ends into chunks of at most this size
+evidence_k = 10  # Abstracts retrieved per question
+skip_evidence_summaries = True  # Pass the retrieved abstracts to the answer prompt as they are, without one summary call each
+
+# Counters for the current run, printed by report()
+stats = {"papers": 0, "added": 0, "replaced": 0, "removed": 0, "unchanged": 0, "chunks": 0}
+
+
+class CachedEmbeddingModel(EmbeddingModel):
+    """Embedding model that only passes texts without a cached embedding to the wrapped model."""
+
+    model: EmbeddingModel
+
+    def set_mode(self, mode):
+        self.model.set_mode(mode)
+
+    async def embed_documents(self, texts):
+        found = embedding_cache.lookup_many(self.name, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        for start in range(0, len(missing), embedding_batch_size):
+            batch = missing[start:start + embedding_batch_size]
+            computed = {text: np.asarray(vector, dtype=np.float32).tolist()
+                        for text, vector in zip(batch, await self.model.embed_documents(batch))}
+            embedding_cache.store_many(self.name, computed)
+            found.update(computed)
+        return [found[text] for text in texts]
+
+
+class StubLLM(LLMModel):
+    """Offline stand-in for the answer LLM."""
+
+    name: str = "stub"
+
+    async def acomplete(self, prompt):
+        # Cites the retrieved abstracts, so the references of the answer show what the question matched
+        names = list(dict.fromkeys(re.findall(r"^(\S+ part \d+): ", prompt, re.MULTILINE)))[:3]
+        answer = f"Stub answer based on the indexed abstracts ({', '.join(names)})."
+        return Chunk(text=answer, prompt_tokens=len(prompt) // 4, completion_tokens=len(answer) // 4)
+
+
+def query_settings(stub=False):
+    settings = Settings(embedding=stub_embedding_model if stub else embedding_model, llm=llm, summary_llm=llm)
+    settings.answer.evidence_k = evidence_k
+    settings.answer.evidence_skip_summary = skip_evidence_summaries
+    return settings
+
+
+def cached_embedding_model(settings):
+    model = settings.get_embedding_model()
+    return CachedEmbeddingModel(name=model.name, model=model)
+
+
+def document_key(record):
+    """The Biblio handle of a paper, else its PMID, DOI or title, so every input format keys a paper the same way."""
+    if record.get("url"):
+        return biblio_export.handle_id(record["url"])
+    return (record.get("handle") or record.get("pmid") or merge_publications.normalize_doi(record.get("doi"))
+            or merge_publications.title_fingerprint(record.get("title")))
+
+
+def read_documents(path):
+    """Groups the input records into one document per paper, merging the researchers of co-authored papers."""
+    documents = {}
+    for file_path in merge_publications.pubmed_files(path):
+        for record in merge_publications.biblio_records(file_path):
+            key = document_key(record)
+            if key is None or abstract_filter.is_placeholder(record.get("abstract")):
+                continue
+            document = documents.setdefault(key, {
+                "abstract": record["abstract"],
+                "title": record.get("title"),
+                "year": record.get("year") or merge_publications.year_of(record.get("date")),
+                "journal": record.get("journal"),
+                "doi": merge_publications.normalize_doi(record.get("doi")),
+                "url": record.get("url"),
+                "authors": [],
+            })
+            for author in record.get("authors") or record.get("researchers") or [record.get("researcher")]:
+                if author and author not in document["authors"]:
+                    document["authors"].append(author)
+    return documents
+
+
+def citation(document):
+    authors = ", ".join(document["authors"]) or "Unknown authors"
+    parts = [f"{authors} ({document['year'] or 'n.d.'})", document["title"] or document["url"], document["journal"]]
+    if document["doi"]:
+        parts.append(f"doi:{document['doi']}")
+    return ". ".join(part.rstrip(".") for part in parts if part) + "."
+
+
+def docname(document):
+    """Short paper-qa name such as "Degroeve2024"; paper-qa appends a letter to repeated names."""
+    surname = document["authors"][0].split()[-1] if document["authors"] else "Paper"
+    return re.sub(r"\W", "", pubmed_harvest.ascii_name(surname)) + str(document["year"] or "")
+
+
+def chunks(abstract):
+    """Splits an abstract at sentence ends into chunks of at most chunk_chars characters."""
+    if len(abstract) <= chunk_chars:
+        return [abstract]
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?])\s+", abstract):
+        if current and len(current) + len(sentence) + 1 > chunk_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    pieces.append(current)
+    return pieces
+
+
+def content_hash(document):
+    return hashlib.sha256(json.dumps([citation(document), document["abstract"]], ensure_ascii=False)
+                          .encode("utf-8")).hexdigest()
+
+
+def reindex(docs):
+    """Rebuilds the vector store from the stored embeddings, so queries neither embed texts nor skip deleted ones.
+
+    The store recognises indexed texts by hash(text), which differs between processes
+    (PYTHONHASHSEED), so the hashes of a pickled store are rebuilt after loading too.
+    """
+    docs.deleted_dockeys.clear()
+    docs.texts_index.clear()
+    docs.texts_index.add_texts_and_embeddings(docs.texts)
+
+
+def load(settings):
+    """The saved Docs and manifest, or empty ones if there is no index for this embedding model yet."""
+    if os.path.exists(index_file) and os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest["embedding"] == settings.embedding:
+            with open(index_file, "rb") as file:
+                docs = pickle.load(file)
+            reindex(docs)
+            return docs, manifest
+    return Docs(), {"embedding": settings.embedding, "documents": {}}
+
+
+def save(docs, manifest):
+    # Written to a temporary file first, so an interrupted build leaves the previous index usable
+    for path, mode, write in ((index_file, "wb", lambda file: pickle.dump(docs, file)),
+                              (manifest_file, "w", lambda file: json.dump(manifest, file))):
+        with open(path + ".tmp", mode) as file:
+            write(file)
+        os.replace(path + ".tmp", path)
+
+
+def build(path, stub=False):
+    """Brings the index in line with the input, embedding only abstracts that are not in the embedding cache."""
+    settings = query_settings(stub)
+    model = cached_embedding_model(settings)
+    docs, manifest = load(settings)
+    indexed = manifest["documents"]
+    documents = read_documents(path)
+    hashes = {key: content_hash(document) for key, document in documents.items()}
+    stats["papers"] = len(documents)
+
+    for key in [key for key in indexed if hashes.get(key) != indexed[key]]:
+        if key in docs.docs:
+            # Deleting by name also frees the name for the new version of the paper
+            docs.delete(docname=docs.docs[key].docname)
+        stats["replaced" if key in hashes else "removed"] += 1
+        del indexed[key]
+
+    pending = [key for key in documents if key not in indexed]
+    stats["added"] = len(pending) - stats["replaced"]
+    stats["unchanged"] = len(documents) - len(pending)
+    for start in range(0, len(pending), embedding_batch_size):
+        batch = pending[start:start + embedding_batch_size]
+        texts = {}
+        for key in batch:
+            doc = Doc(docname=docname(documents[key]), citation=citation(documents[key]), dockey=key)
+            texts[key] = [Text(text=chunk, name=f"{doc.docname} part {number}", doc=doc)
+                          for number, chunk in enumerate(chunks(documents[key]["abstract"]), start=1)]
+        # One embedding request per batch; paper-qa keeps the precomputed vectors instead of embedding again
+        all_texts = [text for key in batch for text in texts[key]]
+        vectors = get_loop().run_until_complete(model.embed_documents([text.text for text in all_texts]))
+        for text, vector in zip(all_texts, vectors):
+            text.embedding = vector
+        for key in batch:
+            docs.add_texts(texts[key], texts[key][0].doc, settings=settings, embedding_model=model)
+            indexed[key] = hashes[key]
+        stats["chunks"] += len(all_texts)
+        print(f"Indexed {min(start + embedding_batch_size, len(pending))}/{len(pending)} new or changed papers")
+
+    reindex(docs)
+    save(docs, manifest)
+
+
+def ask(question, stub=False):
+    """Answers a question from the prebuilt index; only the question itself is embedded."""
+    settings = query_settings(stub)
+    docs, manifest = load(settings)
+    if not manifest["documents"]:
+        print(f"Error: no index for embedding model '{settings.embedding}'. Run 'python paperqa_index.py build' first.")
+        return None
+    return docs.query(question, settings=settings, embedding_model=cached_embedding_model(settings),
+                      llm_model=StubLLM() if stub else None)
+
+
+def report():
+    print(f"paper-qa index: {stats['papers']} papers with an abstract, {stats['added']} added, "
+          f"{stats['replaced']} replaced, {stats['removed']} removed, {stats['unchanged']} unchanged "
+          f"({stats['chunks']} chunks embedded or taken from the cache)")
+
+
+def main():
+    stub = "--stub" in sys.argv
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    if arguments and arguments[0] == "build":
+        path = arguments[1] if len(arguments) > 1 else input_file
+        if not os.path.exists(path):
+            print(f"Error: '{path}' does not exist.")
+            return
+        build(path, stub)
+        report()
+        embedding_cache.report()
+        print(f"Index written to '{index_file}'.")
+    elif len(arguments) >= 2 and arguments[0] == "ask":
+        session = ask(" ".join(arguments[1:]), stub)
+        if session is not None:
+            print(session.formatted_answer)
+            embedding_cache.report()
+    else:
+        print('Usage: python paperqa_index.py build [input] [--stub] | ask "<question>" [--stub]')
+
+
+if __name__ == "__main__":
+    main()
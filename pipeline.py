@@ -0,0 +1,333 @@
+import json
+import queue
+import threading
+import time
+import abstract_filter
+import biblio_export
+import expertise_store
+import generate_expertise
+import hint2publications
+import http_cache
+import llm_cache
+import metrics
+import profile_resolver
+
+# Runs scraping, extraction, per-paper expertise and researcher summaries as
+# overlapping stages connected by bounded queues, instead of running
+# hint2publications.py and generate_expertise.py one after the other.
+
+# Define the input and output file paths
+input_file = hint2publications.input_file
+expertise_file = generate_expertise.expertise_file
+summary_file = generate_expertise.summary_file
+
+# Stage settings
+fetch_workers = 8  # Threads fetching and parsing publication pages
+llm_workers = generate_expertise.max_llm_workers  # Threads generating per-paper expertise
+summary_workers = 2  # Threads summarising researchers whose papers are all done
+queue_size = 64  # Capacity of each queue; a full queue pauses the stage that feeds it
+join_timeout = 600  # Seconds to wait for a stage's workers once its last item is queued
+
+_done = object()
+
+
+def new_state():
+    """Shared bookkeeping of all stages."""
+    return {"lock": threading.Lock(), "researchers": {}, "summaries": {}, "busy": {}, "failed": set(),
+            "index": abstract_filter.NearDuplicateIndex(), "sources": {}, "papers": {}}
+
+
+def add_busy(state, stage, seconds):
+    """Accumulates the time a stage spent working, to compare with the wall time."""
+    with state["lock"]:
+        state["busy"][stage] = state["busy"].get(stage, 0.0) + seconds
+
+
+def set_expected(state, name, count, summary_queue):
+    """Records how many publications a researcher has; a researcher without any is finished at once."""
+    with state["lock"]:
+        researcher = state["researchers"][name]
+        researcher["expected"] = count
+        ready = researcher["finished"] == count
+    if ready:
+        summary_queue.put(name)
+
+
+def finish_publication(state, name, summary_queue, index=None, publication=None, failed=False):
+    """Marks one publication of a researcher as done and queues the summary after the last one.
+
+    A failed publication still counts, so the researcher completes, but it leaves them out of the output.
+    """
+    with state["lock"]:
+        researcher = state["researchers"][name]
+        researcher["finished"] += 1
+        if publication is not None:
+            researcher["publications"][index] = publication
+        if failed:
+            state["failed"].add(name)
+        ready = researcher["finished"] == researcher["expected"]
+    if ready:
+        summary_queue.put(name)
+
+
+def fail_researcher(state, name, summary_queue, error):
+    """Leaves a researcher out of the output, so their earlier results are kept until a later run."""
+    print(f"  {name} skipped: {error}")
+    with state["lock"]:
+        state["failed"].add(name)
+        expected = state["researchers"][name]["expected"]
+    if expected is None:
+        set_expected(state, name, 0, summary_queue)
+
+
+def scrape_researcher(name, fetch_queue, llm_queue, summary_queue, state):
+    """Finds a researcher's publications and queues them for extraction (or straight for the LLM)."""
+    started = time.perf_counter()
+    if hint2publications.source == "biblio_export":
+        publications = biblio_export.fetch_researcher_publications(name, hint2publications.export_min_year())
+        add_busy(state, "scrape", time.perf_counter() - started)
+        set_expected(state, name, len(publications), summary_queue)
+        for index, publication in enumerate(publications):
+            llm_queue.put((name, index, publication))
+        return
+    url = profile_resolver.resolve(name, hint2publications.construct_possible_urls(name),
+                                   hint2publications.check_url_exists)
+    publication_links = hint2publications.extract_publication_urls(url) if url else []
+    add_busy(state, "scrape", time.perf_counter() - started)
+    if publication_links is None:
+        fail_researcher(state, name, summary_queue, "the publication list could not be fetched")
+        return
+    set_expected(state, name, len(publication_links), summary_queue)
+    for index, (pub_url, pub_year) in enumerate(publication_links):
+        fetch_queue.put((name, index, pub_url, pub_year))
+
+
+def scrape_stage(names, fetch_queue, llm_queue, summary_queue, state):
+    """Scrapes the researchers one after the other; one that fails is skipped, not the rest of the run."""
+    for name in names:
+        print(name)
+        with state["lock"]:
+            state["researchers"][name] = {"expected": None, "finished": 0, "publications": {}}
+        try:
+            scrape_researcher(name, fetch_queue, llm_queue, summary_queue, state)
+        except Exception as e:
+            fail_researcher(state, name, summary_queue, e)
+
+
+def fetch_worker(fetch_queue, llm_queue, summary_queue, state):
+    """Fetches and parses publication pages, passing A1 papers on to the LLM stage."""
+    while True:
+        item = fetch_queue.get()
+        if item is _done:
+            break
+        name, index, pub_url, pub_year = item
+        started = time.perf_counter()
+        try:
+            details = hint2publications.extract_publication_details(pub_url)
+        except Exception as e:
+            print(f"  Error fetching {pub_url}: {e}")
+            details = None
+        add_busy(state, "fetch", time.perf_counter() - started)
+        if details is None:
+            # The page could not be fetched, so the researcher's list would be incomplete
+            finish_publication(state, name, summary_queue, failed=True)
+        elif details.get("classification") == "A1":
+            llm_queue.put((name, index, {"year": pub_year, "url": pub_url, **details}))
+        else:
+            finish_publication(state, name, summary_queue)
+
+
+def claim_paper(state, item):
+    """Decides who generates a paper's expertise, like generate_expertise.py does for a whole file.
+
+    Returns the paper entry whose expertise the item uses, or None if it has no usable abstract,
+    and what the worker does with the item, decided under the lock: "generate" the expertise,
+    "wait" for the worker that generates it and finishes the item, or finish it now ("done").
+    Co-author records and near-duplicate abstracts use the entry of the first record.
+    """
+    name, index, publication = item
+    handle = biblio_export.handle_id(publication["url"])
+    with state["lock"]:
+        if handle not in state["sources"]:
+            state["sources"][handle] = abstract_filter.source(state["index"], handle, publication.get("abstract", ""))
+        source = state["sources"][handle]
+        if source is None:
+            return None, "done"
+        if source not in state["papers"]:
+            state["papers"][source] = {"done": False, "expertise": None, "failed": False, "waiting": []}
+            return state["papers"][source], "generate"
+        paper = state["papers"][source]
+        if paper["done"]:
+            return paper, "done"
+        paper["waiting"].append(item)
+        return paper, "wait"
+
+
+def finish_with_paper(state, summary_queue, item, paper):
+    name, index, publication = item
+    if paper["expertise"] is not None:
+        publication["expertise"] = paper["expertise"]
+    finish_publication(state, name, summary_queue, index, publication, paper["failed"])
+
+
+def process_llm_item(state, summary_queue, item):
+    paper, action = claim_paper(state, item)
+    if action == "wait":
+        return
+    if action == "done":
+        if paper is None:
+            name, index, publication = item
+            finish_publication(state, name, summary_queue, index, publication)
+        else:
+            finish_with_paper(state, summary_queue, item, paper)
+        return
+    started = time.perf_counter()
+    expertise, failed = None, False
+    try:
+        expertise = generate_expertise.publication_expertise(item[2])
+    except Exception as e:
+        print(f"  Error generating expertise for {item[2]['url']}: {e}")
+        failed = True
+    add_busy(state, "llm", time.perf_counter() - started)
+    with state["lock"]:
+        paper.update(done=True, expertise=expertise, failed=failed)
+        waiting, paper["waiting"] = paper["waiting"], []
+    for waiting_item in [item] + waiting:
+        finish_with_paper(state, summary_queue, waiting_item, paper)
+
+
+def llm_worker(llm_queue, summary_queue, state):
+    """Generates the expertise of one paper at a time."""
+    while True:
+        item = llm_queue.get()
+        if item is _done:
+            break
+        try:
+            process_llm_item(state, summary_queue, item)
+        except Exception as e:
+            print(f"  Error processing {item[2].get('url')}: {e}")
+            finish_publication(state, item[0], summary_queue, failed=True)
+
+
+def summary_worker(summary_queue, state):
+    """Summarises a researcher as soon as all of their papers are done."""
+    while True:
+        name = summary_queue.get()
+        if name is _done:
+            break
+        with state["lock"]:
+            if name in state["failed"]:
+                continue
+            publications = state["researchers"][name]["publications"]
+            expertise_list = [publications[index]["expertise"] for index in sorted(publications)
+                              if "expertise" in publications[index]]
+        if not expertise_list:
+            continue
+        started = time.perf_counter()
+        try:
+            summary = generate_expertise.summarize_researcher_expertise(name, expertise_list)
+            with state["lock"]:
+                state["summaries"][name] = summary
+        except Exception as e:
+            print(f"  Error summarising {name}: {e}")
+        add_busy(state, "summary", time.perf_counter() - started)
+
+
+def start_workers(count, target, *args):
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def stop_workers(threads, work_queue, stage):
+    """Sends one stop marker per worker, behind the queued work, and waits at most join_timeout for them."""
+    for _ in threads:
+        work_queue.put(_done)
+    deadline = time.monotonic() + join_timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    stuck = sum(thread.is_alive() for thread in threads)
+    if stuck:
+        print(f"Warning: {stuck} {stage} workers did not finish within {join_timeout}s; "
+              f"their researchers are left out of the output.")
+
+
+def run(names):
+    """Runs all stages concurrently and returns the publications with expertise, the summaries and the skipped names."""
+    state = new_state()
+    fetch_queue = queue.Queue(queue_size)
+    llm_queue = queue.Queue(queue_size)
+    summary_queue = queue.Queue(queue_size)
+
+    fetchers = start_workers(fetch_workers, fetch_worker, fetch_queue, llm_queue, summary_queue, state)
+    llm_threads = start_workers(llm_workers, llm_worker, llm_queue, summary_queue, state)
+    summarizers = start_workers(summary_workers, summary_worker, summary_queue, state)
+
+    started = time.perf_counter()
+    scrape_stage(names, fetch_queue, llm_queue, summary_queue, state)
+    stop_workers(fetchers, fetch_queue, "fetch")
+    stop_workers(llm_threads, llm_queue, "LLM")
+    stop_workers(summarizers, summary_queue, "summary")
+    wall_time = time.perf_counter() - started
+
+    data, skipped = {}, []
+    with state["lock"]:
+        for name in names:
+            researcher = state["researchers"][name]
+            if name in state["failed"] or researcher["finished"] != researcher["expected"]:
+                skipped.append(name)
+                continue
+            publications = researcher["publications"]
+            data[name] = [publications[index] for index in sorted(publications)]
+        summaries = {name: state["summaries"][name] for name in data if name in state["summaries"]}
+    busy = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in state["busy"].items())
+    print(f"Pipeline wall time {wall_time:.1f}s; busy time per stage (summed over workers): {busy}")
+    return data, summaries, skipped
+
+
+def keep_previous(path, names, results, skipped):
+    """Adds the results of the previous run for the skipped researchers, so a failed fetch loses nothing."""
+    try:
+        with open(path, "r") as file:
+            previous = json.load(file)
+    except (FileNotFoundError, ValueError):
+        previous = {}
+    kept = {name: previous[name] for name in skipped if name in previous}
+    return {name: results[name] if name in results else kept[name] for name in names if name in results or name in kept}
+
+
+def main():
+    # Read the names from the input file
+    try:
+        with open(input_file, "r", encoding="utf-8") as file:
+            names = [line.strip() for line in file if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: The file '{input_file}' does not exist.")
+        return
+
+    data, summaries, skipped = run(names)
+    abstract_filter.report()
+
+    # The store keeps the skipped researchers' rows as they are, since only finished ones are replaced
+    if generate_expertise.write_store:
+        for name, publications in data.items():
+            expertise_store.replace_researcher_publications(name, publications)
+        expertise_store.write_summaries(summaries)
+    summaries = keep_previous(summary_file, names, summaries, skipped)
+    data = keep_previous(expertise_file, names, data, skipped)
+    with open(summary_file, 'w') as file:
+        json.dump(summaries, file, indent=4)
+    with open(expertise_file, 'w') as file:
+        json.dump(data, file, indent=4)
+    print(f"Expertise written to '{expertise_file}' and summaries to '{summary_file}'.")
+    if skipped:
+        print(f"{len(skipped)} researchers were skipped and keep the results of the previous run; "
+              f"run the pipeline again to retry them.")
+    http_cache.report()
+    llm_cache.report()
+    metrics.report()
+
+
+if __name__ == "__main__":
+    metrics.run(main)
@@ -0,0 +1,150 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import http_cache
+
+# Persistent name -> research.ugent.be person slug store shared by all scrapers, and by
+# the worker processes of one host: every answer is written as its own row
+store_file = "resolved_profiles.sqlite"
+negative_ttl = 30 * 24 * 3600  # Seconds before a name without a profile is probed again
+max_parallel_probes = 6  # Candidate URLs probed at the same time for one name
+
+_lock = threading.Lock()
+_connection = None
+
+_slug_pattern = re.compile(r"/web/person/([^/]+)/")
+
+
+class ProfileLookupError(Exception):
+    """Raised when no candidate URL was found and some could not be checked, so the answer is unknown."""
+
+
+def _db():
+    """Opens the slug store on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(store_file, timeout=60, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, slug TEXT, tried TEXT, "
+                            "checked_at REAL)")
+        _connection.commit()
+    return _connection
+
+
+def _lookup(name):
+    """The stored answer for a name as a dict, or None."""
+    with _lock:
+        row = _db().execute("SELECT slug, tried, checked_at FROM profiles WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    slug, tried, checked_at = row
+    return {"slug": slug, "tried": json.loads(tried or "[]"), "checked_at": checked_at}
+
+
+def _remember(name, slug, tried=()):
+    with _lock:
+        with _db() as db:
+            db.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                       (name, slug, json.dumps(sorted(tried), ensure_ascii=False), time.time()))
+
+
+def slug_of(url):
+    """Extracts the person slug from a research.ugent.be URL."""
+    match = _slug_pattern.search(url)
+    return match.group(1) if match else None
+
+
+def probe_result(status_code):
+    """Reads a probe response as found (True), not found (False) or unknown (None).
+
+    Only a 404 or 410 means the page does not exist. research.ugent.be also answers
+    malformed person slugs with a plain 500, so that counts as not found as well;
+    throttling and other server errors leave the answer unknown.
+    """
+    if status_code == 200:
+        return True
+    if status_code in (404, 410, 500):
+        return False
+    return None
+
+
+def url_exists(url):
+    """Checks if a URL exists with a GET request, so the page is cached for the scraper that asked.
+
+    Returns True, False, or None if the request failed.
+    """
+    try:
+        return probe_result(http_cache.get(url, timeout=5).status_code)
+    except requests.RequestException:
+        return None
+
+
+_pending = object()
+
+
+def probe_first(candidate_urls, probe):
+    """Probes candidates concurrently and returns the first one, in candidate order, that exists.
+
+    probe(url) returns True, False, or None when it could not tell. A candidate wins
+    as soon as it exists and every earlier candidate has been answered; the remaining
+    probes are cancelled and not waited for at that point. Returns None only if every
+    candidate is known not to exist, and raises ProfileLookupError if none exists but
+    some could not be checked.
+    """
+    if not candidate_urls:
+        return None
+    results = [_pending] * len(candidate_urls)
+    pool = ThreadPoolExecutor(max_workers=min(max_parallel_probes, len(candidate_urls)))
+    try:
+        futures = {pool.submit(probe, url): index for index, url in enumerate(candidate_urls)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                # E.g. an open circuit breaker: the candidate could not be checked
+                result = None
+            results[futures[future]] = result
+            for index, result in enumerate(results):
+                if result is _pending:
+                    break
+                if result:
+                    return candidate_urls[index]
+        if None in results:
+            raise ProfileLookupError(f"{results.count(None)} of {len(candidate_urls)} candidate URLs could not be checked")
+        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def resolve(name, candidate_urls, probe=url_exists):
+    """Returns the profile URL of a researcher, or None if none of the candidate URLs exist.
+
+    Resolved slugs and names without a profile are remembered in store_file, so
+    later runs (of any scraper) only probe names they have never seen. If some
+    candidates could not be checked, ProfileLookupError is raised and nothing is
+    remembered, so a network error or throttling never hides a profile.
+    """
+    candidate_slugs = [slug_of(url) for url in candidate_urls]
+    entry = _lookup(name)
+    if entry and entry["slug"]:
+        # Rebuild this scraper's URL flavour around the known slug
+        return candidate_urls[0].replace(f"/{candidate_slugs[0]}/", f"/{entry['slug']}/", 1)
+
+    tried = set()
+    if entry and time.time() - entry["checked_at"] < negative_ttl:
+        # Only probe the candidates an earlier run did not try yet
+        tried = set(entry["tried"])
+        candidate_urls = [url for url, slug in zip(candidate_urls, candidate_slugs) if slug not in tried]
+        if not candidate_urls:
+            return None
+
+    url = probe_first(candidate_urls, probe)
+    if url:
+        _remember(name, slug_of(url))
+    else:
+        _remember(name, None, tried | {slug_of(candidate) for candidate in candidate_urls})
+    return url
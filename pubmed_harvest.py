@@ -0,0 +1,229 @@
+import json
+import os
+import re
+import sys
+import unicodedata
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+import lxml.etree
+import http_cache
+import metrics
+import rate_limiter
+
+# Bulk PubMed harvest for a list of researchers, through the NCBI E-utilities.
+# Author aliases are generated from each name, the aliases of several researchers
+# are OR-ed into one esearch request, and the PMIDs of all researchers are fetched
+# together in efetch batches. Each article is then written to the JSONL file of
+# every researcher it matches, in the record layout of paperscraper's
+# get_and_dump_pubmed_papers (test_scraper.py), whose author strings join the fore
+# name and surname ("SvenDegroeve"). Responses go through http_cache.py,
+# so a rerun only asks PubMed about what is not cached yet.
+# Usage: python pubmed_harvest.py [names file]
+# For offline runs, point eutils_url at mock_pubmed.py.
+
+input_file = "hint.researchers.txt"  # Text file containing researcher names (one per line)
+output_dir = "pubmed_publications"  # One JSONL file per researcher
+eutils_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+api_key = os.environ.get("NCBI_API_KEY")  # Raises NCBI's limit from 3 to 10 requests per second
+min_year = datetime.now().year - 9  # Same 9-year window as the Biblio scrapers
+researchers_per_query = 20  # Researchers whose aliases are OR-ed into one esearch request
+fetch_batch_size = 200  # PMIDs per efetch request, as recommended by NCBI for GET requests
+retmax = 9999  # Most PMIDs esearch returns for one request; larger groups are split
+
+# Tolerates the odd invalid character in a large efetch response instead of losing the whole batch
+_parser = lxml.etree.XMLParser(recover=True, huge_tree=True)
+
+# Counters for the current run, printed by report()
+stats = {"esearch": 0, "efetch": 0, "articles": 0, "records": 0}
+
+
+def ascii_name(text):
+    """Strips diacritics, so "Doğruöz" and "Dogruoz" compare equal."""
+    return "".join(char for char in unicodedata.normalize("NFD", text) if unicodedata.category(char) != "Mn")
+
+
+def name_splits(name):
+    """Every (given names, surname) split of "Given Names Surname"; the input files list given names first.
+
+    Which tokens form the surname is not known from the name alone: "Jan Van de Velde"
+    has a compound surname and "Ana Maria Garcia" compound given names, so every
+    split is searched and matched, and the article's author list decides.
+    """
+    tokens = name.split("(")[0].split()
+    if len(tokens) == 1:
+        return [("", tokens[0])]
+    return [(" ".join(tokens[:count]), " ".join(tokens[count:])) for count in range(1, len(tokens))]
+
+
+def initials(given):
+    return "".join(part[0].upper() for part in re.split(r"[\s.\-]+", given) if part)
+
+
+def plain(text):
+    """Lower-case letters only, so "Van de Velde" and "Vandevelde" compare equal."""
+    return re.sub(r"[^a-z]", "", ascii_name(text).lower())
+
+
+def aliases(name):
+    """PubMed author queries for a researcher, e.g. ["Degroeve Sven", "Degroeve S"] for "Sven Degroeve".
+
+    PubMed matches "Surname I" against every author whose initials start with I,
+    so these cover the "S Degroeve", "S. Degroeve" and "Degroeve S." forms as well.
+    """
+    forms = []
+    for given, surname in name_splits(name):
+        for variant in dict.fromkeys([surname, ascii_name(surname)]):
+            if given:
+                forms.append(f"{variant} {' '.join(re.split(r'[.]+', given)).strip()}")
+                forms.append(f"{variant} {initials(given)}")
+            else:
+                forms.append(variant)
+    return list(dict.fromkeys(forms))
+
+
+def given_matches(given, fore_name):
+    """Whether an article author's fore name fits a researcher's given names.
+
+    Spelled-out first names must be equal, so "Steven Degroeve" is not taken for
+    "Sven Degroeve"; when the article only gives initials, the first initial decides.
+    """
+    given_parts = [part for part in re.split(r"[\s.\-]+", given) if part]
+    fore_parts = [part for part in re.split(r"[\s.\-]+", fore_name) if part]
+    if not given_parts or not fore_parts:
+        return not given_parts
+    first = fore_parts[0]
+    if len(first) > 1 and not first.isupper():
+        return plain(first) == plain(given_parts[0])
+    return plain(first)[:1] == plain(given_parts[0])[:1]
+
+
+def author_query(names):
+    term = " OR ".join(f"{alias}[au]" for name in names for alias in aliases(name))
+    return f"({term})"
+
+
+def esearch(names):
+    """Returns the PMIDs of the articles of a group of researchers, splitting the group if it has too many."""
+    params = {"db": "pubmed", "term": author_query(names), "retmax": retmax, "retmode": "json",
+              "datetype": "pdat", "mindate": min_year, "maxdate": 3000}
+    if api_key:
+        params["api_key"] = api_key
+    response = http_cache.get(f"{eutils_url}/esearch.fcgi?{urlencode(params)}", timeout=30)
+    response.raise_for_status()
+    stats["esearch"] += 1
+    result = response.json()["esearchresult"]
+    if int(result["count"]) > retmax and len(names) > 1:
+        middle = len(names) // 2
+        return esearch(names[:middle]) | esearch(names[middle:])
+    return set(result["idlist"])
+
+
+def _text(element, path):
+    found = element.find(path)
+    return "".join(found.itertext()).strip() if found is not None else None
+
+
+def _date(article):
+    """The electronic publication date as YYYY-MM-DD, else the year of the journal issue."""
+    date = article.find(".//Article/ArticleDate")
+    if date is not None and date.findtext("Year"):
+        return "-".join([date.findtext("Year"), date.findtext("Month", "01").zfill(2), date.findtext("Day", "01").zfill(2)])
+    year = _text(article, ".//Article/Journal/JournalIssue/PubDate/Year")
+    if year is None:
+        # Issues dated like "2023 Nov-Dec" only have a MedlineDate
+        medline_date = _text(article, ".//Article/Journal/JournalIssue/PubDate/MedlineDate") or ""
+        year = medline_date[:4] or None
+    return year
+
+
+@metrics.timed("parse")
+def parse_articles(xml):
+    """Parses an efetch response into (record, [(surname, fore name)]) pairs in paperscraper's layout."""
+    articles = []
+    for article in lxml.etree.fromstring(xml, _parser).iter("PubmedArticle"):
+        authors = [(author.findtext("LastName") or "", author.findtext("ForeName") or author.findtext("Initials") or "")
+                   for author in article.iterfind(".//Article/AuthorList/Author") if author.findtext("LastName")]
+        record = {
+            "pmid": _text(article, ".//MedlineCitation/PMID"),
+            "title": _text(article, ".//Article/ArticleTitle"),
+            "abstract": "\n".join("".join(part.itertext()).strip()
+                                  for part in article.iterfind(".//Article/Abstract/AbstractText")) or None,
+            "journal": _text(article, ".//Article/Journal/Title"),
+            "date": _date(article),
+            "authors": [f"{given}{surname}" for surname, given in authors],
+            "doi": _text(article, ".//PubmedData/ArticleIdList/ArticleId[@IdType='doi']"),
+        }
+        articles.append((record, authors))
+    return articles
+
+
+def efetch(pmids):
+    params = {"db": "pubmed", "id": ",".join(pmids), "retmode": "xml"}
+    if api_key:
+        params["api_key"] = api_key
+    response = http_cache.get(f"{eutils_url}/efetch.fcgi?{urlencode(params)}", timeout=60)
+    response.raise_for_status()
+    stats["efetch"] += 1
+    return parse_articles(response.content)
+
+
+def output_path(name):
+    return os.path.join(output_dir, re.sub(r"\W+", "_", ascii_name(name)).strip("_") + ".jsonl")
+
+
+def harvest(names):
+    """Harvests the articles of all researchers and streams them into one JSONL file per researcher."""
+    # NCBI blocks clients that exceed the published request rate
+    rate_limiter.host_max_rates[urlparse(eutils_url).netloc] = 10.0 if api_key else 3.0
+    researchers_by_surname = {}
+    for name in names:
+        for given, surname in name_splits(name):
+            researchers_by_surname.setdefault(plain(surname), []).append((name, given))
+
+    pmids = set()
+    for start in range(0, len(names), researchers_per_query):
+        pmids |= esearch(names[start:start + researchers_per_query])
+    print(f"{len(pmids)} PubMed articles for {len(names)} researchers.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in names:
+        open(output_path(name), "w").close()
+    # Ascending PMIDs keep earlier efetch batches, and so their cached responses, stable as new articles appear
+    ordered = sorted(pmids, key=int)
+    for start in range(0, len(ordered), fetch_batch_size):
+        records_by_name = {}
+        for record, authors in efetch(ordered[start:start + fetch_batch_size]):
+            stats["articles"] += 1
+            matched = {name for surname, fore_name in authors
+                       for name, given in researchers_by_surname.get(plain(surname), ())
+                       if given_matches(given, fore_name)}
+            for name in matched:
+                records_by_name.setdefault(name, []).append(record)
+        for name, records in records_by_name.items():
+            with open(output_path(name), "a", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stats["records"] += len(records)
+
+
+def report():
+    print(f"PubMed: {stats['esearch']} esearch and {stats['efetch']} efetch requests, {stats['articles']} articles, "
+          f"{stats['records']} researcher records in '{output_dir}'")
+
+
+def main():
+    path = next((argument for argument in sys.argv[1:] if not argument.startswith("--")), input_file)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            names = list(dict.fromkeys(line.strip() for line in file if line.strip()))
+    except FileNotFoundError:
+        print(f"Error: The file '{path}' does not exist.")
+        return
+    harvest(names)
+    report()
+    http_cache.report()
+    metrics.report()
+
+
+if __name__ == "__main__":
+    metrics.run(main)
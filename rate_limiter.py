@@ -0,0 +1,239 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+
+# Per-host throttling shared by all scrapers (through http_cache.py)
+initial_rate = 4.0  # Requests per second a host starts at
+min_rate = 0.2
+max_rate = 32.0
+host_max_rates = {}  # Host -> cap on its rate, for APIs with a published limit (see pubmed_harvest.py)
+rate_increase = 0.2  # Requests per second added after every successful response
+rate_decrease = 0.5  # Factor applied to the rate when the host throttles or fails
+max_retries = 4
+retry_statuses = {429, 502, 503, 504}  # Responses that mean the host is overloaded or briefly unavailable
+backoff_base = 1.0  # Seconds before the first retry, doubled on every further attempt
+backoff_cap = 60.0
+breaker_threshold = 5  # Consecutive requests failing after all their retries that open the circuit for a host
+breaker_cooldown = 60.0  # Seconds an open circuit rejects requests before letting one probe through
+
+# Counters for the current run, printed by report()
+stats = {"retries": 0, "throttled": 0, "circuit_trips": 0}
+
+_lock = threading.Lock()
+_hosts = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the host while its circuit breaker is open.
+
+    Deliberately not a requests.RequestException: callers that treat a failed
+    request as a missing page must not mistake an open circuit for one.
+    """
+
+
+class HostLimiter:
+    """Token bucket whose rate ramps up on success and backs off on throttling, plus a circuit breaker."""
+
+    def __init__(self, host):
+        self.host = host
+        self.max_rate = host_max_rates.get(host, max_rate)
+        self.rate = min(initial_rate, self.max_rate)
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.open_until = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how many seconds the caller must wait before sending.
+
+        Also returns the probe of a half-open circuit, or None; the caller passes it to
+        end_probe() once the request is over, however it ended.
+        """
+        with self.lock:
+            now = time.monotonic()
+            probe = None
+            if self.open_until is not None:
+                if now < self.open_until or self.probing:
+                    raise CircuitOpenError(f"Circuit open for {self.host}")
+                # Half-open: let a single request test whether the host recovered
+                probe = self.probing = object()
+            self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now), probe
+
+    def end_probe(self, probe):
+        """Frees the half-open slot of a probe that ended without success() or failure().
+
+        E.g. a probe whose caller raised another exception or whose task was cancelled;
+        the next request then probes the host instead.
+        """
+        with self.lock:
+            if probe is not None and self.probing is probe:
+                self.probing = False
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + rate_increase)
+            self.failures = 0
+            self.open_until = None
+            self.probing = False
+
+    def failure(self, retry_after=None, gave_up=False):
+        """Backs off after a failed attempt; gave_up marks the last attempt of a request.
+
+        Only requests that failed after all their retries count towards the breaker,
+        so a single request retrying max_retries times cannot open the circuit.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.rate = max(min_rate, self.rate * rate_decrease)
+            if gave_up:
+                self.failures += 1
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            if self.probing or self.failures >= breaker_threshold:
+                self.open_until = now + max(breaker_cooldown, retry_after or 0)
+                self.failures = 0
+                self.probing = False
+                _count("circuit_trips")
+
+
+def _count(name):
+    with _lock:
+        stats[name] += 1
+
+
+def limiter_for(url):
+    """Returns the shared limiter of the URL's host."""
+    host = urlparse(url).netloc
+    with _lock:
+        if host not in _hosts:
+            _hosts[host] = HostLimiter(host)
+        return _hosts[host]
+
+
+def retry_after_seconds(value):
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(backoff_cap, backoff_base * 2 ** attempt))
+
+
+def _is_throttled(response):
+    # A plain 500 is left alone: research.ugent.be answers malformed profile URLs with it
+    return response.status_code in retry_statuses
+
+
+def _annotate(response, attempts, waited):
+    """Attaches the attempt count and time spent waiting to a response, for metrics.py."""
+    response.attempts = attempts
+    response.wait_seconds = waited
+    return response
+
+
+def call(url, send):
+    """Sends a request through the host's limiter and retries throttled or failed attempts.
+
+    send() performs one request and returns a requests.Response. Responses in
+    retry_statuses are retried after Retry-After or a jittered backoff; the last one
+    is returned as is. Connection errors are retried the same way and re-raised
+    after the last attempt.
+    """
+    limiter = limiter_for(url)
+    waited = 0.0
+    for attempt in range(max_retries + 1):
+        delay, probe = limiter.reserve()
+        try:
+            time.sleep(delay)
+            waited += delay
+            try:
+                response = send()
+            except requests.RequestException:
+                limiter.failure(gave_up=attempt == max_retries)
+                if attempt == max_retries:
+                    raise
+                _count("retries")
+                delay = backoff(attempt)
+                time.sleep(delay)
+                waited += delay
+                continue
+            if not _is_throttled(response):
+                limiter.success()
+                return _annotate(response, attempt + 1, waited)
+            _count("throttled")
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+            limiter.failure(retry_after, gave_up=attempt == max_retries)
+            if attempt == max_retries:
+                return _annotate(response, attempt + 1, waited)
+            _count("retries")
+            delay = retry_after if retry_after is not None else backoff(attempt)
+            time.sleep(delay)
+            waited += delay
+        finally:
+            limiter.end_probe(probe)
+
+
+async def call_async(url, send, errors):
+    """Asynchronous counterpart of call(); send is a coroutine function and errors the exceptions to retry on."""
+    limiter = limiter_for(url)
+    waited = 0.0
+    for attempt in range(max_retries + 1):
+        delay, probe = limiter.reserve()
+        try:
+            await asyncio.sleep(delay)
+            waited += delay
+            try:
+                response = await send()
+            except errors:
+                limiter.failure(gave_up=attempt == max_retries)
+                if attempt == max_retries:
+                    raise
+                _count("retries")
+                delay = backoff(attempt)
+                await asyncio.sleep(delay)
+                waited += delay
+                continue
+            if not _is_throttled(response):
+                limiter.success()
+                return _annotate(response, attempt + 1, waited)
+            _count("throttled")
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+            limiter.failure(retry_after, gave_up=attempt == max_retries)
+            if attempt == max_retries:
+                return _annotate(response, attempt + 1, waited)
+            _count("retries")
+            delay = retry_after if retry_after is not None else backoff(attempt)
+            await asyncio.sleep(delay)
+            waited += delay
+        finally:
+            limiter.end_probe(probe)
+
+
+def report():
+    """Prints the throttling counters and the rate each host ended at."""
+    rates = ", ".join(f"{host} {limiter.rate:.1f}/s" for host, limiter in _hosts.items())
+    print(
+        f"Rate limiter: {stats['throttled']} throttled responses, {stats['retries']} retries, "
+        f"{stats['circuit_trips']} circuit trips" + (f"; final rates: {rates}" if rates else "")
+    )
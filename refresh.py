@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import abstract_filter
+import biblio_export
+import expertise_store
+import generate_expertise
+import hint2publications
+import http_cache
+import llm_cache
+import metrics
+import profile_resolver
+import rate_limiter
+
+# Incremental refresh of the scraped publications, the per-paper expertise and the researcher summaries.
+# Each researcher's publication-list page is revalidated and diffed against the snapshot of the
+# previous run. Only publication pages of new handles, or of handles whose listed year changed,
+# are fetched, and expertise is generated only for those papers whose abstract is new. A
+# researcher is summarised again only if the set of their expertise descriptions changed;
+# everyone else keeps the summary in summary_file.
+# A corrected abstract does not show on the publication list, so the pages of known papers are
+# revalidated once their cached copy is about recheck_age old, a slice of them per run; --full
+# revalidates all of them.
+# A researcher whose list page cannot be fetched keeps the previous run's data, or is left out
+# until a later run if there is none.
+# Usage: python refresh.py [names file] [--full]
+
+# Define the input and output file paths
+input_file = hint2publications.input_file
+publications_file = hint2publications.output_json_file
+expertise_file = generate_expertise.expertise_file
+summary_file = generate_expertise.summary_file
+snapshot_file = "test.refresh_snapshot.json"  # Publication-list entries and classifications seen by the previous refresh
+
+# Refresh settings
+fetch_workers = 8  # Threads fetching publication-list and publication pages
+recheck_age = 180 * 24 * 3600  # Mean age in seconds at which the page of a known paper is revalidated for a changed abstract
+
+# Counters for the current run, printed by report()
+stats = {"researchers": 0, "unreachable": 0, "skipped": 0, "changed_lists": 0, "new": 0, "changed": 0,
+         "rechecked": 0, "removed": 0, "fetched": 0, "expertise": 0, "summarised": 0, "kept_summaries": 0}
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def expertise_fingerprint(publications):
+    """Hash of the set of expertise descriptions a researcher's summary is made from."""
+    expertise = sorted({pub["expertise"] for pub in publications if pub.get("expertise")})
+    return hashlib.sha256(json.dumps(expertise, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def list_publications(name):
+    """The (url, year) entries of a researcher's publication-list page, revalidated with the server.
+
+    Returns [] if the researcher has no profile and None if the profile or its page could not be fetched.
+    """
+    try:
+        url = profile_resolver.resolve(name, hint2publications.construct_possible_urls(name),
+                                       hint2publications.check_url_exists)
+    except profile_resolver.ProfileLookupError:
+        return None
+    if url is None:
+        return []
+    # An unchanged page costs a 304 answer
+    try:
+        return hint2publications.extract_publication_urls(url, max_age=0)
+    except rate_limiter.CircuitOpenError:
+        return None
+
+
+def publication_details(url, max_age=None):
+    """Details of a publication page, or None if it could not be fetched, also while the host's circuit is open."""
+    try:
+        return hint2publications.extract_publication_details(url, max_age)
+    except rate_limiter.CircuitOpenError:
+        return None
+
+
+def diff_links(links, previous_links, known):
+    """Splits the handles of a publication list into new and changed ones; changed ones have a new year."""
+    previous_years = {biblio_export.handle_id(url): year for url, year in previous_links}
+    new, changed = set(), set()
+    for url, year in links:
+        handle = biblio_export.handle_id(url)
+        if handle not in known:
+            new.add(handle)
+        elif handle in previous_years and previous_years[handle] != year:
+            changed.add(handle)
+    removed = set(previous_years) - {biblio_export.handle_id(url) for url, _ in links}
+    return new, changed, removed
+
+
+def due_for_recheck(url, full):
+    """Whether the page of a known paper is revalidated in this run.
+
+    Each page comes due at an age between half and one and a half times recheck_age, set
+    by a hash of its URL, so pages fetched in the same crawl are rechecked over several runs.
+    """
+    if full:
+        return True
+    age = http_cache.age(url)
+    spread = int(hashlib.sha256(url.encode("utf-8")).hexdigest()[:8], 16) / 16 ** 8
+    return age is None or age >= recheck_age * (0.5 + spread)
+
+
+def refresh(names, full=False):
+    """Brings the publications, expertise and summaries of the previous run up to date with the Biblio pages."""
+    snapshot = load_json(snapshot_file, {"researchers": {}, "classifications": {}})
+    previous_data = load_json(expertise_file, {})
+    previous_summaries = load_json(summary_file, {})
+    # A1 records of the previous run, with their expertise
+    records = {biblio_export.handle_id(pub["url"]): pub for publications in previous_data.values() for pub in publications}
+    classifications = snapshot["classifications"]
+    # Handles whose details are known without fetching their page: every A1 record, and the other classifications seen
+    known = set(records) | {handle for handle, classification in classifications.items() if classification != "A1"}
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        links_by_name = dict(zip(names, executor.map(list_publications, names)))
+        to_fetch, to_revalidate, skipped = {}, {}, set()
+        for name in names:
+            stats["researchers"] += 1
+            previous_links = snapshot["researchers"].get(name, [])
+            if links_by_name[name] is None:
+                # Keep the previous list rather than dropping the papers of a page that could not be fetched
+                stats["unreachable"] += 1
+                if name in snapshot["researchers"]:
+                    links_by_name[name] = [tuple(link) for link in previous_links]
+                else:
+                    skipped.add(name)
+                continue
+            new, changed, removed = diff_links(links_by_name[name], previous_links, known)
+            stats["removed"] += len(removed)
+            if new or changed or removed:
+                stats["changed_lists"] += 1
+            for url, _ in links_by_name[name]:
+                handle = biblio_export.handle_id(url)
+                if handle in new:
+                    to_fetch.setdefault(handle, url)
+                elif handle in changed:
+                    to_revalidate.setdefault(handle, url)
+        for handle in to_fetch:
+            to_revalidate.pop(handle, None)
+        stats["new"], stats["changed"], stats["skipped"] = len(to_fetch), len(to_revalidate), len(skipped)
+        # Known papers whose page is due for a check on a corrected abstract
+        for name in names:
+            for url, _ in [] if name in skipped else links_by_name[name]:
+                handle = biblio_export.handle_id(url)
+                if handle in records and handle not in to_fetch and handle not in to_revalidate \
+                        and due_for_recheck(url, full):
+                    to_revalidate[handle] = url
+                    stats["rechecked"] += 1
+
+        # Pages of new handles may still be in the HTTP cache from an earlier crawl; changed ones are revalidated
+        fetched = dict(zip(to_fetch, executor.map(publication_details, to_fetch.values())))
+        fetched.update(zip(to_revalidate, executor.map(lambda url: publication_details(url, max_age=0),
+                                                       to_revalidate.values())))
+        stats["fetched"] = len(fetched)
+
+        # Expertise only for fetched A1 papers whose abstract is not the one the previous run summarised
+        generate = {}
+        for handle, details in fetched.items():
+            if details is None:
+                continue
+            classifications[handle] = details.get("classification")
+            if details.get("classification") != "A1":
+                records.pop(handle, None)
+                continue
+            previous = records.get(handle, {})
+            record = {**details, "url": to_fetch.get(handle) or to_revalidate[handle]}
+            if previous.get("expertise") and previous.get("abstract") == details.get("abstract"):
+                record["expertise"] = previous["expertise"]
+            elif abstract_filter.usable(details.get("abstract")):
+                generate[handle] = record
+            records[handle] = record
+        if generate_expertise.expertise_mode == "packed":
+            packs = generate_expertise.pack_by_tokens(generate.values(), lambda pub: pub.get("abstract", ""))
+            expertise_list = [expertise for pack in executor.map(generate_expertise.packed_publication_expertise, packs)
+                              for expertise in pack]
+        else:
+            expertise_list = executor.map(generate_expertise.publication_expertise, generate.values())
+        for record, expertise in zip(generate.values(), expertise_list):
+            if expertise is not None:
+                record["expertise"] = expertise
+        stats["expertise"] = len(generate)
+
+        # The researchers' A1 papers in the order of their publication list
+        data = {}
+        for name in names:
+            if name in skipped:
+                # Nothing new is known of a researcher whose list was never fetched; an earlier crawl's papers stay
+                if name in previous_data:
+                    data[name] = previous_data[name]
+                continue
+            data[name] = []
+            for url, year in links_by_name[name]:
+                record = records.get(biblio_export.handle_id(url))
+                if record is not None:
+                    data[name].append({"year": year, "url": url,
+                                       **{key: value for key, value in record.items() if key not in ("year", "url")}})
+
+        # Summaries only for researchers whose expertise inputs changed
+        changed_names = [name for name in data if name not in previous_summaries
+                         or expertise_fingerprint(data[name]) != expertise_fingerprint(previous_data.get(name, []))]
+        summaries = {name: previous_summaries[name] for name in data
+                     if name not in changed_names and any(pub.get("expertise") for pub in data[name])}
+        stats["kept_summaries"] = len(summaries)
+        resummarised = {}
+        for name, summary in zip(changed_names, executor.map(lambda name: summarize(name, data[name]), changed_names)):
+            if summary is not None:
+                resummarised[name] = summary
+        summaries.update(resummarised)
+        stats["summarised"] = len(resummarised)
+
+    # Researchers without a fetched list get no snapshot entry, so their papers count as new once it is fetched
+    snapshot = {"researchers": {name: [list(link) for link in links_by_name[name]] for name in names
+                                if name not in skipped},
+                "classifications": classifications}
+    return data, {name: summaries[name] for name in names if name in summaries}, snapshot, resummarised
+
+
+def summarize(name, publications):
+    """A new summary from the expertise of a researcher's papers, or None if they have none."""
+    expertise_list = [pub["expertise"] for pub in publications if pub.get("expertise")]
+    return generate_expertise.summarize_researcher_expertise(name, expertise_list) if expertise_list else None
+
+
+def save(data, summaries, snapshot, resummarised):
+    publications = {name: [{key: value for key, value in pub.items() if key != "expertise"} for pub in pubs]
+                    for name, pubs in data.items()}
+    with open(publications_file, "w", encoding="utf-8") as file:
+        json.dump(publications, file, indent=4, ensure_ascii=False)
+    with open(expertise_file, "w") as file:
+        json.dump(data, file, indent=4)
+    with open(summary_file, "w") as file:
+        json.dump(summaries, file, indent=4)
+    if generate_expertise.write_store:
+        for name, publications in data.items():
+            expertise_store.replace_researcher_publications(name, publications)
+        expertise_store.write_summaries(resummarised)
+    # The snapshot is written last, so an interrupted refresh is diffed against the previous run again
+    with open(snapshot_file, "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, ensure_ascii=False)
+
+
+def report():
+    print(f"Refresh: {stats['researchers']} researchers, {stats['changed_lists']} changed publication lists "
+          f"({stats['unreachable']} unreachable, kept as before, {stats['skipped']} of them without a previous list "
+          f"and skipped); {stats['new']} new and {stats['changed']} changed papers, {stats['rechecked']} known papers "
+          f"rechecked, {stats['removed']} researcher-paper links removed; {stats['fetched']} publication pages fetched, "
+          f"expertise generated for {stats['expertise']} papers; {stats['summarised']} researchers summarised again, "
+          f"{stats['kept_summaries']} summaries kept")
+
+
+def main():
+    path = next((argument for argument in sys.argv[1:] if not argument.startswith("--")), input_file)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            names = list(dict.fromkeys(line.strip() for line in file if line.strip()))
+    except FileNotFoundError:
+        print(f"Error: The file '{path}' does not exist.")
+        return
+    data, summaries, snapshot, resummarised = refresh(names, full="--full" in sys.argv)
+    save(data, summaries, snapshot, resummarised)
+    report()
+    print(f"Expertise written to '{expertise_file}' and summaries to '{summary_file}'.")
+    http_cache.report()
+    llm_cache.report()
+    metrics.report()
+
+
+if __name__ == "__main__":
+    metrics.run(main)
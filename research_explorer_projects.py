@@ -1,70 +1,143 @@
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+import expertise_store
+import http_cache
+import metrics
+import fast_extract
 import json
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
+# HTML extraction engine: "bs4" uses the BeautifulSoup extractors below; "lxml" the faster XPath ones in
+# fast_extract.py, opt-in until bench_extract.py shows no mismatches on recorded pages
+extraction_engine = "bs4"
+
+# Crawl settings
+scrape_mode = "concurrent"  # "concurrent" scrapes several people and their project pages at once, "sequential" one by one
+people_workers = 4  # People whose project lists are scraped at the same time
+project_workers = 8  # Project detail pages fetched at the same time
+projects_ttl = 30 * 24 * 3600  # Seconds during which a person's scraped projects are considered fresh and skipped
+save_every = 25  # Finished people between incremental writes of the JSON file
+write_store = True  # Also write the projects to the SQLite store of expertise_store.py
 
-def scrape_projects(name, json_data):
-    # Convert the name to lowercase and replace spaces with hyphens for the URL format
-    formatted_name = name.lower().replace(" ", "-")
-    url = f"https://research.ugent.be/web/person/{formatted_name}-0/projects/en"
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching page: {e}")
-        return
 
-    # Parse the HTML content using BeautifulSoup
-    soup = BeautifulSoup(response.content, 'html.parser')
+@metrics.timed("parse")
+def parse_project_list(html, url):
+    """Extract the title, URL and role of every project on a person's project page, or None if there are none."""
+    if extraction_engine == "lxml":
+        return fast_extract.parse_project_list(html, url)
+    soup = BeautifulSoup(fast_extract.strip_control_characters(html), 'html.parser')
 
     # Find all project entries
     projects = soup.find_all('div', class_='fiche')
-
     if not projects:
-        print("No projects found.")
-        return
-
-    # Create a list to hold project information
-    project_list = []
+        return None
 
-    # Iterate over each project and extract the title, URL, "As" information, description, and keywords
+    entries = []
     for project in projects:
         # Find the link tag within the project
         link = project.find('a', href=True)
         if link:
             title = project.find('div', class_='margin-bottom-ti').get('title')
-            href = link['href']
-            full_url = urljoin(url, href)
-            as_info = project.find_previous('div', class_='header-5').text.strip() if project.find_previous('div', class_='header-5') else "N/A"
-            
-            # Fetch the project page to get the description and keywords
-            try:
-                project_response = requests.get(full_url)
-                project_response.raise_for_status()
-                project_soup = BeautifulSoup(project_response.content, 'html.parser')
-                description = project_soup.find('div', id='description_showmore').text.strip() if project_soup.find('div', id='description_showmore') else "No description available"
-                
-                # Extract keywords and format them on one line separated by commas
-                keywords_div = project_soup.find('div', class_='keywords')
-                keywords = ", ".join([kw.text.strip() for kw in keywords_div.find_all('span')]) if keywords_div else "No keywords available"
-            except requests.exceptions.RequestException as e:
-                description = f"Error fetching project description: {e}"
-                keywords = "Error fetching keywords"
-
-            # Add the project information to the list
-            project_list.append({
+            full_url = urljoin(url, link['href'])
+            as_header = project.find_previous('div', class_='header-5')
+            as_info = as_header.text.strip() if as_header else "N/A"
+            entries.append({
                 "project_Title": title,
                 "project_URL": full_url,
                 "project_As": as_info,
-                "project_Description": description,
-                "project_Keywords": keywords
             })
+    return entries
+
+
+@metrics.timed("parse")
+def parse_project_details(html):
+    """Extract the description and comma-separated keywords from a project page."""
+    if extraction_engine == "lxml":
+        return fast_extract.parse_project_details(html)
+    soup = BeautifulSoup(fast_extract.strip_control_characters(html), 'html.parser')
+    description_div = soup.find('div', id='description_showmore')
+    description = description_div.text.strip() if description_div else "No description available"
+
+    # Extract keywords and format them on one line separated by commas
+    keywords_div = soup.find('div', class_='keywords')
+    keywords = ", ".join([kw.text.strip() for kw in keywords_div.find_all('span')]) if keywords_div else "No keywords available"
+    return description, keywords
+
+
+def fetch_project(project):
+    """Fetch one project's page and return the project with its description and keywords."""
+    try:
+        project_response = http_cache.get(project["project_URL"])
+        project_response.raise_for_status()
+        description, keywords = parse_project_details(project_response.content)
+    except requests.exceptions.RequestException as e:
+        description = f"Error fetching project description: {e}"
+        keywords = "Error fetching keywords"
+
+    return {
+        **project,
+        "project_Description": description,
+        "project_Keywords": keywords
+    }
+
+
+def fetch_projects(name, project_pool=None):
+    """Return a person's projects with descriptions, [] if they have none, or None if the page could not be fetched."""
+    # Convert the name to lowercase and replace spaces with hyphens for the URL format
+    formatted_name = name.lower().replace(" ", "-")
+    url = f"https://research.ugent.be/web/person/{formatted_name}-0/projects/en"
+    
+    try:
+        response = http_cache.get(url)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching page: {e}")
+        return None
+
+    # Parse the HTML content
+    projects = parse_project_list(response.content, url)
+
+    if not projects:
+        print("No projects found.")
+        return []
+
+    # Fetch each project page to get the description and keywords; map() keeps the page order
+    return list(project_pool.map(fetch_project, projects) if project_pool else map(fetch_project, projects))
+
+
+def apply_projects(json_data, project_list):
+    """Add the scraped projects to a person and remember when they were scraped."""
+    if project_list:
+        json_data["projects"] = project_list
+    json_data["projects_checked_at"] = time.time()
+
 
-    # Add the projects to the JSON data
-    json_data["projects"] = project_list
+def scrape_projects(name, json_data, project_pool=None):
+    project_list = fetch_projects(name, project_pool)
+    if project_list is not None:
+        apply_projects(json_data, project_list)
+
+
+def is_fresh(person):
+    """Whether a person's projects were scraped recently enough to skip them."""
+    return time.time() - person.get("projects_checked_at", 0) < projects_ttl
+
+
+def save_json(data, json_path, updated=()):
+    """Write the JSON file atomically so an interrupted run never leaves a half-written file.
+
+    The people updated since the last save are also written to the store, in one transaction.
+    """
+    temporary_path = json_path + ".tmp"
+    with open(temporary_path, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+    os.replace(temporary_path, json_path)
+    if write_store and updated:
+        expertise_store.write_projects(updated)
 
 
 def scrape_all_projects_in_json(json_path):
@@ -72,17 +145,42 @@ def scrape_all_projects_in_json(json_path):
     with open(json_path, 'r') as json_file:
         data = json.load(json_file)
 
-    # Iterate over each person in the JSON and scrape their projects
-    for person in data:
-        name = person.get("name")
-        if name:
-            scrape_projects(name, person)
+    # People scraped recently, e.g. by an interrupted earlier run, are skipped
+    people = [person for person in data if person.get("name") and not is_fresh(person)]
+    print(f"Scraping projects of {len(people)} people ({len(data) - len(people)} skipped or without a name)")
+
+    updated = []
+    if scrape_mode == "sequential":
+        for done, person in enumerate(people, start=1):
+            scrape_projects(person["name"], person)
+            updated.append(person)
+            if done % save_every == 0:
+                save_json(data, json_path, updated)
+                updated = []
+    else:
+        with ThreadPoolExecutor(max_workers=people_workers) as people_pool, \
+                ThreadPoolExecutor(max_workers=project_workers) as project_pool:
+            futures = {people_pool.submit(fetch_projects, person["name"], project_pool): person for person in people}
+            # Results are applied here rather than in the workers, so saving never sees a person being updated
+            for done, future in enumerate(as_completed(futures), start=1):
+                project_list = future.result()
+                if project_list is not None:
+                    apply_projects(futures[future], project_list)
+                    updated.append(futures[future])
+                if done % save_every == 0:
+                    save_json(data, json_path, updated)
+                    updated = []
 
     # Save the updated JSON file
-    with open(json_path, 'w') as json_file:
-        json.dump(data, json_file, indent=4)
+    save_json(data, json_path, updated)
 
 
-if __name__ == "__main__":
+def main():
     json_path = sys.argv[1]
     scrape_all_projects_in_json(json_path)
+    http_cache.report()
+    metrics.report()
+
+
+if __name__ == "__main__":
+    metrics.run(main)
@@ -1,5 +1,6 @@
 import sys
 import requests
+import http_cache
 import json
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
@@ -11,7 +12,7 @@ def scrape_projects(name, json_data):
     url = f"https://research.ugent.be/web/person/{formatted_name}-0/projects/en"
     
     try:
-        response = requests.get(url)
+        response = http_cache.get(url)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching page: {e}")
@@ -42,7 +43,7 @@ def scrape_projects(name, json_data):
             
             # Fetch the project page to get the description and keywords
             try:
-                project_response = requests.get(full_url)
+                project_response = http_cache.get(full_url)
                 project_response.raise_for_status()
                 project_soup = BeautifulSoup(project_response.content, 'html.parser')
                 description = project_soup.find('div', id='description_showmore').text.strip() if project_soup.find('div', id='description_showmore') else "No description available"
@@ -86,3 +87,4 @@ def scrape_all_projects_in_json(json_path):
 if __name__ == "__main__":
     json_path = sys.argv[1]
     scrape_all_projects_in_json(json_path)
+    http_cache.report()
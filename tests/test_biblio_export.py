@@ -0,0 +1,81 @@
+import glob
+import json
+import os
+import pytest
+import biblio_export
+import http_cache
+import mock_biblio
+import rate_limiter
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+recorded = sorted(glob.glob(os.path.join(root, "tests", "fixtures", "biblio_export", "*.json")))
+
+scraped = {
+    "Ann Example": [
+        {"year": 2024, "url": "http://hdl.handle.net/1854/LU-1", "abstract": "First abstract.",
+         "type": "Journal Article (Original Article)", "doi": "http://doi.org/10.1/one", "classification": "A1"},
+        {"year": 2023, "url": "http://hdl.handle.net/1854/LU-2", "abstract": "Abstract not available",
+         "type": "Journal Article (Review Article)", "doi": "DOI not available", "classification": "A1"},
+        {"year": 2022, "url": "http://hdl.handle.net/1854/LU-3", "abstract": "Third abstract.",
+         "type": "Journal Article (Original Article)", "doi": "DOI not available", "classification": "A2"},
+        {"year": 2010, "url": "http://hdl.handle.net/1854/LU-4", "abstract": "Old abstract.",
+         "type": "Journal Article (Original Article)", "doi": "DOI not available", "classification": "A1"},
+        {"year": 2021, "url": "http://hdl.handle.net/1854/LU-5", "abstract": "Fifth abstract.",
+         "type": "Journal Article (Letter/Note)", "doi": "http://doi.org/10.1/five", "classification": "A1"},
+    ],
+}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "cache_file", str(tmp_path / "http_cache.sqlite"))
+    monkeypatch.setattr(http_cache, "_connection", None)
+    monkeypatch.setattr(http_cache, "_total_size", None)
+    monkeypatch.setattr(rate_limiter, "initial_rate", 1e6)
+    monkeypatch.setattr(rate_limiter, "max_rate", 1e6)
+    monkeypatch.setattr(rate_limiter, "_hosts", {})
+    server = mock_biblio.serve(mock_biblio.records_from_scraped(scraped))
+    monkeypatch.setattr(biblio_export, "export_url", f"http://127.0.0.1:{server.server_address[1]}/publication")
+    yield server
+    server.shutdown()
+
+
+def test_export_pages_match_the_scraped_records(server, monkeypatch):
+    # Two records per page, so the client has to follow the pages
+    monkeypatch.setattr(biblio_export, "page_size", 2)
+    publications = biblio_export.fetch_researcher_publications("Ann Example", 2015)
+    expected = [publication for publication in scraped["Ann Example"]
+                if publication["classification"] == "A1" and publication["year"] >= 2015]
+    assert publications == expected
+
+
+@pytest.mark.parametrize("setting", ["error_rate", "malformed_rate"])
+def test_failed_export_raises(server, monkeypatch, setting):
+    monkeypatch.setattr(mock_biblio, setting, 1.0)
+    with pytest.raises(biblio_export.ExportError):
+        biblio_export.fetch_researcher_publications("Ann Example", 2015)
+
+
+@pytest.mark.skipif(not recorded, reason="no recorded export page; save one with "
+                                         "python biblio_export.py record \"<name>\" tests/fixtures/biblio_export/<name>.json")
+@pytest.mark.parametrize("path", recorded)
+def test_recorded_export_page_maps_onto_the_scraped_fields(path):
+    with open(path, "r", encoding="utf-8") as file:
+        page = json.load(file)
+    assert page["status"] == 200
+    records = json.loads(page["body"])
+    assert isinstance(records, list)
+    publications = [biblio_export.to_publication(record) for record in records
+                    if record.get("classification") == "A1" and biblio_export._year(record) >= page["min_year"]]
+    assert publications
+    for publication in publications:
+        assert biblio_export.handle_id(publication["url"]).startswith("LU-")
+        assert publication["year"] >= page["min_year"]
+        assert publication["type"].startswith("Journal Article")
+    # For a researcher of the scraped test data, the export finds the papers their pages list
+    with open(os.path.join(root, "test.publications_data.json"), "r", encoding="utf-8") as file:
+        scraped_data = json.load(file)
+    if page["name"] in scraped_data:
+        scraped_handles = {biblio_export.handle_id(publication["url"]) for publication in scraped_data[page["name"]]
+                           if publication.get("classification") == "A1" and publication["year"] >= page["min_year"]}
+        assert {biblio_export.handle_id(publication["url"]) for publication in publications} & scraped_handles
@@ -0,0 +1,29 @@
+import pytest
+import expertise_store
+
+url = "http://hdl.handle.net/1854/LU-1"
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(expertise_store, "store_file", str(tmp_path / "expertise_store.sqlite"))
+    monkeypatch.setattr(expertise_store, "_connection", None)
+    monkeypatch.setattr(expertise_store.job_queue, "coordinator_url", None)
+
+
+def test_new_abstract_without_expertise_clears_the_old_expertise():
+    expertise_store.write_publications([("A", {"url": url, "year": 2024, "abstract": "Old abstract",
+                                               "expertise": "Old expertise"})])
+    expertise_store.write_publications([("A", {"url": url, "year": 2024, "abstract": "Corrected abstract"})])
+    publication = expertise_store.publication("LU-1")
+    assert publication["abstract"] == "Corrected abstract"
+    assert publication.get("expertise") is None
+    assert not expertise_store.search("expertise")
+
+
+def test_same_abstract_or_short_record_keeps_the_expertise():
+    expertise_store.write_publications([("A", {"url": url, "year": 2024, "abstract": "Abstract",
+                                               "expertise": "Expertise"})])
+    expertise_store.write_publications([("A", {"url": url, "year": 2024, "abstract": "Abstract"}),
+                                        ("B", {"url": url, "year": 2024, "classification": "A1"})])
+    assert expertise_store.publication("LU-1")["expertise"] == "Expertise"
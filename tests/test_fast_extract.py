@@ -0,0 +1,42 @@
+import os
+import pytest
+import hint2publications
+import research_explorer_projects
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read(name):
+    with open(os.path.join(fixtures, name), "rb") as file:
+        return file.read()
+
+
+# Pages as the crawlers pass them: publication pages as text, project pages as bytes
+extractors = {
+    "publication_plain.html": lambda page: hint2publications.parse_publication_details(page.decode("utf-8")),
+    "publication_control_character.html":
+        lambda page: hint2publications.parse_publication_details(page.decode("utf-8")),
+    "publication_list.html": lambda page: hint2publications.parse_publication_urls(page.decode("utf-8")),
+    "project_list.html": lambda page: research_explorer_projects.parse_project_list(
+        page, "https://research.ugent.be/web/person/kris-gevaert-0/projects/en"),
+    "project.html": research_explorer_projects.parse_project_details,
+}
+
+
+def extract(monkeypatch, engine, name):
+    monkeypatch.setattr(hint2publications, "extraction_engine", engine)
+    monkeypatch.setattr(research_explorer_projects, "extraction_engine", engine)
+    return extractors[name](read(name))
+
+
+@pytest.mark.parametrize("name", sorted(extractors))
+def test_lxml_extractors_match_beautifulsoup(monkeypatch, name):
+    expected = extract(monkeypatch, "bs4", name)
+    assert expected
+    assert extract(monkeypatch, "lxml", name) == expected
+
+
+def test_control_characters_are_dropped_by_both_engines(monkeypatch):
+    assert b"\x0f" in read("publication_control_character.html")
+    for engine in ("bs4", "lxml"):
+        assert "\x0f" not in extract(monkeypatch, engine, "publication_control_character.html")["abstract"]
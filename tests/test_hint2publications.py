@@ -0,0 +1,19 @@
+import json
+import hint2publications
+
+
+def test_resume_from_streamed_output_keeps_only_keys(tmp_path, monkeypatch):
+    output = tmp_path / "publications.jsonl"
+    records = [{"researcher": "A", "year": 2024, "url": "http://hdl.handle.net/1854/LU-1", "abstract": "Text"},
+               {"researcher": "B", "year": 2024, "url": "http://hdl.handle.net/1854/LU-1", "classification": "A1"}]
+    output.write_text("".join(json.dumps(record) + "\n" for record in records) + '{"researcher": "C", "ye')
+    monkeypatch.setattr(hint2publications, "output_format", "jsonl")
+    monkeypatch.setattr(hint2publications, "output_jsonl_file", str(output))
+
+    progress = hint2publications.load_progress(str(tmp_path / "journal.jsonl"))
+    progress["journal"].close()
+    progress["output"].close()
+
+    assert progress["written"] == {("A", "LU-1"), ("B", "LU-1")}
+    assert progress["emitted"] == {"LU-1"}
+    assert progress["publications"] == {}
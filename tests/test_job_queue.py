@@ -0,0 +1,40 @@
+import threading
+import pytest
+import job_queue
+
+
+@pytest.fixture(autouse=True)
+def queue_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "queue_file", str(tmp_path / "job_queue.sqlite"))
+    monkeypatch.setattr(job_queue, "_connection", None)
+    monkeypatch.setattr(job_queue, "coordinator_url", None)
+
+
+def test_changed_payload_queues_a_done_job_again():
+    assert job_queue.enqueue("expertise", [("LU-1", "a"), ("LU-2", "b")]) == 2
+    for key, _ in job_queue.claim("expertise", 2):
+        assert job_queue.complete("expertise", key)
+    assert job_queue.enqueue("expertise", [("LU-1", "a"), ("LU-2", "b")]) == 0
+    assert job_queue.remaining("expertise") == 0
+    assert job_queue.enqueue("expertise", [("LU-1", "a"), ("LU-2", "changed")]) == 1
+    assert job_queue.claim("expertise", 2) == [["LU-2", "changed"]]
+
+
+def test_reset_queues_every_job_again():
+    job_queue.enqueue("researchers", ["A", "B"])
+    for key, _ in job_queue.claim("researchers", 2):
+        job_queue.complete("researchers", key)
+    assert job_queue.reset("researchers") == 2
+    assert job_queue.remaining("researchers") == 2
+
+
+def test_threads_of_one_process_hold_separate_leases():
+    job_queue.enqueue("expertise", ["LU-1"])
+    claimed = []
+    thread = threading.Thread(target=lambda: claimed.extend(job_queue.claim("expertise")))
+    thread.start()
+    thread.join()
+    assert claimed == [["LU-1", None]]
+    # Another thread of the same process does not own the lease
+    assert not job_queue.complete("expertise", "LU-1")
+    assert job_queue.remaining("expertise") == 1
@@ -0,0 +1,45 @@
+import queue
+import threading
+import pytest
+
+pytest.importorskip("langchain")
+import generate_expertise
+import pipeline
+
+abstract = " ".join(f"word{number}" for number in range(60))
+
+
+def test_shared_paper_is_finished_once_per_researcher(monkeypatch):
+    # The second researcher claims the paper just before the first one finishes generating it
+    claimed, generated = threading.Event(), threading.Event()
+    claim_paper = pipeline.claim_paper
+
+    def slow_claim(state, item):
+        result = claim_paper(state, item)
+        if item[0] == "B":
+            claimed.set()
+            generated.wait(5)
+        return result
+
+    def expertise(publication):
+        claimed.wait(5)
+        return "expertise"
+
+    monkeypatch.setattr(pipeline, "claim_paper", slow_claim)
+    monkeypatch.setattr(generate_expertise, "publication_expertise", expertise)
+    state, summary_queue = pipeline.new_state(), queue.Queue()
+    for name in ("A", "B"):
+        state["researchers"][name] = {"expected": 1, "finished": 0, "publications": {}}
+    items = [(name, 0, {"url": "http://hdl.handle.net/1854/LU-1", "abstract": abstract}) for name in ("A", "B")]
+
+    first, second = (threading.Thread(target=pipeline.process_llm_item, args=(state, summary_queue, item))
+                     for item in items)
+    first.start()
+    second.start()
+    first.join(5)
+    generated.set()
+    second.join(5)
+
+    assert [state["researchers"][name]["finished"] for name in ("A", "B")] == [1, 1]
+    assert sorted(summary_queue.queue) == ["A", "B"]
+    assert all(state["researchers"][name]["publications"][0]["expertise"] == "expertise" for name in ("A", "B"))
@@ -0,0 +1,49 @@
+import multiprocessing
+import pytest
+import profile_resolver
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile_resolver, "store_file", str(tmp_path / "resolved_profiles.sqlite"))
+    monkeypatch.setattr(profile_resolver, "_connection", None)
+
+
+def candidates(name):
+    slug = name.lower().replace(" ", "-")
+    return [f"https://research.ugent.be/web/person/{slug}-{number}/en" for number in range(2)]
+
+
+def exists(url):
+    return url.endswith("-1/en")
+
+
+def resolve_names(names):
+    profile_resolver._connection = None
+    for name in names:
+        profile_resolver.resolve(name, candidates(name), exists)
+
+
+def test_worker_processes_keep_each_others_profiles(store):
+    context = multiprocessing.get_context("fork")
+    names = [[f"Researcher {worker} {number}" for number in range(20)] for worker in range(4)]
+    workers = [context.Process(target=resolve_names, args=(worker_names,)) for worker_names in names]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert all(worker.exitcode == 0 for worker in workers)
+    for name in sum(names, []):
+        assert profile_resolver._lookup(name)["slug"] == name.lower().replace(" ", "-") + "-1"
+
+
+def test_remembers_names_without_a_profile(store):
+    calls = []
+
+    def missing(url):
+        calls.append(url)
+        return False
+
+    assert profile_resolver.resolve("Nobody Known", candidates("Nobody Known"), missing) is None
+    assert profile_resolver.resolve("Nobody Known", candidates("Nobody Known"), missing) is None
+    assert len(calls) == 2
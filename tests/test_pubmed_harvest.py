@@ -0,0 +1,47 @@
+import mock_pubmed
+import pubmed_harvest
+
+
+def matched_researchers(names, authors):
+    """The researchers the harvest assigns an article with the given (surname, fore name) authors to."""
+    by_surname = {}
+    for name in names:
+        for given, surname in pubmed_harvest.name_splits(name):
+            by_surname.setdefault(pubmed_harvest.plain(surname), []).append((name, given))
+    return {name for surname, fore_name in authors for name, given in by_surname.get(pubmed_harvest.plain(surname), ())
+            if pubmed_harvest.given_matches(given, fore_name)}
+
+
+def test_compound_surname_is_one_of_the_splits():
+    assert ("Yves", "Van de Peer") in pubmed_harvest.name_splits("Yves Van de Peer")
+    aliases = pubmed_harvest.aliases("Yves Van de Peer")
+    assert "Van de Peer Yves" in aliases and "Van de Peer Y" in aliases
+
+
+def test_compound_surname_matches_in_any_spelling():
+    for surname in ("Van de Peer", "van de Peer", "Vandepeer", "Van De Peer"):
+        assert matched_researchers(["Yves Van de Peer"], [(surname, "Yves")]) == {"Yves Van de Peer"}
+    assert not matched_researchers(["Yves Van de Peer"], [("Peer", "Anna")])
+
+
+def test_hyphenated_given_name():
+    assert pubmed_harvest.initials("Jean-Pierre") == "JP"
+    assert "Martens JP" in pubmed_harvest.aliases("Jean-Pierre Martens")
+    for fore_name in ("Jean-Pierre", "Jean Pierre", "JP", "J-P"):
+        assert pubmed_harvest.given_matches("Jean-Pierre", fore_name)
+    assert not pubmed_harvest.given_matches("Jean-Pierre", "Pierre")
+
+
+def test_initials_match_but_other_spelled_out_names_do_not():
+    assert pubmed_harvest.given_matches("Sven", "S")
+    assert pubmed_harvest.given_matches("Sven", "S.")
+    assert pubmed_harvest.given_matches("Sven", "Sven")
+    assert not pubmed_harvest.given_matches("Sven", "Steven")
+    assert not pubmed_harvest.given_matches("Sven", "T")
+    assert matched_researchers(["Sven Degroeve"], [("Degroeve", "Steven"), ("Martens", "Lennart")]) == set()
+
+
+def test_mock_lists_compound_surnames_as_pubmed_does():
+    assert mock_pubmed.author_name("Yves Van de Peer") == ("Van de Peer", "Yves")
+    assert mock_pubmed.author_name("Jean-Pierre Martens") == ("Martens", "Jean-Pierre")
+    assert mock_pubmed.author_initials("Jean-Pierre") == "JP"
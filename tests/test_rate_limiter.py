@@ -0,0 +1,61 @@
+import asyncio
+import time
+import pytest
+import requests
+import rate_limiter
+
+url = "http://example.org/page"
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_hosts", {})
+    monkeypatch.setattr(rate_limiter, "initial_rate", 1e6)
+    limiter = rate_limiter.limiter_for(url)
+    # A circuit whose cooldown has passed, so the next request is the half-open probe
+    limiter.open_until = time.monotonic() - 1
+    return limiter
+
+
+def ok():
+    response = requests.Response()
+    response.status_code = 200
+    return response
+
+
+def test_probe_failing_with_another_exception_frees_the_circuit(limiter):
+    def broken():
+        raise ValueError("parse error")
+
+    with pytest.raises(ValueError):
+        rate_limiter.call(url, broken)
+    assert not limiter.probing
+    assert rate_limiter.call(url, ok).status_code == 200
+    assert limiter.open_until is None
+
+
+def test_cancelled_async_probe_frees_the_circuit(limiter):
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def ok_async():
+        return ok()
+
+    async def run():
+        task = asyncio.create_task(rate_limiter.call_async(url, hang, (OSError,)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await rate_limiter.call_async(url, ok_async, (OSError,))
+
+    assert asyncio.run(run()).status_code == 200
+    assert limiter.open_until is None
+
+
+def test_other_requests_are_rejected_while_the_probe_runs(limiter):
+    delay, probe = limiter.reserve()
+    with pytest.raises(rate_limiter.CircuitOpenError):
+        limiter.reserve()
+    limiter.end_probe(probe)
+    assert limiter.reserve()[1] is not None